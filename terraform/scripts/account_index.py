@@ -0,0 +1,316 @@
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from render import RenderStats, write_if_changed
+
+DEFAULT_INDEX = "./.account_index.json"
+INDEX_VERSION = 1
+
+# How the index decides that ACCOUNTS_DIR changed:
+#   dir   only the directory's own mtime (catches added/removed accounts, not in-place edits)
+#   stat  mtime and size of every account.json, without opening them
+#   hash  content hash of every account.json
+VALIDATE_MODES = ("dir", "stat", "hash")
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def _tags(value):
+    if isinstance(value, list):
+        return {tag["Key"]: tag["Value"] for tag in value}
+    return dict(value or {})
+
+def read_account_file(path):
+    """Index entry for one account.json: ACCOUNT_ALIAS and ACCOUNT_ID, plus ACCOUNT_OU and TAGS when present"""
+    with open(path, "rb") as f:
+        content = f.read()
+    data = json.loads(content)
+    return {
+        "alias": data["ACCOUNT_ALIAS"],
+        "id": str(data["ACCOUNT_ID"]),
+        "ou": data.get("ACCOUNT_OU", ""),
+        "tags": _tags(data.get("TAGS")),
+        "hash": hashlib.sha256(content).hexdigest()
+    }
+
+def parse_since(value):
+    """"7d", "12h", "30m" ago, or an ISO date/datetime, as an aware UTC datetime"""
+    match = re.fullmatch(r"(\d+)([dhm])", value)
+    if match:
+        unit = {"d": "days", "h": "hours", "m": "minutes"}[match.group(2)]
+        return _now() - timedelta(**{unit: int(match.group(1))})
+    since = datetime.fromisoformat(value)
+    return since if since.tzinfo else since.replace(tzinfo=timezone.utc)
+
+def _pages(client, operation, result_key, **kwargs):
+    """Every item of an Organizations list operation (NextToken pagination)"""
+    items = []
+    while True:
+        page = client.call(operation, **kwargs) if hasattr(client, "call") else getattr(client, operation)(**kwargs)
+        items.extend(page.get(result_key, []))
+        if not page.get("NextToken"):
+            return items
+        kwargs["NextToken"] = page["NextToken"]
+
+class AccountIndex:
+    """Cached inventory of the accounts under ACCOUNTS_DIR, kept in one compact JSON file.
+
+    refresh() compares a fingerprint of ACCOUNTS_DIR (see VALIDATE_MODES) with the one
+    stored in the index and only re-reads the account.json files whose mtime/size (or
+    content, in hash mode) changed. Each entry records when its content last changed,
+    for changed-since selection. refresh_from_organizations() adds OU paths, tags and
+    status from AWS Organizations; accounts Organizations knows about but that have no
+    account.json are kept apart and only selected on request.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX, accounts_dir="./accounts", validate="stat", log=print):
+        if validate not in VALIDATE_MODES:
+            raise ValueError(f"validate must be one of {VALIDATE_MODES}")
+        self.path = path
+        self.accounts_dir = os.path.abspath(accounts_dir)
+        self.validate = validate
+        self.log = log
+        self.rebuilt = False
+        self._data = self._read()
+
+    def _read(self):
+        empty = {"version": INDEX_VERSION, "accounts_dir": self.accounts_dir, "fingerprint": None,
+                 "accounts": {}, "organizations": {}}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        if data.get("version") != INDEX_VERSION or data.get("accounts_dir") != self.accounts_dir:
+            return empty
+        return data
+
+    def _account_files(self):
+        """{directory name: (path, mtime_ns, size)} for every <dir>/account.json"""
+        files = {}
+        with os.scandir(self.accounts_dir) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                path = os.path.join(entry.path, "account.json")
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    self.log(f"[WARN] No account.json found in {entry.path}")
+                    continue
+                files[entry.name] = (path, st.st_mtime_ns, st.st_size)
+        return files
+
+    def _fingerprint(self, files=None):
+        if self.validate == "dir":
+            return f"dir:{os.stat(self.accounts_dir).st_mtime_ns}"
+        digest = hashlib.sha256()
+        for name, (path, mtime_ns, size) in sorted(files.items()):
+            if self.validate == "hash":
+                with open(path, "rb") as f:
+                    digest.update(f"{name}\0".encode() + hashlib.sha256(f.read()).digest())
+            else:
+                digest.update(f"{name}\0{mtime_ns}\0{size}\n".encode())
+        return f"{self.validate}:{digest.hexdigest()}"
+
+    def refresh(self, force=False):
+        """Bring the index up to date with ACCOUNTS_DIR. Returns True when anything was re-read.
+
+        Raises ValueError when two account.json files have the same ACCOUNT_ID.
+        """
+        files = None if self.validate == "dir" and not force else self._account_files()
+        fingerprint = self._fingerprint(files)
+        if not force and fingerprint == self._data["fingerprint"]:
+            return False
+        files = files if files is not None else self._account_files()
+
+        previous = {entry["file"]: entry for entry in self._data["accounts"].values()}
+        accounts = {}
+        now = _now().isoformat(timespec="seconds")
+        for name, (path, mtime_ns, size) in sorted(files.items()):
+            old = previous.get(name)
+            if old and not force and self.validate != "hash" and old["stat"] == [mtime_ns, size]:
+                self._add(accounts, old)
+                continue
+            try:
+                entry = read_account_file(path)
+            except Exception as e:
+                self.log(f"[ERROR] Failed to load {path}: {e}")
+                continue
+            entry.update(file=name, stat=[mtime_ns, size])
+            if old and old["hash"] == entry["hash"]:
+                entry["changed"] = old["changed"]
+            else:
+                entry["changed"] = now if old else datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc).isoformat(
+                    timespec="seconds")
+            if old and "org" in old:
+                entry["org"] = old["org"]
+            self._add(accounts, entry)
+
+        self._data["accounts"] = accounts
+        self._data["fingerprint"] = fingerprint
+        self.rebuilt = True
+        return True
+
+    def _add(self, accounts, entry):
+        other = accounts.get(entry["id"])
+        if other is not None:
+            raise ValueError(f"Account {entry['id']} is in both {self.accounts_dir}/{other['file']} "
+                             f"and {self.accounts_dir}/{entry['file']}")
+        accounts[entry["id"]] = entry
+
+    def refresh_from_organizations(self, client, with_ous=True, with_tags=False):
+        """Merge status, OU path and (optionally) tags from AWS Organizations into the index.
+
+        client is an organizations client (an IamCaller around one gets rate limiting and
+        retries). With with_ous the OU tree is walked once, which costs one call per OU
+        rather than one list_parents call per account.
+        """
+        org_accounts = {}
+        if with_ous:
+            def walk(parent_id, ou_path):
+                for account in _pages(client, "list_accounts_for_parent", "Accounts", ParentId=parent_id):
+                    org_accounts[account["Id"]] = dict(account, OuPath=ou_path)
+                for ou in _pages(client, "list_organizational_units_for_parent", "OrganizationalUnits",
+                                 ParentId=parent_id):
+                    walk(ou["Id"], f"{ou_path}/{ou['Name']}")
+
+            for root in _pages(client, "list_roots", "Roots"):
+                walk(root["Id"], root["Name"])
+        else:
+            org_accounts = {a["Id"]: a for a in _pages(client, "list_accounts", "Accounts")}
+
+        for account_id, account in org_accounts.items():
+            org = {"name": account.get("Name", ""), "status": account.get("Status", "")}
+            if "OuPath" in account:
+                org["ou"] = account["OuPath"]
+            if with_tags:
+                org["tags"] = _tags(_pages(client, "list_tags_for_resource", "Tags", ResourceId=account_id))
+            target = self._data["accounts"].get(account_id)
+            if target is not None:
+                target["org"] = org
+            else:
+                self._data["organizations"][account_id] = org
+        for account_id in list(self._data["organizations"]):
+            if account_id in self._data["accounts"] or account_id not in org_accounts:
+                del self._data["organizations"][account_id]
+        self.rebuilt = True
+
+    def save(self):
+        """Write the index if it changed; an unwritable location only costs the next run a rescan"""
+        if not self.rebuilt:
+            return False
+        try:
+            return write_if_changed(self.path, json.dumps(self._data, sort_keys=True, separators=(",", ":")),
+                                    stats=RenderStats())
+        except OSError as e:
+            self.log(f"[WARN] Could not write account index {self.path}: {e}")
+            return False
+
+    def entries(self, include_org_only=False):
+        """Every account as {"alias", "id", "ou", "tags", "changed", "status", "source"}"""
+        entries = []
+        for entry in self._data["accounts"].values():
+            org = entry.get("org", {})
+            entries.append({
+                "alias": entry["alias"],
+                "id": entry["id"],
+                "ou": entry["ou"] or org.get("ou", ""),
+                "tags": dict(org.get("tags", {}), **entry["tags"]),
+                "changed": entry["changed"],
+                "status": org.get("status", ""),
+                "source": "account.json"
+            })
+        if include_org_only:
+            for account_id, org in self._data["organizations"].items():
+                entries.append({"alias": org["name"], "id": account_id, "ou": org.get("ou", ""),
+                                "tags": org.get("tags", {}), "changed": "", "status": org["status"],
+                                "source": "organizations"})
+        return entries
+
+    def select(self, aliases=None, ous=None, tags=None, changed_since=None, include_org_only=False):
+        """Accounts matching every given filter, sorted by alias.
+
+        aliases and ous are glob patterns (an OU matches by path, e.g. "Root/Prod*", or by
+        a path component); tags maps key to a required value or None for presence only.
+        Filtering by OU raises ValueError when no account has an OU yet: it comes from
+        ACCOUNT_OU or refresh_from_organizations().
+        """
+        entries = self.entries(include_org_only)
+        if ous:
+            without_ou = sum(not entry["ou"] for entry in entries)
+            if entries and without_ou == len(entries):
+                raise ValueError("No account has an OU to filter on; set ACCOUNT_OU in account.json "
+                                 "or refresh the index from Organizations (account_index.py --refresh-org)")
+            if without_ou:
+                self.log(f"[WARN] {without_ou} accounts have no OU and cannot match --ou")
+        selected = []
+        for entry in entries:
+            if aliases and not any(fnmatch.fnmatchcase(entry["alias"], p) for p in aliases):
+                continue
+            if ous and not any(fnmatch.fnmatchcase(entry["ou"], p) or p in entry["ou"].split("/") for p in ous):
+                continue
+            if tags and not all(k in entry["tags"] and (v is None or entry["tags"][k] == v) for k, v in tags.items()):
+                continue
+            if changed_since and (not entry["changed"] or datetime.fromisoformat(entry["changed"]) < changed_since):
+                continue
+            selected.append(entry)
+        return sorted(selected, key=lambda a: a["alias"])
+
+def load_index(path=DEFAULT_INDEX, accounts_dir="./accounts", validate="stat", log=print):
+    """Open, refresh and save the index in one step"""
+    index = AccountIndex(path, accounts_dir, validate, log)
+    index.refresh()
+    index.save()
+    return index
+
+def main():
+    from role_discovery import parse_tag_filters
+    parser = argparse.ArgumentParser(description="Build or query the cached account inventory index")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Index file")
+    parser.add_argument("--accounts-dir", default="./accounts", help="Directory of <account>/account.json files")
+    parser.add_argument("--validate", choices=VALIDATE_MODES, default="stat", help="How changes are detected")
+    parser.add_argument("--rebuild", action="store_true", help="Re-read every account.json")
+    parser.add_argument("--refresh-org", action="store_true", help="Merge OUs and status from AWS Organizations")
+    parser.add_argument("--org-tags", action="store_true", help="With --refresh-org, also fetch account tags")
+    parser.add_argument("--alias", action="append", help="Alias glob (repeatable)")
+    parser.add_argument("--ou", action="append", help="OU path glob or OU name (repeatable)")
+    parser.add_argument("--tag", action="append", metavar="KEY[=VALUE]", help="Required account tag (repeatable)")
+    parser.add_argument("--changed-since", help="Only accounts whose account.json changed since (7d, 12h, ISO date)")
+    parser.add_argument("--include-org-only", action="store_true",
+                        help="Also list Organizations accounts that have no account.json")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    index = AccountIndex(args.index, args.accounts_dir, args.validate)
+    try:
+        index.refresh(force=args.rebuild)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.refresh_org:
+        import boto3
+        from iam_calls import CLIENT_CONFIG, IamCaller
+        index.refresh_from_organizations(IamCaller(boto3.client("organizations", config=CLIENT_CONFIG)),
+                                         with_tags=args.org_tags)
+    index.save()
+    try:
+        accounts = index.select(args.alias, args.ou, parse_tag_filters(args.tag),
+                                parse_since(args.changed_since) if args.changed_since else None,
+                                args.include_org_only)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(accounts, indent=2))
+    else:
+        for a in accounts:
+            print(f"{a['alias']:<32} {a['id']}  {a['ou'] or '-':<32} {a['changed']}")
+    print(f"{len(accounts)} accounts", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
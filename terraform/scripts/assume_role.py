@@ -1,23 +1,23 @@
-import boto3
-import json
 import os
 import sys
 
+from credential_broker import CredentialBroker
+from tfvars_parser import TfvarsSyntaxError, parse_tfvars_file
+
 def read_tfvars(file_path):
     """Read terraform.tfvars and extract target_account and target_role. Exit if not found."""
     if not os.path.exists(file_path):
         print(f"[ERROR] Required file '{file_path}' not found. Please create it with target_account and target_role.")
         sys.exit(1)
 
-    target_account = None
-    target_role = None
+    try:
+        values = parse_tfvars_file(file_path)
+    except TfvarsSyntaxError as e:
+        print(f"[ERROR] Could not parse {file_path}: {e}")
+        sys.exit(1)
 
-    with open(file_path, "r") as f:
-        for line in f:
-            if line.startswith("target_account"):
-                target_account = line.split("=")[1].strip().replace('"', '')
-            elif line.startswith("target_role"):
-                target_role = line.split("=")[1].strip().replace('"', '')
+    target_account = values.get("target_account")
+    target_role = values.get("target_role")
 
     if not target_account or not target_role:
         print(f"[ERROR] 'target_account' or 'target_role' is missing in {file_path}. These are mandatory fields.")
@@ -26,18 +26,19 @@ def read_tfvars(file_path):
     return target_account, target_role
 
 def assume_role(target_account, target_role):
-    """Assume the IAM role in the target AWS account and save credentials securely."""
-    sts_client = boto3.client("sts")
+    """Assume the IAM role in the target AWS account and save credentials securely.
 
+    Python steps should use CredentialBroker().session(...) directly instead of the file.
+    """
     role_arn = f"arn:aws:iam::{target_account}:role/{target_role}"
 
     try:
-        assumed_role = sts_client.assume_role(
-            RoleArn=role_arn,
-            RoleSessionName="GitLabAssumeRoleSession"
-        )
-
-        credentials = assumed_role["Credentials"]
+        frozen = CredentialBroker().credentials(target_account, target_role).get_frozen_credentials()
+        credentials = {
+            "AccessKeyId": frozen.access_key,
+            "SecretAccessKey": frozen.secret_key,
+            "SessionToken": frozen.token
+        }
 
         # ✅ Save credentials to a temporary secure file (not logged)
         credentials_file = "/tmp/aws_credentials"
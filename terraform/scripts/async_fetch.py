@@ -0,0 +1,310 @@
+import asyncio
+import contextlib
+import copy
+import inspect
+import random
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+
+import generate_tfvars
+import iam_calls
+import instrumentation
+import inventory_export
+import trust_graph
+from canonical import canonicalize_record
+from iam_calls import TRANSIENT_EXCEPTIONS, TokenBucket, is_retryable, is_throttling
+from instance_profiles import InstanceProfileIndex
+from policy_cache import shared_cache
+from render import write_if_changed
+from run_journal import PENDING
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.credentials import AioRefreshableCredentials
+    from aiobotocore.session import AioSession
+except ImportError:  # optional, only needed for --engine asyncio against AWS
+    AioSession = None
+
+class AsyncIamCaller:
+    """asyncio counterpart of IamCaller for one account.
+
+    Every call waits for the account's token bucket and its semaphore, so at most
+    max_in_flight requests are open per account no matter how many roles are being
+    fetched. Throttling and transient errors are retried with full-jitter backoff (see
+    iam_calls.is_retryable). The wrapped client can be an aiobotocore client or any
+    client with plain (blocking) methods, such as FakeIam.
+    """
+
+    def __init__(self, client, bucket=None, max_in_flight=20, max_attempts=8, base_delay=0.5, max_delay=20.0):
+        self.client = client
+        self.bucket = bucket or TokenBucket()
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.exceptions = client.exceptions
+        # (policy ARN, version) -> Task, so roles sharing a policy wait on one download
+        self._downloads = {}
+
+    async def _acquire_token(self):
+        while True:
+            wait = self.bucket.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def call(self, operation, **kwargs):
+        method = getattr(self.client, operation)
+        throttles = 0
+        for attempt in range(1, self.max_attempts + 1):
+            await self._acquire_token()
+            try:
+                async with self.semaphore:
+                    with instrumentation.call_attempt(attempt):
+                        result = method(**kwargs)
+                        if inspect.isawaitable(result):
+                            result = await result
+            except (ClientError,) + TRANSIENT_EXCEPTIONS as e:
+                if not is_retryable(e) or attempt == self.max_attempts:
+                    iam_calls.TOTAL_STATS.record(operation, attempt - 1, throttles + is_throttling(e))
+                    raise
+                throttles += is_throttling(e)
+                await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            iam_calls.TOTAL_STATS.record(operation, attempt - 1, throttles)
+            return result
+
+    async def list_all(self, operation, result_key, **kwargs):
+        items = []
+        while True:
+            page = await self.call(operation, **kwargs)
+            items.extend(page.get(result_key, []))
+            if not page.get("IsTruncated"):
+                return items
+            kwargs["Marker"] = page["Marker"]
+
+async def _policy_document(iam, policy_arn, version_id, policy_cache):
+    """Async PolicyCache.get_policy_document: returns (policy_name, document)"""
+    policy_name = policy_arn.split("/")[-1]
+    if version_id is None:
+        policy = (await iam.call("get_policy", PolicyArn=policy_arn))["Policy"]
+        policy_name = policy["PolicyName"]
+        version_id = policy["DefaultVersionId"]
+
+    document = policy_cache.get(policy_arn, version_id)
+    if document is not None:
+        return policy_name, document
+
+    key = (policy_arn, version_id)
+    if key not in iam._downloads:
+        async def download():
+            response = await iam.call("get_policy_version", PolicyArn=policy_arn, VersionId=version_id)
+            policy_cache.misses += 1
+            policy_cache.put(policy_arn, version_id, response["PolicyVersion"]["Document"])
+            return response["PolicyVersion"]["Document"]
+        iam._downloads[key] = asyncio.ensure_future(download())
+    return policy_name, copy.deepcopy(await iam._downloads[key])
+
+async def _boundary_policy(iam, role, policy_versions, policy_cache):
+    """Async generate_tfvars.boundary_policy"""
+    policy_arn = role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+    if not policy_arn:
+        return None
+    try:
+        policy_name, document = await _policy_document(iam, policy_arn, policy_versions.get(policy_arn), policy_cache)
+    except Exception as e:
+        generate_tfvars.log(f"[WARN] Could not fetch permissions boundary {policy_arn} of {role['RoleName']}: {e}")
+        return None
+    return {"name": policy_name, "arn": policy_arn, "statements": document.get("Statement", [])}
+
+async def build_profile_index(iam):
+    """InstanceProfileIndex from one paginated list_instance_profiles on an AsyncIamCaller"""
+    return InstanceProfileIndex(await iam.list_all("list_instance_profiles", "InstanceProfiles"))
+
+async def _role_instance_profiles(iam, role_name, profile_index):
+    """Async generate_tfvars.role_instance_profiles"""
+    if profile_index is None:
+        profiles = await iam.list_all("list_instance_profiles_for_role", "InstanceProfiles", RoleName=role_name)
+        profile_index = InstanceProfileIndex(profiles)
+    missing = [name for name in profile_index.profile_names(role_name) if not profile_index.has_tags(name)]
+    tag_lists = await asyncio.gather(*(
+        iam.list_all("list_instance_profile_tags", "Tags", InstanceProfileName=name) for name in missing
+    ))
+    for name, tags in zip(missing, tag_lists):
+        profile_index.set_tags(name, tags)
+    return profile_index.profiles_for_role(role_name)
+
+async def fetch_iam_role_async(role_name, iam, policy_versions=None, policy_cache=None, profile_index=None):
+    """fetch_iam_role for an AsyncIamCaller: same record, or None when the role cannot be fetched.
+
+    get_role runs first so a missing role costs one call; everything else for the role
+    is requested concurrently.
+    """
+    policy_versions = policy_versions or {}
+    policy_cache = policy_cache or shared_cache()
+    try:
+        role = (await iam.call("get_role", RoleName=role_name))["Role"]
+        attached_policies, inline_names, tags, instance_profiles = await asyncio.gather(
+            iam.list_all("list_attached_role_policies", "AttachedPolicies", RoleName=role_name),
+            iam.list_all("list_role_policies", "PolicyNames", RoleName=role_name),
+            iam.list_all("list_role_tags", "Tags", RoleName=role_name),
+            _role_instance_profiles(iam, role_name, profile_index)
+        )
+
+        managed_arns = [p["PolicyArn"] for p in attached_policies if "aws:policy" in p["PolicyArn"]]
+        customer_arns = [p["PolicyArn"] for p in attached_policies if "aws:policy" not in p["PolicyArn"]]
+        documents = await asyncio.gather(*(
+            _policy_document(iam, arn, policy_versions.get(arn), policy_cache) for arn in customer_arns
+        ))
+        inline_responses = await asyncio.gather(*(
+            iam.call("get_role_policy", RoleName=role_name, PolicyName=name) for name in inline_names
+        ))
+        boundary = await _boundary_policy(iam, role, policy_versions, policy_cache)
+
+        return canonicalize_record(dict({
+            "role_name": role_name,
+            "assume_role_policy": role["AssumeRolePolicyDocument"],
+            "managed_arns": managed_arns,
+            "customer_managed_policies": {
+                name: {"name": name, "arn": arn,
+                       "statements": document.get("Statement", [])}
+                for arn, (name, document) in zip(customer_arns, documents)
+            },
+            "inline_policies": {
+                name: response["PolicyDocument"]
+                for name, response in zip(inline_names, inline_responses)
+            },
+            "permissions_boundary": role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn", ""),
+            "permissions_boundary_policy": boundary,
+            "tags": [{tag["Key"]: tag["Value"]} for tag in tags]
+        }, **generate_tfvars.profile_fields(instance_profiles)))
+    except Exception as e:
+        generate_tfvars.log(f"[ERROR] fetch_iam_role failed for {role_name}: {e}")
+        return None
+
+def aiobotocore_client(account, max_in_flight=20, broker=None, assume_role=None):
+    """Open an aiobotocore IAM client for the account (an async context manager).
+
+    One client per account keeps its HTTP connections alive across every role fetched from it.
+    With a broker, the client's credentials refresh from the broker before they expire,
+    so an account that takes longer than the assumed role's lifetime keeps working.
+    """
+    if AioSession is None:
+        raise RuntimeError("--engine asyncio needs the 'aiobotocore' package")
+    config = AioConfig(max_pool_connections=max_in_flight, retries={"mode": "standard", "total_max_attempts": 1})
+    if broker is not None and assume_role:
+        return _brokered_client(account, config, broker, assume_role)
+    session = AioSession(profile=generate_tfvars.account_profile(account["alias"], account["id"]))
+    return session.create_client("iam", config=config)
+
+@contextlib.asynccontextmanager
+async def _brokered_client(account, config, broker, assume_role):
+    """aiobotocore IAM client on the broker's credentials; the broker's STS calls run off the event loop"""
+    async def refresh():
+        return await asyncio.to_thread(broker.metadata, account["id"], assume_role)
+
+    credentials = AioRefreshableCredentials.create_from_metadata(
+        metadata=await refresh(),
+        refresh_using=refresh,
+        method="sts-assume-role"
+    )
+    # Same windows as the broker's own credentials, so both refresh together
+    credentials._advisory_refresh_timeout = broker.refresh_margin
+    credentials._mandatory_refresh_timeout = min(broker.refresh_margin, 300)
+    session = AioSession()
+    session._credentials = credentials
+    async with session.create_client("iam", config=config) as client:
+        yield client
+
+def _client_context(client):
+    return client if hasattr(client, "__aenter__") else contextlib.nullcontext(client)
+
+async def generate_role_async(iam, account, suffix, policy_versions=None, profile_index=None):
+    """generate_tfvars.generate_role on the asyncio engine. Returns (role_name, status)."""
+    role_name = f"{account['alias']}-{suffix}"
+    output_file = Path(generate_tfvars.OUTPUT_ROOT) / account["alias"] / suffix / "terraform.tfvars"
+    generate_tfvars.log(f"[INFO] Generating: {role_name}")
+    # Each role runs in its own task, so the role stays set for every call it awaits
+    with instrumentation.role_context(role_name):
+        role_data = await fetch_iam_role_async(role_name, iam, policy_versions, profile_index=profile_index)
+    if not role_data:
+        return role_name, "failed"
+
+    inventory_export.export_role(account, role_data)
+    trust_graph.record_role(account, role_data)
+    content = generate_tfvars.render_tfvars(role_data, generate_tfvars.REGION, account["id"], account["alias"])
+    if not await asyncio.to_thread(write_if_changed, output_file, content):
+        generate_tfvars.log(f"[INFO] Up to date: {output_file}")
+        return role_name, "unchanged"
+    generate_tfvars.log(f"[SUCCESS] Wrote: {output_file}")
+    return role_name, "written"
+
+async def process_account_async(account, suffixes, client_factory, rate=8.0, max_in_flight=20, journal=None,
+                                resume=False, retry_failed=False):
+    """process_account on the asyncio engine: every role of the account is fetched concurrently,
+    limited by the account's token bucket and semaphore. Returns [(role_name, status), ...] in suffix order."""
+    if journal is not None:
+        todo = [s for s in suffixes
+                if journal.should_run(account["id"], f"{account['alias']}-{s}", resume, retry_failed)]
+    else:
+        todo = list(suffixes)
+    results = {suffix: (f"{account['alias']}-{suffix}", "skipped") for suffix in suffixes}
+    if not todo:
+        return list(results.values())
+
+    generate_tfvars.log(f"[INFO] Processing {account['alias']} ({account['id']})")
+    if journal is not None:
+        for suffix in todo:
+            journal.mark(account["id"], f"{account['alias']}-{suffix}", PENDING)
+    try:
+        async with _client_context(client_factory(account)) as client:
+            instrumentation.attach(client, account=account["alias"])
+            iam = AsyncIamCaller(client, TokenBucket(rate=rate, burst=max(1, int(rate))), max_in_flight)
+            policy_versions = {}
+            for filters in ({"OnlyAttached": True}, {"PolicyUsageFilter": "PermissionsBoundary"}):
+                for policy in await iam.list_all("list_policies", "Policies", Scope="Local", **filters):
+                    policy_versions[policy["Arn"]] = policy["DefaultVersionId"]
+            profile_index = await build_profile_index(iam)
+            outcomes = await asyncio.gather(*(
+                generate_role_async(iam, account, suffix, policy_versions, profile_index) for suffix in todo
+            ), return_exceptions=True)
+        # One role raising must not fail the roles that finished next to it
+        role_results = []
+        for suffix, outcome in zip(todo, outcomes):
+            if isinstance(outcome, BaseException):
+                generate_tfvars.log(f"[ERROR] Failed to generate {account['alias']}-{suffix}: {outcome}")
+                outcome = (f"{account['alias']}-{suffix}", "failed")
+            role_results.append(outcome)
+        generate_tfvars.prune_trust_graph(account, [name for name, status in role_results if status != "failed"],
+                                          {f"{account['alias']}-{suffix}" for suffix in todo}.__contains__)
+    except Exception as e:
+        generate_tfvars.log(f"[ERROR] Failed to fetch account {account['alias']}: {e}")
+        role_results = [(f"{account['alias']}-{suffix}", "failed") for suffix in todo]
+
+    for suffix, result in zip(todo, role_results):
+        results[suffix] = generate_tfvars.journal_result(journal, account, suffix, result) if journal else result
+    if journal is not None:
+        journal.flush()
+    return list(results.values())
+
+def run_sweep_async(accounts, suffixes=generate_tfvars.IAM_ROLE_SUFFIXES, workers=32, rate=8.0, max_in_flight=20,
+                    client_factory=None, journal=None, resume=False, retry_failed=False):
+    """run_sweep on one event loop: workers accounts at a time, max_in_flight requests per account.
+
+    client_factory(account) returns an IAM client (or async context manager yielding one);
+    it defaults to aiobotocore_client. Returns the same shape as run_sweep.
+    """
+    client_factory = client_factory or (lambda account: aiobotocore_client(account, max_in_flight))
+
+    async def sweep():
+        account_slots = asyncio.Semaphore(workers)
+
+        async def one(account):
+            async with account_slots:
+                return await process_account_async(account, suffixes, client_factory, rate, max_in_flight,
+                                                   journal, resume, retry_failed)
+
+        return await asyncio.gather(*(one(account) for account in accounts))
+
+    return list(zip(accounts, asyncio.run(sweep())))
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import generate_iam_role_tf
+import generate_tfvars
+import iam_calls
+import role_records
+from fake_iam import FakeIam, synthetic_org
+from iam_calls import IamCaller, TokenBucket
+from policy_cache import configure_shared_cache
+
+BENCHMARK_SUFFIXES = [
+    "read-only-runner-role",
+    "basic-runner-role",
+    "elevated-iam-runner-role",
+    "elevated-infra-runner-role",
+    "deploy-runner-role",
+    "audit-runner-role",
+    "break-glass-role"
+]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def _fake_caller(fake, rate):
+    # Short backoff: the fake's throttles are synthetic, we only want the retry path exercised
+    return IamCaller(fake, TokenBucket(rate=rate, burst=max(1, int(rate))), base_delay=0.01, max_delay=0.2)
+
+def run_sweep_benchmark(org, fakes, bulk, workers, role_workers, rate):
+    """Time generate_tfvars.run_sweep against the fakes; returns per-role latencies"""
+    latencies = []
+    lock = threading.Lock()
+    generate_role = generate_tfvars.generate_role
+    account_iam_client = generate_tfvars.account_iam_client
+
+    def timed_generate_role(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return generate_role(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    accounts = [{"alias": a["alias"], "id": a["account_id"]} for a in org]
+    generate_tfvars.account_iam_client = lambda alias, account_id, **kwargs: _fake_caller(fakes[account_id], rate)
+    generate_tfvars.generate_role = timed_generate_role
+    try:
+        generate_tfvars.run_sweep(accounts, BENCHMARK_SUFFIXES, bulk=bulk, workers=workers,
+                                  role_workers=role_workers, rate=rate)
+    finally:
+        generate_tfvars.generate_role = generate_role
+        generate_tfvars.account_iam_client = account_iam_client
+    return latencies
+
+def run_module_benchmark(org, fakes, rate):
+    """Time the single-role generate_iam_role_tf.generate_terraform path, one role after another"""
+    latencies = []
+    for account in org:
+        generate_iam_role_tf.iam_client = _fake_caller(fakes[account["account_id"]], rate)
+        for role_name in sorted(account["roles"]):
+            start = time.perf_counter()
+            generate_iam_role_tf.generate_terraform(role_name)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+def run_benchmark(accounts, mode, policy_fanout=4, latency=0.0, throttle_rate=0.0, workers=8, role_workers=2,
+                  rate=1000.0, seed=0):
+    """Run one fetch+render mode ("per-role", "bulk" or "module") over a synthetic org and return its metrics"""
+    org = synthetic_org(accounts, BENCHMARK_SUFFIXES, policy_fanout=policy_fanout, seed=seed)
+    fakes = {
+        a["account_id"]: FakeIam(a, latency=latency, throttle_rate=throttle_rate, seed=f"{seed}:{a['account_id']}")
+        for a in org
+    }
+    iam_calls.TOTAL_STATS = iam_calls.CallStats()
+    configure_shared_cache()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        generate_tfvars.OUTPUT_ROOT = os.path.join(workdir, "terraform_files")
+        role_records.LOG_FILE = os.path.join(workdir, "tfvars_generation.log")
+        role_records.LOG_ECHO = False
+        os.chdir(workdir)
+        start = time.perf_counter()
+        try:
+            if mode == "module":
+                latencies = run_module_benchmark(org, fakes, rate)
+            else:
+                latencies = run_sweep_benchmark(org, fakes, mode == "bulk", workers, role_workers, rate)
+        finally:
+            role_records.flush_log()
+            role_records.LOG_ECHO = True
+            os.chdir(cwd)
+        wall = time.perf_counter() - start
+
+    calls = Counter()
+    for fake in fakes.values():
+        calls.update(fake.calls)
+    stats = iam_calls.TOTAL_STATS.summary()
+    roles = sum(len(a["roles"]) for a in org)
+    return {
+        "mode": mode,
+        "accounts": accounts,
+        "roles": roles,
+        "api_calls": sum(calls.values()),
+        "calls_per_role": round(sum(calls.values()) / roles, 2),
+        "calls_by_operation": dict(sorted(calls.items())),
+        "retries": stats["retries"],
+        "throttles": stats["throttles"],
+        "p50_role_seconds": round(percentile(latencies, 50), 5),
+        "p99_role_seconds": round(percentile(latencies, 99), 5),
+        "wall_seconds": round(wall, 3)
+    }
+
+def print_table(results):
+    header = f"{'mode':<10}{'accounts':>9}{'roles':>7}{'calls':>9}{'calls/role':>11}{'retries':>9}{'p50 s':>9}{'p99 s':>9}{'wall s':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<10}{r['accounts']:>9}{r['roles']:>7}{r['api_calls']:>9}{r['calls_per_role']:>11}"
+              f"{r['retries']:>9}{r['p50_role_seconds']:>9}{r['p99_role_seconds']:>9}{r['wall_seconds']:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IAM fetch + render paths against an in-memory IAM backend")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 1000], help="Org sizes to run")
+    parser.add_argument("--modes", nargs="+", default=["per-role", "bulk"], choices=["per-role", "bulk", "module"])
+    parser.add_argument("--policy-fanout", type=int, default=4, help="Managed policies attached per role")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds slept per fake IAM call")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls failing with Throttling")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--role-workers", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Client-side IAM calls per second per account")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for accounts in args.accounts:
+        for mode in args.modes:
+            results.append(run_benchmark(accounts, mode, args.policy_fanout, args.latency, args.throttle_rate,
+                                         args.workers, args.role_workers, args.rate))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
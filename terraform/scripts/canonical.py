@@ -0,0 +1,187 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Statement keys in the order IAM documents them; anything else follows alphabetically
+STATEMENT_KEYS = ("Sid", "Effect", "Principal", "NotPrincipal", "Action", "NotAction", "Resource", "NotResource",
+                  "Condition")
+LIST_KEYS = ("Action", "NotAction", "Resource", "NotResource")
+
+def _key(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+def _sorted_unique(values):
+    unique = {_key(v): v for v in values}
+    return [unique[key] for key in sorted(unique)]
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+def _principal(value):
+    if not isinstance(value, dict):
+        return value
+    return {kind: _sorted_unique(_as_list(value[kind])) for kind in sorted(value)}
+
+def _condition(value):
+    if not isinstance(value, dict):
+        return value
+    return {
+        operator: {key: _sorted_unique(_as_list(conditions[key])) for key in sorted(conditions)}
+        if isinstance(conditions, dict) else conditions
+        for operator, conditions in sorted(value.items())
+    }
+
+def canonical_statement(statement):
+    """A new statement with every field in one form.
+
+    Action/NotAction/Resource/NotResource are sorted lists without duplicates, Principal
+    and NotPrincipal values are sorted lists per principal type, Condition operators, keys
+    and values are sorted, and keys follow STATEMENT_KEYS order.
+    """
+    out = {}
+    for key in sorted(statement, key=lambda k: (STATEMENT_KEYS.index(k) if k in STATEMENT_KEYS else len(STATEMENT_KEYS), k)):
+        value = statement[key]
+        if key in LIST_KEYS:
+            value = _sorted_unique(_as_list(value))
+        elif key in ("Principal", "NotPrincipal"):
+            value = _principal(value)
+        elif key == "Condition":
+            value = _condition(value)
+        out[key] = value
+    return out
+
+def canonical_statements(statements):
+    """Canonical statements sorted deterministically, identical statements kept once"""
+    if isinstance(statements, dict):
+        statements = [statements]
+    return _sorted_unique(canonical_statement(s) for s in statements or [])
+
+def canonical_document(document):
+    """Canonical form of a policy document given as a dict, JSON string or bare statement list"""
+    if isinstance(document, str):
+        document = json.loads(document) if document.strip() else {}
+    if not isinstance(document, dict):
+        return {"Statement": canonical_statements(document)}
+    out = {}
+    if "Version" in document:
+        out["Version"] = document["Version"]
+    if "Id" in document:
+        out["Id"] = document["Id"]
+    out["Statement"] = canonical_statements(document.get("Statement", []))
+    return out
+
+def document_hash(document):
+    """Stable content hash of a canonical document or statement list"""
+    return hashlib.sha256(_key(document).encode()).hexdigest()
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} is shared between records; copy.deepcopy it to get one to modify")
+
+class FrozenDict(dict):
+    """Read-only dict for interned documents; still a dict for isinstance checks and json.dumps"""
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+class FrozenList(list):
+    """Read-only list for interned documents; copies of it are plain, mutable lists"""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = clear = extend = insert = pop = remove = \
+        reverse = sort = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(value, memo) for value in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+def freeze(value):
+    """value with every dict and list replaced by a FrozenDict / FrozenList"""
+    if isinstance(value, dict):
+        return value if isinstance(value, FrozenDict) else FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return value if isinstance(value, FrozenList) else FrozenList(freeze(v) for v in value)
+    return value
+
+class DocumentStore:
+    """Interns canonical documents by content hash so identical policies across roles share one object.
+
+    At most max_documents are kept, least recently used first out: shared policies stay
+    interned while the per-role trust and inline documents of a long sweep are dropped,
+    so memory stays flat however many roles are processed. Interned documents are frozen
+    (FrozenDict / FrozenList): they are shared between records, so changing one in place
+    raises TypeError instead of silently changing every other record holding it.
+    """
+
+    def __init__(self, max_documents=4096):
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.deduplicated = 0
+        self.evicted = 0
+
+    def intern(self, document):
+        """Return (hash, shared read-only canonical object) for an already canonical document or statement list"""
+        digest = document_hash(document)
+        with self._lock:
+            shared = self._documents.get(digest)
+            if shared is None:
+                shared = self._documents[digest] = freeze(document)
+                if len(self._documents) > self.max_documents:
+                    self._documents.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._documents.move_to_end(digest)
+                self.deduplicated += 1
+        return digest, shared
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def __len__(self):
+        return len(self._documents)
+
+_store = DocumentStore()
+
+def shared_store():
+    return _store
+
+def canonicalize_record(record, store=None):
+    """Canonicalize every policy in a fetch_iam_role record and add document_hashes.
+
+    Trust and inline documents and customer managed statements are replaced by canonical,
+    interned read-only objects (deepcopy one to modify it); document_hashes maps "assume_role_policy", "inline/<name>",
+    "policy/<name>" and "boundary" to their content hashes. Returns the record.
+    """
+    store = store if store is not None else _store
+    hashes = {}
+    hashes["assume_role_policy"], record["assume_role_policy"] = store.intern(
+        canonical_document(record["assume_role_policy"])
+    )
+    inline = {}
+    for name, document in record["inline_policies"].items():
+        hashes[f"inline/{name}"], inline[name] = store.intern(canonical_document(document))
+    record["inline_policies"] = inline
+    for name, policy in record["customer_managed_policies"].items():
+        hashes[f"policy/{name}"], statements = store.intern(canonical_statements(policy["statements"]))
+        record["customer_managed_policies"][name] = dict(policy, statements=statements, hash=hashes[f"policy/{name}"])
+    boundary = record.get("permissions_boundary_policy")
+    if boundary:
+        hashes["boundary"], statements = store.intern(canonical_statements(boundary["statements"]))
+        record["permissions_boundary_policy"] = dict(boundary, statements=statements, hash=hashes["boundary"])
+    record["document_hashes"] = hashes
+    return record
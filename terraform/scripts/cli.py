@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import sys
+import threading
+
+DEFAULT_TFVARS = "terraform/terraform.tfvars"
+GENERATORS = {
+    "recent": "recent",
+    "v1": "generate_iam_role_tf",
+    "v2": "generate_iam_role_tf_v2"
+}
+STEP_SEPARATOR = "+"
+
+class Context:
+    """The boto3 session and IAM client shared by every step of one invocation.
+
+    Both are built on first use; after an assume step they are rebuilt once on the
+    assumed role's credentials, which later steps then use directly instead of reading
+    them back from a file. The sweep, drift and plan steps share one more broker that
+    assumes their per-account --assume-role from that session (see account_broker).
+    """
+
+    def __init__(self, profile=None, rate=8.0):
+        self.profile = profile
+        self.rate = rate
+        self.broker = None
+        self._session = None
+        self._iam = None
+        self._account_broker = None
+        self._lock = threading.Lock()
+
+    def assume(self, account_id, role_name, cache_file=None):
+        from credential_broker import CredentialBroker
+        with self._lock:
+            if self.broker is None:
+                import boto3
+                self.broker = CredentialBroker(boto3.Session(profile_name=self.profile), cache_file=cache_file)
+            self._session = self.broker.session(account_id, role_name)
+            self._iam = None
+            self._account_broker = None
+        return self.broker.credentials(account_id, role_name)
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import boto3
+                self._session = boto3.Session(profile_name=self.profile)
+            return self._session
+
+    @property
+    def iam(self):
+        session = self.session
+        with self._lock:
+            if self._iam is None:
+                import instrumentation
+                from iam_calls import CLIENT_CONFIG, IamCaller, TokenBucket
+                client = instrumentation.attach(session.client("iam", config=CLIENT_CONFIG))
+                self._iam = IamCaller(client, TokenBucket(rate=self.rate, burst=max(1, int(self.rate))))
+            return self._iam
+
+    def account_broker(self, cache_file=None):
+        """CredentialBroker for per-account roles, assuming them from the current session.
+
+        Built once per session, so every account's role is assumed once across all steps.
+        """
+        session = self.session
+        with self._lock:
+            if self._account_broker is None:
+                from credential_broker import CredentialBroker
+                self._account_broker = CredentialBroker(session, cache_file=cache_file)
+            return self._account_broker
+
+def _tfvars_role(path):
+    from recent import read_tfvars
+    return read_tfvars(path)
+
+def cmd_assume(ctx, args):
+    if args.account and args.role:
+        account_id, role_name = args.account, args.role
+    else:
+        from assume_role import read_tfvars
+        account_id, role_name = read_tfvars(args.tfvars)
+    frozen = ctx.assume(account_id, role_name, args.credential_cache).get_frozen_credentials()
+    if args.write_credentials:
+        # Only for shell steps outside this process; later subcommands use the session directly
+        with open(os.open(args.write_credentials, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            f.write(f"AWS_ACCESS_KEY_ID={frozen.access_key}\n")
+            f.write(f"AWS_SECRET_ACCESS_KEY={frozen.secret_key}\n")
+            f.write(f"AWS_SESSION_TOKEN={frozen.token}\n")
+    print(f"Assumed {role_name} in {account_id}", file=sys.stderr)
+
+def cmd_fetch(ctx, args):
+    import generate_tfvars
+    from instance_profiles import shared_index
+    roles = args.roles or [_tfvars_role(args.tfvars)]
+    index = shared_index(ctx.iam)
+    records = {name: generate_tfvars.fetch_iam_role(name, ctx.iam, profile_index=index) for name in roles}
+    failed = [name for name, record in records.items() if record is None]
+    content = json.dumps({name: record for name, record in records.items() if record is not None}, indent=2)
+    if args.output:
+        from render import write_if_changed
+        write_if_changed(args.output, content + "\n")
+    else:
+        print(content)
+    if failed:
+        print(f"[ERROR] Could not fetch: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+def cmd_generate(ctx, args):
+    import importlib
+    from render import RENDER_STATS
+    generator = importlib.import_module(GENERATORS[args.generator])
+    generator.iam_client = ctx.iam
+    generator.generate_terraform(args.role or generator.read_tfvars(args.tfvars), direct=args.direct,
+                                 policy_data=args.policy_data)
+    print(f"Terraform files: {RENDER_STATS.summary()}")
+
+def cmd_profiles(ctx, args):
+    import iam_list_profile
+    iam_list_profile.iam_client = ctx.iam
+    for role_name in args.roles or [_tfvars_role(args.tfvars)]:
+        iam_list_profile.get_instance_profiles_for_role(role_name)
+
+def _credential_cache(argv):
+    for i, arg in enumerate(argv):
+        if arg == "--credential-cache" and i + 1 < len(argv):
+            return argv[i + 1]
+        if arg.startswith("--credential-cache="):
+            return arg.split("=", 1)[1]
+    return None
+
+def cmd_sweep(ctx, args):
+    import generate_tfvars
+    generate_tfvars.main(args.args, broker=ctx.account_broker(_credential_cache(args.args)))
+
+def cmd_drift(ctx, args):
+    import drift
+    drift.main(args.args, broker=ctx.account_broker())
+
+def cmd_plan(ctx, args):
+    import terraform_runner
+    terraform_runner.main(args.args, broker=ctx.account_broker())
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Assume, fetch, generate and sweep in one process. Chain steps with "
+                    f"'{STEP_SEPARATOR}', e.g. assume {STEP_SEPARATOR} generate {STEP_SEPARATOR} profiles; "
+                    "they share one session and IAM client."
+    )
+    parser.add_argument("--profile", help="AWS profile for the base session (first step only)")
+    parser.add_argument("--rate", type=float, default=8.0, help="Max IAM requests per second (first step only)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("assume", help="Assume the target role; later steps run as it")
+    p.add_argument("--tfvars", default=DEFAULT_TFVARS, help="Read target_account and target_role from here")
+    p.add_argument("--account", help="Target account id (with --role, instead of the tfvars)")
+    p.add_argument("--role", help="Target role name")
+    p.add_argument("--credential-cache", help="Encrypted credential cache file shared between runs")
+    p.add_argument("--write-credentials", metavar="FILE",
+                   help="Also write the credentials as an env file for steps outside this process")
+    p.set_defaults(func=cmd_assume)
+
+    p = sub.add_parser("fetch", help="Print role records as JSON")
+    p.add_argument("roles", nargs="*", help="Role names; defaults to role_name in the tfvars")
+    p.add_argument("--tfvars", default=DEFAULT_TFVARS)
+    p.add_argument("--output", help="Write the JSON here instead of stdout")
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser("generate", help="Generate the iam_role module files for one role")
+    p.add_argument("role", nargs="?", help="Role name; defaults to role_name in the tfvars")
+    p.add_argument("--tfvars", default=DEFAULT_TFVARS)
+    p.add_argument("--generator", choices=sorted(GENERATORS), default="recent",
+                   help="recent.py, generate_iam_role_tf.py (v1) or generate_iam_role_tf_v2.py (v2)")
+    p.add_argument("--direct", action="store_true",
+                   help="Reference policy ARNs and the trust policy from locals instead of data sources")
+    p.add_argument("--policy-data", action="store_true",
+                   help="Also write the shared account_policies module for the role's managed policies")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("profiles", help="List instance profiles of roles")
+    p.add_argument("roles", nargs="*", help="Role names; defaults to role_name in the tfvars")
+    p.add_argument("--tfvars", default=DEFAULT_TFVARS)
+    p.set_defaults(func=cmd_profiles)
+
+    for name, func, script in (("sweep", cmd_sweep, "generate_tfvars.py"), ("drift", cmd_drift, "drift.py"),
+                               ("plan", cmd_plan, "terraform_runner.py")):
+        # Their own options are passed through untouched; see parse_step
+        p = sub.add_parser(name, help=f"Run {script} with the remaining arguments", add_help=False)
+        p.set_defaults(func=func, passthrough=True)
+    return parser
+
+def parse_step(parser, step):
+    args, extra = parser.parse_known_args(step)
+    if getattr(args, "passthrough", False):
+        args.args = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args
+
+def split_steps(argv):
+    steps = [[]]
+    for arg in argv:
+        if arg == STEP_SEPARATOR:
+            steps.append([])
+        else:
+            steps[-1].append(arg)
+    return [step for step in steps if step]
+
+def main(argv=None):
+    parser = build_parser()
+    steps = [parse_step(parser, step) for step in split_steps(sys.argv[1:] if argv is None else argv)]
+    if not steps:
+        parser.error("no subcommand given")
+    ctx = Context(steps[0].profile, steps[0].rate)
+    for args in steps:
+        try:
+            args.func(ctx, args)
+        except SystemExit as e:
+            # Stop the chain at the first failing step, like && in a shell
+            if e.code:
+                raise
+
+if __name__ == "__main__":
+    main()
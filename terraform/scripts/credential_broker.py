@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import botocore.session
+from botocore.credentials import RefreshableCredentials
+
+from iam_calls import CLIENT_CONFIG, IamCaller
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # optional, only needed for the encrypted on-disk cache
+    Fernet = None
+
+CACHE_KEY_ENV = "IAM_CREDENTIAL_CACHE_KEY"
+
+def _fernet(secret):
+    if Fernet is None:
+        raise RuntimeError("The encrypted credential cache needs the 'cryptography' package")
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest()))
+
+class CredentialBroker:
+    """Hands out boto3 Sessions for (account, role), assuming each role at most once per credential lifetime.
+
+    Credentials are shared between threads and refreshed by botocore before they expire
+    (refresh_margin seconds ahead). boto3 Sessions are not thread-safe, so every
+    session() call returns a new Session backed by the shared credentials.
+
+    With cache_file set, credentials are also kept in a local file encrypted with the
+    secret in $IAM_CREDENTIAL_CACHE_KEY so a later process can reuse them.
+    """
+
+    def __init__(self, base_session=None, session_name="GitLabAssumeRoleSession", duration=3600,
+                 refresh_margin=600, cache_file=None, region_name=None):
+        self.base_session = base_session or boto3.Session()
+        self.session_name = session_name
+        self.duration = duration
+        self.refresh_margin = refresh_margin
+        self.region_name = region_name
+        self.cache_file = cache_file
+        self.assume_count = 0
+        self._credentials = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._sts = None
+        self._cipher = None
+        if cache_file:
+            secret = os.environ.get(CACHE_KEY_ENV)
+            if not secret:
+                raise RuntimeError(f"Set {CACHE_KEY_ENV} to use the encrypted credential cache")
+            self._cipher = _fernet(secret)
+
+    def _sts_client(self):
+        with self._lock:
+            if self._sts is None:
+                self._sts = IamCaller(self.base_session.client("sts", config=CLIENT_CONFIG))
+            return self._sts
+
+    def _read_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "rb") as f:
+                return json.loads(self._cipher.decrypt(f.read()))
+        except (InvalidToken, ValueError):
+            return {}
+
+    def _write_cache(self, key, metadata):
+        if not self.cache_file:
+            return
+        with self._file_lock:
+            entries = self._read_cache()
+            entries[key] = metadata
+            tmp_path = f"{self.cache_file}.tmp"
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+                f.write(self._cipher.encrypt(json.dumps(entries).encode()))
+            os.replace(tmp_path, self.cache_file)
+
+    def _cached_metadata(self, key):
+        metadata = self._read_cache().get(key)
+        if not metadata:
+            return None
+        expiry = datetime.fromisoformat(metadata["expiry_time"])
+        if expiry - datetime.now(timezone.utc) < timedelta(seconds=self.refresh_margin):
+            return None
+        return metadata
+
+    def _assume(self, role_arn, key):
+        response = self._sts_client().assume_role(
+            RoleArn=role_arn,
+            RoleSessionName=self.session_name,
+            DurationSeconds=self.duration
+        )
+        with self._lock:
+            self.assume_count += 1
+        credentials = response["Credentials"]
+        metadata = {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": credentials["Expiration"].isoformat()
+        }
+        self._write_cache(key, metadata)
+        return metadata
+
+    def credentials(self, account_id, role_name):
+        """Return the shared RefreshableCredentials for a role, assuming it on first use"""
+        key = f"{account_id}:{role_name}"
+        with self._lock:
+            if key in self._credentials:
+                return self._credentials[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Threads asking for the same role wait for the first AssumeRole instead of making their own
+        with key_lock:
+            with self._lock:
+                if key in self._credentials:
+                    return self._credentials[key]
+            return self._create_credentials(account_id, role_name, key)
+
+    def _create_credentials(self, account_id, role_name, key):
+        role_arn = f"arn:aws:iam::{account_id}:role/{role_name}"
+        metadata = self._cached_metadata(key) or self._assume(role_arn, key)
+        credentials = RefreshableCredentials.create_from_metadata(
+            metadata=metadata,
+            refresh_using=lambda: self._assume(role_arn, key),
+            method="sts-assume-role"
+        )
+        # botocore refreshes inside these windows; keep both ahead of our own margin
+        credentials._advisory_refresh_timeout = self.refresh_margin
+        credentials._mandatory_refresh_timeout = min(self.refresh_margin, 300)
+
+        with self._lock:
+            self._credentials[key] = credentials
+        return credentials
+
+    def metadata(self, account_id, role_name):
+        """The role's current credentials as refresh metadata, renewed first when inside the refresh margin.
+
+        For clients that keep their own refreshable credentials (aiobotocore) but should
+        still share this broker's AssumeRole calls and cache.
+        """
+        credentials = self.credentials(account_id, role_name)
+        frozen = credentials.get_frozen_credentials()
+        return {
+            "access_key": frozen.access_key,
+            "secret_key": frozen.secret_key,
+            "token": frozen.token,
+            "expiry_time": credentials._expiry_time.isoformat()
+        }
+
+    def session(self, account_id, role_name):
+        """Return a new boto3 Session using the shared credentials for (account, role)"""
+        botocore_session = botocore.session.get_session()
+        botocore_session._credentials = self.credentials(account_id, role_name)
+        return boto3.Session(botocore_session=botocore_session, region_name=self.region_name)
@@ -0,0 +1,49 @@
+import json
+
+from render import write_if_changed
+
+# Direct mode: the generated role modules reference managed policy ARNs and the trust
+# policy from locals instead of data sources, so a plan makes no IAM reads for them.
+# Policy documents that are genuinely needed come from one shared per-account module.
+
+POLICY_DATA_MODULE_DIR = "modules/account_policies"
+
+POLICY_DATA_MODULE_TF = """
+variable "policy_arns" {
+  type = set(string)
+}
+
+data "aws_iam_policy" "this" {
+  for_each = var.policy_arns
+
+  arn = each.value
+}
+
+output "documents" {
+  value = { for arn, policy in data.aws_iam_policy.this : arn => policy.policy }
+}
+"""
+
+DIRECT_DATA_TF = """
+# Generated in direct mode: managed policy ARNs and the trust policy are referenced from
+# locals.tf, so there are no data sources to refresh on plan.
+"""
+
+def assume_policy_local(role_name):
+    """locals.tf entry for the trust policy: file() is read locally, jsonencode keeps the string stable"""
+    return (f'  iam_assume_role_policy      = jsonencode(jsondecode(file('
+            f'"${{path.module}}/policies/{role_name}_assume_policy.json")))\n')
+
+def render_policy_data_block(policy_arns):
+    """The module call listing each managed policy ARN once, however many roles attach it"""
+    return (
+        'module "account_policies" {\n'
+        f'  source      = "./{POLICY_DATA_MODULE_DIR}"\n'
+        f'  policy_arns = {json.dumps(sorted(set(policy_arns)), indent=4)}\n'
+        '}\n'
+    )
+
+def write_policy_data(terraform_dir, policy_arns):
+    """Write the shared account_policies module and its call; documents are then module.account_policies.documents[arn]"""
+    write_if_changed(f"{terraform_dir}/{POLICY_DATA_MODULE_DIR}/main.tf", POLICY_DATA_MODULE_TF)
+    write_if_changed(f"{terraform_dir}/account_policies.tf", render_policy_data_block(policy_arns))
@@ -0,0 +1,248 @@
+import argparse
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+
+import generate_tfvars
+from canonical import canonical_document
+from role_discovery import IAM_ROLE_SUFFIXES
+from snapshot_cache import SnapshotCache, fetch_snapshot, local_policy_versions
+from tfvars_parser import TfvarsSyntaxError, parse_tfvars, parse_tfvars_file
+
+IN_SYNC = "in_sync"
+DRIFTED = "drifted"
+MISSING_FILE = "missing_file"
+MISSING_ROLE = "missing_role"
+ERROR = "error"
+
+def normalize_policy(document):
+    """Order-insensitive form of a policy document (JSON string, dict or statement list)"""
+    return canonical_document(document)["Statement"]
+
+def _pairs(maps):
+    return sorted((k, v) for m in maps or [] for k, v in m.items())
+
+def normalize_tfvars(values):
+    """Comparable view of parsed role tfvars: policies order-insensitive, lists as sorted sets"""
+    out = {}
+    for key, value in values.items():
+        if key == "assume_role_policy" or key.startswith("inline_policy_"):
+            value = normalize_policy(value)
+        elif key == "customer_managed_policies":
+            value = {name: normalize_policy(policy.get("statements", [])) for name, policy in (value or {}).items()}
+        elif key in ("managed_arns",):
+            value = sorted(value or [])
+        elif key in ("tags", "instance_profile_tags"):
+            value = _pairs(value)
+        elif key == "instance_profiles":
+            value = {name: {"arn": p.get("arn"), "tags": _pairs(p.get("tags"))} for name, p in (value or {}).items()}
+        out[key] = value
+    return out
+
+def _statement_diff(live, generated):
+    return {
+        "added": [s for s in live if s not in generated],
+        "removed": [s for s in generated if s not in live]
+    }
+
+def diff_tfvars(live, generated):
+    """Structured changes from the generated tfvars to the live role, [] when in sync.
+
+    Only keys present in the generated file are compared, so files written before a
+    field was added to the template do not all show up as drifted.
+    """
+    changes = []
+    for key in sorted(generated):
+        live_value = live.get(key)
+        generated_value = generated[key]
+        if live_value == generated_value:
+            continue
+        if key == "assume_role_policy" or key.startswith("inline_policy_"):
+            changes.append(dict({"field": key}, **_statement_diff(live_value or [], generated_value)))
+        elif key in ("customer_managed_policies", "instance_profiles"):
+            live_value = live_value or {}
+            for name in sorted(set(live_value) | set(generated_value)):
+                if name not in generated_value:
+                    changes.append({"field": f"{key}.{name}", "added": live_value[name]})
+                elif name not in live_value:
+                    changes.append({"field": f"{key}.{name}", "removed": generated_value[name]})
+                elif live_value[name] != generated_value[name]:
+                    if key == "customer_managed_policies":
+                        changes.append(dict({"field": f"{key}.{name}"},
+                                            **_statement_diff(live_value[name], generated_value[name])))
+                    else:
+                        changes.append({"field": f"{key}.{name}", "live": live_value[name],
+                                        "generated": generated_value[name]})
+        elif isinstance(generated_value, list) and isinstance(live_value, list):
+            changes.append({"field": key, "added": [v for v in live_value if v not in generated_value],
+                            "removed": [v for v in generated_value if v not in live_value]})
+        else:
+            changes.append({"field": key, "live": live_value, "generated": generated_value})
+    for key in sorted(set(live) - set(generated)):
+        if key.startswith("inline_policy_"):
+            changes.append({"field": key, "added": live[key]})
+    return changes
+
+def role_targets(account, suffixes=IAM_ROLE_SUFFIXES, output_root=None):
+    """[(suffix, role_name)] to check: the given suffixes plus every role with generated tfvars.
+
+    Walking the account's output directory picks up roles written by --discover, whose
+    names come from the role_name in their file.
+    """
+    targets = {suffix: f"{account['alias']}-{suffix}" for suffix in suffixes}
+    account_dir = Path(output_root or generate_tfvars.OUTPUT_ROOT) / account["alias"]
+    for path in sorted(account_dir.glob("*/terraform.tfvars")):
+        suffix = path.parent.name
+        if suffix in targets:
+            continue
+        try:
+            role_name = parse_tfvars_file(path).get("role_name")
+        except TfvarsSyntaxError:
+            role_name = None
+        targets[suffix] = role_name if isinstance(role_name, str) else f"{account['alias']}-{suffix}"
+    return list(targets.items())
+
+def check_role(account, suffix, record, output_root=None, role_name=None):
+    """Compare one live record (None if the role is gone) with its generated tfvars.
+
+    Returns {"account", "role_name", "status", "changes"}.
+    """
+    role_name = role_name or f"{account['alias']}-{suffix}"
+    path = Path(output_root or generate_tfvars.OUTPUT_ROOT) / account["alias"] / suffix / "terraform.tfvars"
+    result = {"account": account["alias"], "role_name": role_name, "path": str(path), "changes": []}
+    if not path.exists():
+        result["status"] = IN_SYNC if record is None else MISSING_FILE
+        return result
+    if record is None:
+        result["status"] = MISSING_ROLE
+        return result
+    try:
+        generated = normalize_tfvars(parse_tfvars_file(path))
+    except TfvarsSyntaxError as e:
+        result.update(status=ERROR, error=f"Could not parse {path}: {e}")
+        return result
+    rendered = generate_tfvars.render_tfvars(record, generate_tfvars.REGION, account["id"], account["alias"])
+    result["changes"] = diff_tfvars(normalize_tfvars(parse_tfvars(rendered)), generated)
+    result["status"] = DRIFTED if result["changes"] else IN_SYNC
+    return result
+
+def _revalidated_records(iam, account, role_names, cache):
+    """{role_name: record}, reusing the cached record of every role whose live signature still matches"""
+    policy_versions = local_policy_versions(iam)
+    records = {}
+    for role_name in role_names:
+        try:
+            snapshot = fetch_snapshot(iam, role_name, policy_versions)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchEntity":
+                continue
+            raise
+        if cache.is_current(account["id"], role_name, snapshot["signature"]):
+            records[role_name] = cache.get(account["id"], role_name)[1]
+            continue
+        record = generate_tfvars.fetch_iam_role(role_name, iam, policy_versions, snapshot=snapshot)
+        if record is None:
+            raise RuntimeError(f"Could not fetch {role_name}")
+        records[role_name] = record
+    return records
+
+def live_records(account, role_names, cache=None, rate=8.0, broker=None, assume_role=None):
+    """{role_name: record} for the account's live roles.
+
+    Without a snapshot cache this is one authorization-details walk. With one, each role
+    is revalidated with fetch_snapshot and only roles whose signature changed since the
+    last sweep are fetched in full; the rest come from the cache.
+    """
+    iam = generate_tfvars.account_iam_client(account["alias"], account["id"], rate=rate, broker=broker,
+                                             assume_role=assume_role)
+    if cache is not None:
+        return _revalidated_records(iam, account, role_names, cache)
+    return generate_tfvars.fetch_account_roles(iam, role_names=role_names)
+
+def check_account(account, suffixes=IAM_ROLE_SUFFIXES, cache=None, rate=8.0, broker=None, assume_role=None,
+                  output_root=None):
+    """Drift results for every suffix of one account and every other role it has tfvars for"""
+    targets = role_targets(account, suffixes, output_root)
+    try:
+        records = live_records(account, [role_name for _, role_name in targets], cache, rate, broker, assume_role)
+    except Exception as e:
+        return [{"account": account["alias"], "role_name": role_name, "status": ERROR, "changes": [],
+                 "error": str(e)} for _, role_name in targets]
+    return [check_role(account, suffix, records.get(role_name), output_root, role_name)
+            for suffix, role_name in targets]
+
+def run_drift(accounts, suffixes=IAM_ROLE_SUFFIXES, workers=8, cache=None, rate=8.0, broker=None,
+              assume_role=None, output_root=None):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            lambda account: check_account(account, suffixes, cache, rate, broker, assume_role, output_root),
+            accounts
+        )
+        return [result for account_results in results for result in account_results]
+
+def print_result(result):
+    print(f"[{result['status'].upper()}] {result['role_name']}")
+    if result.get("error"):
+        print(f"    {result['error']}")
+    for change in result["changes"]:
+        print(f"    {change['field']}:")
+        for key in ("added", "removed"):
+            if key in change:
+                for item in change[key] if isinstance(change[key], list) else [change[key]]:
+                    print(f"      {'+' if key == 'added' else '-'} {json.dumps(item, sort_keys=True)}")
+        if "live" in change:
+            print(f"      - {json.dumps(change['generated'], sort_keys=True)}")
+            print(f"      + {json.dumps(change['live'], sort_keys=True)}")
+
+def main(argv=None, broker=None):
+    """Run the drift check; broker is used for --assume-role instead of a new CredentialBroker"""
+    parser = argparse.ArgumentParser(description="Diff live IAM roles against the generated terraform.tfvars")
+    parser.add_argument("--cache-dir",
+                        help="Snapshot cache of the sweep; roles whose live signature still matches it are not "
+                             "fetched in full")
+    parser.add_argument("--workers", type=int, default=8, help="Accounts checked concurrently")
+    parser.add_argument("--rate", type=float, default=8.0, help="Max IAM requests per second per account")
+    parser.add_argument("--assume-role", help="Assume this role in every account instead of per-account profiles")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per role")
+    parser.add_argument("--all", action="store_true", help="Also print roles that are in sync")
+    args = parser.parse_args(argv)
+
+    try:
+        accounts = generate_tfvars.load_accounts()
+    except ValueError as e:
+        parser.error(str(e))
+    cache = SnapshotCache(args.cache_dir, render_version=generate_tfvars.RENDER_VERSION) if args.cache_dir else None
+    if not args.assume_role:
+        broker = None
+    elif broker is None:
+        from credential_broker import CredentialBroker
+        broker = CredentialBroker()
+    try:
+        results = run_drift(accounts, workers=args.workers, cache=cache, rate=args.rate,
+                            broker=broker, assume_role=args.assume_role)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    for result in results:
+        if result["status"] == IN_SYNC and not args.all:
+            continue
+        if args.json:
+            print(json.dumps(result, sort_keys=True))
+        else:
+            print_result(result)
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print(f"Drift check: {counts}", file=sys.stderr)
+    if any(r["status"] in (DRIFTED, MISSING_FILE, MISSING_ROLE) for r in results):
+        sys.exit(1)
+    if counts.get(ERROR):
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
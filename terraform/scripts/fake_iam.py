@@ -0,0 +1,280 @@
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+# Operations whose responses are lists the fake pages through with Marker/MaxItems
+LIST_KEYS = {
+    "list_attached_role_policies": "AttachedPolicies",
+    "list_role_policies": "PolicyNames",
+    "list_role_tags": "Tags",
+    "list_instance_profiles_for_role": "InstanceProfiles",
+    "list_instance_profile_tags": "Tags",
+    "list_policies": "Policies",
+    "list_roles": "Roles",
+    "list_instance_profiles": "InstanceProfiles",
+}
+
+class NoSuchEntityException(ClientError):
+    pass
+
+def _error(code, operation, message=""):
+    cls = NoSuchEntityException if code == "NoSuchEntity" else ClientError
+    return cls({"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": 400}}, operation)
+
+def synthetic_account(account_id, alias, suffixes, policy_fanout=4, inline_policies=2, shared_policies=5,
+                      extra_roles=0, seed=0):
+    """Build one fake account: a role per suffix (plus extra_roles noise roles), each attached to
+    policy_fanout managed policies drawn from a small shared pool, so policy reuse looks like a real org."""
+    rng = random.Random(f"{seed}:{account_id}")
+    policies = {}
+    for i in range(shared_policies):
+        arn = f"arn:aws:iam::{account_id}:policy/baseline-{i}"
+        policies[arn] = {
+            "PolicyName": f"baseline-{i}",
+            "Arn": arn,
+            "PolicyId": f"ANPA{account_id}{i}",
+            "DefaultVersionId": f"v{rng.randint(1, 5)}",
+            "Document": {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {"Effect": "Allow", "Action": f"s3:Get{j}", "Resource": f"arn:aws:s3:::bucket-{i}-{j}/*"}
+                    for j in range(3)
+                ]
+            }
+        }
+    aws_managed = [f"arn:aws:iam::aws:policy/AwsManaged{i}" for i in range(10)]
+
+    roles = {}
+    names = [f"{alias}-{suffix}" for suffix in suffixes] + [f"{alias}-extra-{i}" for i in range(extra_roles)]
+    for index, name in enumerate(names):
+        attached = rng.sample(list(policies), min(policy_fanout // 2, len(policies)))
+        attached += rng.sample(aws_managed, policy_fanout - len(attached))
+        roles[name] = {
+            "RoleName": name,
+            "RoleId": f"AROA{account_id}{index}",
+            "Arn": f"arn:aws:iam::{account_id}:role/{name}",
+            "Path": "/",
+            "CreateDate": datetime(2024, 1, 1, tzinfo=timezone.utc),
+            "AssumeRolePolicyDocument": {
+                "Version": "2012-10-17",
+                "Statement": [{
+                    "Effect": "Allow",
+                    "Principal": {"AWS": f"arn:aws:iam::{rng.randint(10 ** 11, 10 ** 12 - 1)}:root"},
+                    "Action": "sts:AssumeRole"
+                }]
+            },
+            "PermissionsBoundary": {"PermissionsBoundaryType": "Policy",
+                                    "PermissionsBoundaryArn": f"arn:aws:iam::{account_id}:policy/boundary"},
+            "Tags": [{"Key": "team", "Value": f"team-{index % 3}"}],
+            "attached": attached,
+            "inline": {
+                f"inline-{i}": {
+                    "Version": "2012-10-17",
+                    "Statement": [{"Effect": "Allow", "Action": ["sqs:SendMessage"], "Resource": f"arn:aws:sqs:*:{account_id}:q{i}"}]
+                }
+                for i in range(inline_policies)
+            },
+            "instance_profiles": [f"{name}-profile"] if index % 2 == 0 else []
+        }
+    boundary = f"arn:aws:iam::{account_id}:policy/boundary"
+    policies[boundary] = {
+        "PolicyName": "boundary",
+        "Arn": boundary,
+        "PolicyId": f"ANPA{account_id}B",
+        "DefaultVersionId": "v1",
+        "Document": {
+            "Version": "2012-10-17",
+            "Statement": [
+                {"Effect": "Allow", "Action": ["s3:*", "sqs:*"], "Resource": "*"},
+                {"Effect": "Deny", "Action": "iam:*", "Resource": "*"}
+            ]
+        }
+    }
+    return {"account_id": account_id, "alias": alias, "roles": roles, "policies": policies}
+
+def synthetic_org(accounts, suffixes, **kwargs):
+    """Return [account, ...] for accounts fake accounts named acct0000..."""
+    return [
+        synthetic_account(f"{100000000000 + i}", f"acct{i:04d}", suffixes, **kwargs)
+        for i in range(accounts)
+    ]
+
+class _FakePaginator:
+    def __init__(self, client, operation):
+        self._client = client
+        self._operation = operation
+
+    def paginate(self, **kwargs):
+        while True:
+            page = getattr(self._client, self._operation)(**kwargs)
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            kwargs["Marker"] = page["Marker"]
+
+class FakeIam:
+    """In-memory stand-in for a boto3 IAM client over one synthetic account.
+
+    latency seconds are slept per call and throttle_rate is the chance a call fails with
+    Throttling, so retry and rate limiting paths run as they would against AWS.
+    """
+
+    def __init__(self, account, latency=0.0, throttle_rate=0.0, page_size=100, seed=0):
+        self.account = account
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.page_size = page_size
+        self.calls = Counter()
+        self.exceptions = SimpleNamespace(NoSuchEntityException=NoSuchEntityException)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+            throttled = self._rng.random() < self.throttle_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            raise _error("Throttling", operation, "Rate exceeded")
+
+    def _role(self, operation, role_name):
+        role = self.account["roles"].get(role_name)
+        if role is None:
+            raise _error("NoSuchEntity", operation, f"The role with name {role_name} cannot be found.")
+        return role
+
+    def _page(self, operation, items, Marker=None, MaxItems=None):
+        start = int(Marker or 0)
+        size = MaxItems or self.page_size
+        page = {LIST_KEYS.get(operation, "Items"): items[start:start + size], "IsTruncated": start + size < len(items)}
+        if page["IsTruncated"]:
+            page["Marker"] = str(start + size)
+        return page
+
+    def _policy(self, operation, policy_arn):
+        policy = self.account["policies"].get(policy_arn)
+        if policy is None and ":aws:policy/" in policy_arn:
+            policy = {"PolicyName": policy_arn.split("/")[-1], "Arn": policy_arn, "DefaultVersionId": "v1",
+                      "Document": {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": "*:List*", "Resource": "*"}]}}
+        if policy is None:
+            raise _error("NoSuchEntity", operation, f"Policy {policy_arn} was not found.")
+        return policy
+
+    @staticmethod
+    def _public(role, tags=True):
+        """The role as IAM returns it; the list operations leave out Tags"""
+        hidden = ("attached", "inline", "instance_profiles") if tags else ("attached", "inline", "instance_profiles", "Tags")
+        return {k: v for k, v in role.items() if k not in hidden}
+
+    def _instance_profile(self, name, role, tags=False):
+        """The profile as IAM returns it; only get_account_authorization_details includes Tags"""
+        profile = {"InstanceProfileName": name, "InstanceProfileId": f"AIPA{name}",
+                   "Arn": f"arn:aws:iam::{self.account['account_id']}:instance-profile/{name}",
+                   "Path": "/", "Roles": [self._public(role, tags)]}
+        if tags:
+            profile["Tags"] = [{"Key": "profile", "Value": name}]
+        return profile
+
+    def get_paginator(self, operation):
+        return _FakePaginator(self, operation)
+
+    def get_role(self, RoleName):
+        self._call("get_role")
+        return {"Role": self._public(self._role("get_role", RoleName))}
+
+    def list_roles(self, PathPrefix="/", Marker=None, MaxItems=None):
+        self._call("list_roles")
+        roles = [self._public(r, tags=False) for r in self.account["roles"].values() if r["Path"].startswith(PathPrefix)]
+        return self._page("list_roles", roles, Marker, MaxItems)
+
+    def list_attached_role_policies(self, RoleName, Marker=None, MaxItems=None):
+        self._call("list_attached_role_policies")
+        role = self._role("list_attached_role_policies", RoleName)
+        attached = [{"PolicyName": arn.split("/")[-1], "PolicyArn": arn} for arn in role["attached"]]
+        return self._page("list_attached_role_policies", attached, Marker, MaxItems)
+
+    def get_policy(self, PolicyArn):
+        self._call("get_policy")
+        policy = self._policy("get_policy", PolicyArn)
+        return {"Policy": {k: v for k, v in policy.items() if k != "Document"}}
+
+    def get_policy_version(self, PolicyArn, VersionId):
+        self._call("get_policy_version")
+        policy = self._policy("get_policy_version", PolicyArn)
+        return {"PolicyVersion": {"Document": json.loads(json.dumps(policy["Document"])),
+                                  "VersionId": VersionId, "IsDefaultVersion": VersionId == policy["DefaultVersionId"]}}
+
+    def list_policies(self, Scope="All", OnlyAttached=False, PolicyUsageFilter=None, Marker=None, MaxItems=None):
+        self._call("list_policies")
+        boundaries = {r["PermissionsBoundary"]["PermissionsBoundaryArn"] for r in self.account["roles"].values()
+                      if r.get("PermissionsBoundary")}
+        policies = [{k: v for k, v in p.items() if k != "Document"} for p in self.account["policies"].values()
+                    if PolicyUsageFilter != "PermissionsBoundary" or p["Arn"] in boundaries]
+        return self._page("list_policies", policies, Marker, MaxItems)
+
+    def list_role_policies(self, RoleName, Marker=None, MaxItems=None):
+        self._call("list_role_policies")
+        return self._page("list_role_policies", sorted(self._role("list_role_policies", RoleName)["inline"]),
+                          Marker, MaxItems)
+
+    def get_role_policy(self, RoleName, PolicyName):
+        self._call("get_role_policy")
+        role = self._role("get_role_policy", RoleName)
+        if PolicyName not in role["inline"]:
+            raise _error("NoSuchEntity", "get_role_policy", f"Policy {PolicyName} not found.")
+        return {"RoleName": RoleName, "PolicyName": PolicyName,
+                "PolicyDocument": json.loads(json.dumps(role["inline"][PolicyName]))}
+
+    def list_role_tags(self, RoleName, Marker=None, MaxItems=None):
+        self._call("list_role_tags")
+        return self._page("list_role_tags", self._role("list_role_tags", RoleName)["Tags"], Marker, MaxItems)
+
+    def list_instance_profiles_for_role(self, RoleName, Marker=None, MaxItems=None):
+        self._call("list_instance_profiles_for_role")
+        role = self._role("list_instance_profiles_for_role", RoleName)
+        profiles = [self._instance_profile(name, role) for name in role["instance_profiles"]]
+        return self._page("list_instance_profiles_for_role", profiles, Marker, MaxItems)
+
+    def list_instance_profiles(self, PathPrefix="/", Marker=None, MaxItems=None):
+        self._call("list_instance_profiles")
+        profiles = [self._instance_profile(name, role) for role in self.account["roles"].values()
+                    for name in role["instance_profiles"]]
+        return self._page("list_instance_profiles", profiles, Marker, MaxItems)
+
+    def list_instance_profile_tags(self, InstanceProfileName, Marker=None, MaxItems=None):
+        self._call("list_instance_profile_tags")
+        return self._page("list_instance_profile_tags", [{"Key": "profile", "Value": InstanceProfileName}],
+                          Marker, MaxItems)
+
+    def get_account_authorization_details(self, Filter=None, Marker=None, MaxItems=None):
+        self._call("get_account_authorization_details")
+        start = int(Marker or 0)
+        size = MaxItems or self.page_size
+        roles = list(self.account["roles"].values())
+        page_roles = roles[start:start + size]
+        details = [dict(self._public(role),
+                        AttachedManagedPolicies=[{"PolicyName": a.split("/")[-1], "PolicyArn": a} for a in role["attached"]],
+                        RolePolicyList=[{"PolicyName": n, "PolicyDocument": urllib.parse.quote(json.dumps(d))}
+                                        for n, d in sorted(role["inline"].items())],
+                        InstanceProfileList=[self._instance_profile(n, role, tags=True)
+                                             for n in role["instance_profiles"]])
+                   for role in page_roles]
+        page = {"RoleDetailList": details, "Policies": [], "IsTruncated": start + size < len(roles)}
+        if start == 0:
+            page["Policies"] = [
+                dict({k: v for k, v in p.items() if k != "Document"},
+                     PolicyVersionList=[{"Document": p["Document"], "VersionId": p["DefaultVersionId"],
+                                         "IsDefaultVersion": True}])
+                for p in self.account["policies"].values()
+            ]
+        if page["IsTruncated"]:
+            page["Marker"] = str(start + size)
+        return page
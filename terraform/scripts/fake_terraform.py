@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Stand-in terraform binary for exercising terraform_runner.py without providers or AWS.
+
+init fills $TF_PLUGIN_CACHE_DIR once and marks $TF_DATA_DIR. validate fails when the
+working directory's own terraform.tfvars contains FAKE_TF_INVALID; plan fails for tfvars
+containing FAKE_TF_INVALID and exits 2 (changes) for tfvars containing FAKE_TF_CHANGES,
+otherwise 0. $FAKE_TF_DELAY seconds are slept per command.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+def _tfvars(args, workdir):
+    for arg in args:
+        if arg.startswith("-var-file="):
+            return Path(arg.split("=", 1)[1]).read_text()
+    path = workdir / "terraform.tfvars"
+    return path.read_text() if path.exists() else ""
+
+def main(argv):
+    workdir = Path(".")
+    args = []
+    for arg in argv:
+        if arg.startswith("-chdir="):
+            workdir = Path(arg.split("=", 1)[1])
+        else:
+            args.append(arg)
+    if not args:
+        print("Usage: terraform [global options] <subcommand> [args]")
+        return 1
+    time.sleep(float(os.environ.get("FAKE_TF_DELAY", "0")))
+    command, rest = args[0], args[1:]
+    data_dir = Path(os.environ.get("TF_DATA_DIR", workdir / ".terraform"))
+
+    if command == "init":
+        cache = os.environ.get("TF_PLUGIN_CACHE_DIR")
+        if cache:
+            provider = Path(cache) / "registry.terraform.io" / "hashicorp" / "aws"
+            if provider.exists():
+                print("- Using hashicorp/aws from the shared cache directory")
+            else:
+                provider.mkdir(parents=True)
+                print("- Installing hashicorp/aws...")
+        data_dir.mkdir(parents=True, exist_ok=True)
+        (data_dir / "initialized").write_text(str(workdir))
+        print("Terraform has been successfully initialized!")
+        return 0
+    if not (data_dir / "initialized").exists():
+        print("Error: Module not installed; run terraform init")
+        return 1
+    if command == "validate":
+        if "FAKE_TF_INVALID" in _tfvars([], workdir):
+            print("Error: Invalid value for variable")
+            return 1
+        print("Success! The configuration is valid.")
+        return 0
+    if command == "plan":
+        tfvars = _tfvars(rest, workdir)
+        if "FAKE_TF_INVALID" in tfvars:
+            print("Error: Invalid value for variable")
+            return 1
+        if "FAKE_TF_CHANGES" in tfvars:
+            print("Plan: 1 to add, 0 to change, 0 to destroy.")
+            return 2 if "-detailed-exitcode" in rest else 0
+        print("No changes. Your infrastructure matches the configuration.")
+        return 0
+    print(f"Error: unknown command {command}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
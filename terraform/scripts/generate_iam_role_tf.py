@@ -1,10 +1,17 @@
+import argparse
 import boto3
 import json
 import os
 import sys
 
-# Initialize boto3 IAM client
-iam_client = boto3.client('iam')
+import direct_tf
+from iam_calls import CLIENT_CONFIG, IamCaller, LazyClient, list_all
+from instance_profiles import shared_index
+from render import RENDER_STATS, write_if_changed
+from tfvars_parser import TfvarsSyntaxError, parse_tfvars_file
+
+# IAM client (rate limited, retries throttling), built on first use
+iam_client = LazyClient(lambda: IamCaller(boto3.client('iam', config=CLIENT_CONFIG)))
 
 def read_tfvars(file_path):
     """Read terraform.tfvars and extract role_name. Exit if not found."""
@@ -12,12 +19,11 @@ def read_tfvars(file_path):
         print(f"[ERROR] Required file '{file_path}' not found. Please create it with role_name.")
         sys.exit(1)
 
-    role_name = None
-    with open(file_path, "r") as f:
-        for line in f:
-            if line.startswith("role_name"):
-                role_name = line.split("=")[1].strip().replace('"', '')
-                break
+    try:
+        role_name = parse_tfvars_file(file_path).get("role_name")
+    except TfvarsSyntaxError as e:
+        print(f"[ERROR] Could not parse {file_path}: {e}")
+        sys.exit(1)
 
     if not role_name:
         print(f"[ERROR] 'role_name' is missing in {file_path}. It is a mandatory field.")
@@ -30,25 +36,25 @@ def get_assume_role_policy(role_name):
     try:
         role_details = iam_client.get_role(RoleName=role_name)
         return role_details['Role']['AssumeRolePolicyDocument']
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] Could not retrieve Assume Role Policy for '{role_name}': {e}")
         return None
 
 def get_attached_policies(role_name):
     """Fetch Managed Policies attached to an IAM Role"""
     try:
-        policies = iam_client.list_attached_role_policies(RoleName=role_name)['AttachedPolicies']
+        policies = list_all(iam_client, 'list_attached_role_policies', 'AttachedPolicies', RoleName=role_name)
         return [policy['PolicyArn'] for policy in policies]
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Managed Policies found for '{role_name}': {e}")
         return []
 
 def get_inline_policies(role_name):
     """Fetch Inline Policies attached to an IAM Role"""
     try:
-        policies = iam_client.list_role_policies(RoleName=role_name)['PolicyNames']
+        policies = list_all(iam_client, 'list_role_policies', 'PolicyNames', RoleName=role_name)
         return policies
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Inline Policies found for '{role_name}': {e}")
         return []
 
@@ -56,7 +62,7 @@ def get_inline_policy_document(role_name, policy_name):
     """Fetch the policy document for an Inline Policy"""
     try:
         return iam_client.get_role_policy(RoleName=role_name, PolicyName=policy_name)['PolicyDocument']
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] Could not retrieve Inline Policy '{policy_name}': {e}")
         return None
 
@@ -65,32 +71,38 @@ def get_permissions_boundary(role_name):
     try:
         role_details = iam_client.get_role(RoleName=role_name)
         return role_details['Role'].get('PermissionsBoundary', {}).get('PermissionsBoundaryArn')
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Permissions Boundary found for '{role_name}': {e}")
         return None
 
 def get_instance_profile(role_name):
-    """Fetch Instance Profile associated with the IAM Role"""
+    """Fetch Instance Profile associated with the IAM Role from the account-wide instance profile index"""
     try:
-        instance_profiles = iam_client.list_instance_profiles_for_role(RoleName=role_name)
-        if instance_profiles['InstanceProfiles']:
-            return instance_profiles['InstanceProfiles'][0]['InstanceProfileName']
+        profile_names = shared_index(iam_client).profile_names(role_name)
+        if len(profile_names) > 1:
+            print(f"[WARNING] '{role_name}' is in {len(profile_names)} instance profiles, using {profile_names[0]}")
+        if profile_names:
+            return profile_names[0]
         return None
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Instance Profile found for '{role_name}': {e}")
         return None
 
 def get_role_tags(role_name):
     """Fetch IAM Role Tags"""
     try:
-        tags_response = iam_client.list_role_tags(RoleName=role_name)
-        return {tag['Key']: tag['Value'] for tag in tags_response.get('Tags', [])}
-    except Exception as e:
+        tags = list_all(iam_client, 'list_role_tags', 'Tags', RoleName=role_name)
+        return {tag['Key']: tag['Value'] for tag in tags}
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Tags found for '{role_name}': {e}")
         return {}
 
-def generate_terraform(role_name):
-    """Generate Terraform Configuration using locals.tf and data.tf"""
+def generate_terraform(role_name, direct=False, policy_data=False):
+    """Generate Terraform Configuration using locals.tf and data.tf.
+
+    With direct=True the module gets no data sources (see direct_tf.py); policy_data also
+    writes the shared account_policies module for the role's managed policies.
+    """
     module_dir = "terraform/modules/iam_role/"
     os.makedirs(module_dir, exist_ok=True)
 
@@ -99,8 +111,7 @@ def generate_terraform(role_name):
     assume_policy_file = f"{module_dir}/policies/{role_name}_assume_policy.json"
 
     if assume_role_policy:
-        with open(assume_policy_file, 'w') as f:
-            json.dump(assume_role_policy, f, indent=2)
+        write_if_changed(assume_policy_file, json.dumps(assume_role_policy, indent=2))
 
         assume_policy_tf = f"""
 data "aws_iam_policy_document" "instance_assume_role_policy" {{
@@ -130,10 +141,12 @@ locals {{
     if instance_profile_name:
         locals_tf += f'  iam_instance_profile_name = "{instance_profile_name}"\n'
 
+    if direct:
+        locals_tf += direct_tf.assume_policy_local(role_name)
+
     locals_tf += "}\n"
 
-    with open(f"{module_dir}/locals.tf", 'w') as f:
-        f.write(locals_tf)
+    write_if_changed(f"{module_dir}/locals.tf", locals_tf)
 
     # Generate `data.tf`
     data_tf = assume_policy_tf
@@ -146,14 +159,22 @@ data "aws_iam_policy" "{policy_name}" {{
 }}
 """
 
-    with open(f"{module_dir}/data.tf", 'w') as f:
-        f.write(data_tf)
+    if direct:
+        # No data sources: locals.tf references the ARNs and the trust policy file directly
+        data_tf = direct_tf.DIRECT_DATA_TF
+
+    write_if_changed(f"{module_dir}/data.tf", data_tf)
+
+    if policy_data:
+        direct_tf.write_policy_data("terraform", managed_policies)
 
     # Generate `main.tf`
+    assume_role_ref = "local.iam_assume_role_policy" if direct else \
+        "data.aws_iam_policy_document.instance_assume_role_policy.json"
     main_tf = f"""
 resource "aws_iam_role" "{role_name}" {{
   name               = local.iam_role_name
-  assume_role_policy = data.aws_iam_policy_document.instance_assume_role_policy.json
+  assume_role_policy = {assume_role_ref}
   managed_policy_arns = local.iam_managed_policy_arns
 """
 
@@ -172,8 +193,7 @@ resource "aws_iam_instance_profile" "{role_name}" {{
 }}
 """
 
-    with open(f"{module_dir}/main.tf", 'w') as f:
-        f.write(main_tf)
+    write_if_changed(f"{module_dir}/main.tf", main_tf)
 
     # Generate `iam_role.tf` to call the module
     iam_role_tf = f"""
@@ -182,11 +202,17 @@ module "iam_role" {{
   role_name = "{role_name}"
 }}
 """
-    with open("terraform/iam_role.tf", 'w') as f:
-        f.write(iam_role_tf)
+    write_if_changed("terraform/iam_role.tf", iam_role_tf)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the iam_role module for the role_name in terraform.tfvars")
+    parser.add_argument("--direct", action="store_true",
+                        help="Reference policy ARNs and the trust policy from locals instead of data sources")
+    parser.add_argument("--policy-data", action="store_true",
+                        help="Also write the shared account_policies module for the role's managed policies")
+    args = parser.parse_args()
     tfvars_path = "terraform/terraform.tfvars"
     role_name = read_tfvars(tfvars_path)
-    generate_terraform(role_name)
+    generate_terraform(role_name, direct=args.direct, policy_data=args.policy_data)
+    print(f"Terraform files: {RENDER_STATS.summary()}")
 
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import direct_tf
+import recent
+from recent import get_attached_policies, get_instance_profile
+from render import RENDER_STATS, write_if_changed
+from role_discovery import IAM_ROLE_SUFFIXES
+from tfvars_parser import TfvarsSyntaxError, parse_tfvars_file
+
+TERRAFORM_DIR = "terraform"
+MODULE_DIR = f"{TERRAFORM_DIR}/modules/iam_roles"
+POLICY_DIR = f"{TERRAFORM_DIR}/policies"
+
+# Static module: every role comes in through var.roles, so one module block covers the whole account
+MODULE_TF = """
+variable "roles" {
+  type = map(object({
+    assume_role_policy    = string
+    managed_policy_arns   = list(string)
+    permissions_boundary  = optional(string)
+    instance_profile_name = optional(string)
+  }))
+}
+
+resource "aws_iam_role" "this" {
+  for_each = var.roles
+
+  name                 = each.key
+  assume_role_policy   = each.value.assume_role_policy
+  managed_policy_arns  = each.value.managed_policy_arns
+  permissions_boundary = each.value.permissions_boundary
+  tags = {
+    Name = each.key
+  }
+}
+
+resource "aws_iam_instance_profile" "this" {
+  for_each = { for name, role in var.roles : name => role if role.instance_profile_name != null }
+
+  name = each.value.instance_profile_name
+  role = aws_iam_role.this[each.key].name
+}
+
+output "role_arns" {
+  value = { for name, role in aws_iam_role.this : name => role.arn }
+}
+"""
+
+def read_role_names(file_path):
+    """Read the role_names list from terraform.tfvars. Exit if not found."""
+    if not os.path.exists(file_path):
+        print(f"[ERROR] Required file '{file_path}' not found. Please create it with role_names.")
+        sys.exit(1)
+
+    try:
+        role_names = parse_tfvars_file(file_path).get("role_names")
+    except TfvarsSyntaxError as e:
+        print(f"[ERROR] Could not parse {file_path}: {e}")
+        sys.exit(1)
+
+    if not role_names or not isinstance(role_names, list):
+        print(f"[ERROR] 'role_names' list is missing in {file_path}. Pass role names on the command line instead.")
+        sys.exit(1)
+
+    return role_names
+
+def fetch_role(role_name):
+    """Fetch everything the for_each module needs for one role; one get_role gives the trust policy and boundary"""
+    try:
+        role = recent.iam_client.get_role(RoleName=role_name)["Role"]
+    except recent.iam_client.exceptions.NoSuchEntityException as e:
+        print(f"[WARNING] Could not retrieve Assume Role Policy for '{role_name}': {e}")
+        return {"name": role_name, "assume_role_policy": None, "managed_policy_arns": [],
+                "permissions_boundary": None, "instance_profile_name": None}
+    return {
+        "name": role_name,
+        "assume_role_policy": role["AssumeRolePolicyDocument"],
+        "managed_policy_arns": get_attached_policies(role_name),
+        "permissions_boundary": role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn"),
+        "instance_profile_name": get_instance_profile(role_name)
+    }
+
+def render_roles_block(roles):
+    """Render the `module "iam_roles"` block with one map entry per role"""
+    lines = [
+        'module "iam_roles" {',
+        '  source = "./modules/iam_roles"',
+        '',
+        '  roles = {'
+    ]
+    for role in roles:
+        lines.append(f'    "{role["name"]}" = {{')
+        lines.append(f'      assume_role_policy    = file("${{path.root}}/policies/{role["name"]}_assume_policy.json")')
+        lines.append(f'      managed_policy_arns   = {json.dumps(role["managed_policy_arns"])}')
+        if role["permissions_boundary"]:
+            lines.append(f'      permissions_boundary  = "{role["permissions_boundary"]}"')
+        if role["instance_profile_name"]:
+            lines.append(f'      instance_profile_name = "{role["instance_profile_name"]}"')
+        lines.append('    }')
+    lines.append('  }')
+    lines.append('}')
+    return "\n".join(lines) + "\n"
+
+def generate_terraform(role_names, workers=4, policy_data=False):
+    """Generate one for_each module call covering every role in role_names.
+
+    policy_data also writes the shared account_policies module, listing each managed
+    policy attached to any of the roles once.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        roles = list(pool.map(fetch_role, sorted(set(role_names))))
+
+    missing = [role["name"] for role in roles if not role["assume_role_policy"]]
+    if missing:
+        print(f"[WARNING] Skipping roles with no Assume Role Policy: {', '.join(missing)}")
+        roles = [role for role in roles if role["assume_role_policy"]]
+
+    for role in roles:
+        write_if_changed(f"{POLICY_DIR}/{role['name']}_assume_policy.json",
+                         json.dumps(role["assume_role_policy"], indent=2))
+
+    write_if_changed(f"{MODULE_DIR}/main.tf", MODULE_TF)
+    write_if_changed(f"{TERRAFORM_DIR}/iam_roles.tf", render_roles_block(roles))
+    if policy_data:
+        direct_tf.write_policy_data(TERRAFORM_DIR, [arn for role in roles for arn in role["managed_policy_arns"]])
+    print(f"✅ iam_roles.tf created for {len(roles)} roles at {TERRAFORM_DIR}/iam_roles.tf")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate one for_each Terraform module call for many IAM roles")
+    parser.add_argument("role_names", nargs="*", help="Roles to include; defaults to role_names in terraform.tfvars")
+    parser.add_argument("--account-alias", help="Include <alias>-<suffix> for every IAM_ROLE_SUFFIXES entry")
+    parser.add_argument("--workers", type=int, default=4, help="Roles fetched concurrently")
+    parser.add_argument("--policy-data", action="store_true",
+                        help="Also write the shared account_policies module for the roles' managed policies")
+    args = parser.parse_args()
+
+    role_names = list(args.role_names)
+    if args.account_alias:
+        role_names += [f"{args.account_alias}-{suffix}" for suffix in IAM_ROLE_SUFFIXES]
+    role_names = role_names or read_role_names(f"{TERRAFORM_DIR}/terraform.tfvars")
+    generate_terraform(role_names, workers=args.workers, policy_data=args.policy_data)
+    print(f"Terraform files: {RENDER_STATS.summary()}")
@@ -0,0 +1,399 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import boto3
+from botocore.config import Config
+
+import instrumentation
+import inventory_export
+import trust_graph
+from account_index import DEFAULT_INDEX, load_index, parse_since
+from canonical import canonicalize_record, shared_store
+from credential_broker import CACHE_KEY_ENV, CredentialBroker
+from iam_calls import CLIENT_CONFIG, TOTAL_STATS, IamCaller, TokenBucket
+from instance_profiles import InstanceProfileIndex
+from policy_cache import configure_shared_cache, shared_cache
+from render import RENDER_STATS, content_hash, write_if_changed
+from role_discovery import IAM_ROLE_SUFFIXES, RoleFilter, discover_roles, parse_tag_filters, run_pipeline
+# Fetch and render helpers live in role_records; they are re-exported here for existing callers
+from role_records import (REGION, RENDER_VERSION, boundary_policy, build_role_record, fetch_account_roles, fetch_iam_role, flush_log,
+                          log, profile_fields, render_tfvars, role_instance_profiles, role_suffix)
+from run_journal import ACCOUNT_UNIT, DEFAULT_JOURNAL, DONE, FAILED, PENDING, RunJournal
+from snapshot_cache import SnapshotCache, fetch_snapshot, local_policy_versions
+
+ACCOUNTS_DIR = "./accounts"
+OUTPUT_ROOT = "./terraform_files"
+
+def write_tfvars_file(role_details, output_path, region, account_id, account_alias):
+    """Write the role's tfvars only if its content changed. Returns True when the file was written."""
+    return write_if_changed(output_path, render_tfvars(role_details, region, account_id, account_alias))
+
+def load_accounts(accounts_dir=ACCOUNTS_DIR, index_path=DEFAULT_INDEX, aliases=None, ous=None, tags=None,
+                  changed_since=None):
+    """Accounts under accounts_dir, sorted by alias so runs are deterministic.
+
+    They come from the cached account index, which only re-reads account.json files
+    that changed since the last run; the filters select a subset (see AccountIndex.select).
+    """
+    index = load_index(index_path, accounts_dir, log=log)
+    return [{"alias": a["alias"], "id": a["id"]} for a in index.select(aliases, ous, tags, changed_since)]
+
+def account_profile(account_alias, account_id):
+    return f"{account_alias}_{account_id}_HE-NT-ReadOnly"
+
+def account_iam_client(account_alias, account_id, max_connections=10, rate=8.0, broker=None, assume_role=None):
+    """Build a rate-limited IAM client on the account's own Session instead of the process-global AWS_PROFILE.
+
+    With a CredentialBroker and assume_role, the session uses that role in the account
+    instead of the account's named profile.
+    """
+    if broker is not None and assume_role:
+        session = broker.session(account_id, assume_role)
+    else:
+        session = boto3.Session(profile_name=account_profile(account_alias, account_id))
+    client = session.client("iam", config=CLIENT_CONFIG.merge(Config(max_pool_connections=max_connections)))
+    instrumentation.attach(client, account=account_alias)
+    return IamCaller(client, TokenBucket(rate=rate, burst=max(1, int(rate))))
+
+def generate_role(iam, account, suffix, account_roles=None, cache=None, signatures=None, policy_versions=None,
+                  role_name=None, profile_index=None):
+    """Fetch one role and write its tfvars. Returns (role_name, status).
+
+    role_name defaults to <alias>-<suffix>; discovered roles pass their real name.
+    With a snapshot cache, roles whose signature matches the cached one and whose tfvars
+    already exist are skipped without fetching or rendering.
+    """
+    role_name = role_name or f"{account['alias']}-{suffix}"
+    with instrumentation.role_context(role_name):
+        return _generate_role(iam, account, suffix, account_roles, cache, signatures, policy_versions, role_name,
+                              profile_index)
+
+def _generate_role(iam, account, suffix, account_roles, cache, signatures, policy_versions, role_name, profile_index):
+    output_dir = Path(OUTPUT_ROOT) / account["alias"] / suffix
+    output_file = output_dir / "terraform.tfvars"
+
+    signature = None
+    snapshot = None
+    if cache is not None:
+        if signatures is not None:
+            signature = signatures.get(role_name)
+        else:
+            try:
+                snapshot = fetch_snapshot(iam, role_name, policy_versions, profile_index)
+                signature = snapshot["signature"]
+            except Exception as e:
+                log(f"[ERROR] Could not revalidate {role_name}: {e}")
+                return role_name, "failed"
+        if signature and output_file.exists() and cache.is_current(account["id"], role_name, signature):
+            log(f"[INFO] Unchanged: {role_name}")
+            if inventory_export.current() is not None or trust_graph.current() is not None:
+                record = canonicalize_record(cache.get(account["id"], role_name)[1])
+                inventory_export.export_role(account, record)
+                trust_graph.record_role(account, record)
+            return role_name, "unchanged"
+
+    log(f"[INFO] Generating: {role_name}")
+    if account_roles is not None:
+        role_data = account_roles.get(role_name)
+        if not role_data:
+            log(f"[ERROR] Role {role_name} not found in {account['alias']}")
+    else:
+        with instrumentation.stage("fetch", account=account["alias"], role=role_name):
+            role_data = fetch_iam_role(role_name, iam, policy_versions, profile_index=profile_index,
+                                       snapshot=snapshot)
+    if not role_data:
+        return role_name, "failed"
+
+    inventory_export.export_role(account, role_data)
+    trust_graph.record_role(account, role_data)
+    with instrumentation.stage("render", account=account["alias"], role=role_name):
+        content = render_tfvars(role_data, REGION, account["id"], account["alias"])
+    with instrumentation.stage("write", account=account["alias"], role=role_name):
+        written = write_if_changed(output_file, content)
+    if signature:
+        cache.put(account["id"], role_name, signature, role_data)
+    if not written:
+        log(f"[INFO] Up to date: {output_file}")
+        return role_name, "unchanged"
+    log(f"[SUCCESS] Wrote: {output_file}")
+    return role_name, "written"
+
+def journal_result(journal, account, suffix, result):
+    """Record a (role_name, status) result in the journal: failed, or done with its tfvars hash. Returns result."""
+    role_name, status = result
+    if status == "failed":
+        journal.mark(account["id"], role_name, FAILED)
+    else:
+        output_file = Path(OUTPUT_ROOT) / account["alias"] / suffix / "terraform.tfvars"
+        journal.mark(account["id"], role_name, DONE, output_hash=content_hash(output_file.read_bytes()))
+    return result
+
+def process_account(account, suffixes=IAM_ROLE_SUFFIXES, bulk=False, role_workers=2, cache=None, rate=8.0,
+                    broker=None, assume_role=None, journal=None, resume=False, retry_failed=False,
+                    role_filter=None, queue_size=100):
+    """Generate every suffix for one account with at most role_workers fetches in flight.
+
+    With a RunJournal, each role is recorded as pending/done/failed, and resume or
+    retry_failed limit the run to roles the journal says still need work; the rest are
+    reported as "skipped". The journal is flushed once the account is finished.
+    With a RoleFilter, suffixes are ignored and roles are discovered instead (see discover_account).
+    Returns [(role_name, status), ...] in suffix order.
+    """
+    if role_filter is not None:
+        results = discover_account(account, role_filter, bulk, role_workers, cache, rate, broker, assume_role,
+                                   journal, resume, retry_failed, queue_size)
+        if journal is not None:
+            journal.flush()
+        return results
+    if journal is not None:
+        todo = [s for s in suffixes
+                if journal.should_run(account["id"], f"{account['alias']}-{s}", resume, retry_failed)]
+        if not todo:
+            return [(f"{account['alias']}-{suffix}", "skipped") for suffix in suffixes]
+        results = dict(zip(todo, _process_account(account, todo, bulk, role_workers, cache, rate, broker,
+                                                  assume_role, journal)))
+        journal.flush()
+        return [results.get(suffix, (f"{account['alias']}-{suffix}", "skipped")) for suffix in suffixes]
+    return _process_account(account, suffixes, bulk, role_workers, cache, rate, broker, assume_role, journal)
+
+def _process_account(account, suffixes, bulk, role_workers, cache, rate, broker, assume_role, journal):
+    log(f"[INFO] Processing {account['alias']} ({account['id']})")
+    if journal is not None:
+        for suffix in suffixes:
+            journal.mark(account["id"], f"{account['alias']}-{suffix}", PENDING)
+    try:
+        iam = account_iam_client(account["alias"], account["id"], max_connections=role_workers, rate=rate,
+                                 broker=broker, assume_role=assume_role)
+        account_roles = None
+        signatures = None
+        policy_versions = None
+        profile_index = None
+        if bulk:
+            signatures = {} if cache is not None else None
+            account_roles = fetch_account_roles(
+                iam, role_names=[f"{account['alias']}-{suffix}" for suffix in suffixes], signatures=signatures
+            )
+        else:
+            policy_versions = local_policy_versions(iam)
+            profile_index = InstanceProfileIndex.build(iam)
+    except Exception as e:
+        log(f"[ERROR] Failed to fetch account {account['alias']}: {e}")
+        if journal is not None:
+            for suffix in suffixes:
+                journal.mark(account["id"], f"{account['alias']}-{suffix}", FAILED, error=str(e))
+        return [(f"{account['alias']}-{suffix}", "failed") for suffix in suffixes]
+
+    def run_role(suffix):
+        result = generate_role(iam, account, suffix, account_roles, cache, signatures, policy_versions,
+                               profile_index=profile_index)
+        return journal_result(journal, account, suffix, result) if journal is not None else result
+
+    with ThreadPoolExecutor(max_workers=role_workers) as pool:
+        results = list(pool.map(run_role, suffixes))
+    # A role that could not be fetched may have been deleted; its trust edges go with it
+    names = {f"{account['alias']}-{suffix}" for suffix in suffixes}
+    prune_trust_graph(account, [name for name, status in results if status != "failed"], names.__contains__)
+    return results
+
+def prune_trust_graph(account, seen, candidates=None):
+    """Remove roles of the account that this sweep did not see from the enabled trust graph"""
+    for role_name in trust_graph.prune_account(account, seen, candidates):
+        log(f"[INFO] Removed {role_name} from the trust graph")
+
+def discover_account(account, role_filter, bulk=False, role_workers=2, cache=None, rate=8.0, broker=None,
+                     assume_role=None, journal=None, resume=False, retry_failed=False, queue_size=100):
+    """Generate tfvars for every role in the account matching role_filter.
+
+    Without bulk, list_roles pages stream into a bounded queue that role_workers drain, so
+    fetching and rendering start with the first page instead of after discovery. With bulk,
+    the get_account_authorization_details walk is filtered instead. With a journal, the
+    listing itself is recorded as the account's ACCOUNT_UNIT, so a failed or interrupted
+    listing is picked up again by resume and retry_failed.
+    Returns [(role_name, status), ...] sorted by role name.
+    """
+    log(f"[INFO] Discovering roles in {account['alias']} ({account['id']})")
+    account_roles = None
+    signatures = None
+    policy_versions = None
+    profile_index = None
+    try:
+        iam = account_iam_client(account["alias"], account["id"], max_connections=role_workers + 1, rate=rate,
+                                 broker=broker, assume_role=assume_role)
+        if bulk:
+            signatures = {} if cache is not None else None
+            account_roles = fetch_account_roles(iam, signatures=signatures, role_filter=role_filter)
+            role_names = sorted(account_roles)
+        else:
+            policy_versions = local_policy_versions(iam)
+            profile_index = InstanceProfileIndex.build(iam)
+            role_names = (role["RoleName"] for role in discover_roles(iam, role_filter))
+    except Exception as e:
+        log(f"[ERROR] Failed to fetch account {account['alias']}: {e}")
+        if journal is not None:
+            journal.mark(account["id"], ACCOUNT_UNIT, FAILED, error=str(e))
+        return [(f"{account['alias']}-*", "failed")]
+
+    def run_role(role_name):
+        if journal is not None:
+            if not journal.should_run(account["id"], role_name, resume, retry_failed):
+                return role_name, "skipped"
+            journal.mark(account["id"], role_name, PENDING)
+        suffix = role_suffix(account, role_name)
+        result = generate_role(iam, account, suffix, account_roles, cache, signatures, policy_versions,
+                               role_name=role_name, profile_index=profile_index)
+        return journal_result(journal, account, suffix, result) if journal is not None else result
+
+    results, error = run_pipeline(role_names, run_role, workers=role_workers, queue_size=queue_size)
+    if journal is not None:
+        journal.mark(account["id"], ACCOUNT_UNIT, FAILED if error is not None else DONE,
+                     error=str(error) if error is not None else None)
+    if error is not None:
+        log(f"[ERROR] Role discovery stopped early in {account['alias']}: {error}")
+        results.append((f"{account['alias']}-*", "failed"))
+    elif role_filter.path_prefix == "/" and not role_filter.tags:
+        # Every listed role was seen; the graph does not keep paths or tags, so narrower filters prune nothing
+        prune_trust_graph(account, [name for name, _ in results],
+                          lambda name: role_filter.matches_name({"RoleName": name}))
+    if not results:
+        log(f"[WARN] No roles in {account['alias']} match the discovery filter")
+    return sorted(results)
+
+def run_sweep(accounts, suffixes=IAM_ROLE_SUFFIXES, bulk=False, workers=8, role_workers=2, cache=None, rate=8.0,
+              broker=None, assume_role=None, journal=None, resume=False, retry_failed=False, role_filter=None,
+              queue_size=100):
+    """Process accounts in a bounded thread pool.
+
+    Returns [(account, [(role_name, status), ...]), ...] in input order regardless of completion order.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            lambda account: process_account(account, suffixes, bulk, role_workers, cache, rate, broker, assume_role,
+                                            journal, resume, retry_failed, role_filter, queue_size),
+            accounts
+        )
+        return list(zip(accounts, results))
+
+def main(argv=None, broker=None):
+    """Run the sweep. broker, when given, is the CredentialBroker used for --assume-role
+    (a caller's shared one) instead of a new broker on the default session."""
+    parser = argparse.ArgumentParser(description="Generate terraform.tfvars for every account and IAM role suffix")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Fetch each account with one get_account_authorization_details walk instead of per-role calls")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="threads: blocking boto3 clients in thread pools; asyncio: aiobotocore on one event loop")
+    parser.add_argument("--workers", type=int, default=8, help="Accounts processed concurrently")
+    parser.add_argument("--role-workers", type=int, default=2,
+                        help="Concurrent role fetches per account; keeps IAM throttling per account low")
+    parser.add_argument("--rate", type=float, default=8.0, help="Max IAM requests per second per account")
+    parser.add_argument("--max-in-flight", type=int, default=20,
+                        help="With --engine asyncio, open IAM requests per account")
+    parser.add_argument("--assume-role",
+                        help="Assume this role in every account through one credential broker instead of per-account profiles")
+    parser.add_argument("--credential-cache",
+                        help=f"Encrypted file to share assumed-role credentials between runs (key in ${CACHE_KEY_ENV})")
+    parser.add_argument("--export",
+                        help="Stream every role record as compact JSONL to this file (.gz / .zst to compress)")
+    parser.add_argument("--trust-graph", help="Keep this cross-account trust graph database up to date")
+    parser.add_argument("--trace", help="Write a JSONL trace of every IAM call and stage timing to this file")
+    parser.add_argument("--cache-dir", help="Snapshot cache directory; roles unchanged since the last run are skipped")
+    parser.add_argument("--policy-cache-dir", help="Persist downloaded managed policy versions here between runs")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL, help="Run journal recording each account/role outcome")
+    parser.add_argument("--resume", action="store_true", help="Skip roles the journal already records as done")
+    parser.add_argument("--retry-failed", action="store_true", help="Only redo roles the journal records as failed")
+    parser.add_argument("--discover", action="store_true",
+                        help="Discover roles with list_roles instead of <alias>-<suffix> for IAM_ROLE_SUFFIXES")
+    parser.add_argument("--path-prefix", default="/", help="With --discover, only roles under this IAM path")
+    parser.add_argument("--name-regex", help="With --discover, only roles whose name matches this regex")
+    parser.add_argument("--tag", action="append", metavar="KEY[=VALUE]",
+                        help="With --discover, only roles carrying this tag (repeatable)")
+    parser.add_argument("--queue-size", type=int, default=100,
+                        help="Discovered roles buffered ahead of the fetch workers per account")
+    parser.add_argument("--account-index", default=DEFAULT_INDEX, help="Cached account inventory index file")
+    parser.add_argument("--accounts", action="append", metavar="GLOB", help="Only accounts whose alias matches")
+    parser.add_argument("--ou", action="append", help="Only accounts in this OU path glob or OU name")
+    parser.add_argument("--account-tag", action="append", metavar="KEY[=VALUE]", help="Only accounts with this tag")
+    parser.add_argument("--changed-since", help="Only accounts whose account.json changed since (7d, 12h, ISO date)")
+    args = parser.parse_args(argv)
+    if args.engine == "asyncio" and (args.bulk or args.discover or args.cache_dir):
+        parser.error("--engine asyncio fetches the IAM_ROLE_SUFFIXES roles per role; "
+                     "it cannot be combined with --bulk, --discover or --cache-dir")
+
+    # Before anything is opened, so a bad selection leaves the journal and caches untouched
+    try:
+        accounts = load_accounts(index_path=args.account_index, aliases=args.accounts, ous=args.ou,
+                                 tags=parse_tag_filters(args.account_tag),
+                                 changed_since=parse_since(args.changed_since) if args.changed_since else None)
+    except ValueError as e:
+        parser.error(str(e))
+
+    tracer = instrumentation.enable(args.trace) if args.trace else None
+    exporter = inventory_export.enable(args.export) if args.export else None
+    graph = trust_graph.enable(args.trust_graph) if args.trust_graph else None
+    if args.policy_cache_dir:
+        configure_shared_cache(cache_dir=args.policy_cache_dir)
+    log(f"==== Starting tfvars generation at {datetime.now()} ====")
+
+    cache = SnapshotCache(args.cache_dir, render_version=RENDER_VERSION) if args.cache_dir else None
+    if args.assume_role:
+        broker = broker or CredentialBroker(cache_file=args.credential_cache)
+    else:
+        broker = None
+    journal = RunJournal(args.journal, resume=args.resume or args.retry_failed)
+    log(f"[INFO] {len(accounts)} accounts selected")
+    role_filter = None
+    if args.discover:
+        role_filter = RoleFilter(args.path_prefix, args.name_regex, parse_tag_filters(args.tag))
+    try:
+        if args.engine == "asyncio":
+            import async_fetch
+            results = async_fetch.run_sweep_async(
+                accounts, workers=args.workers, rate=args.rate, max_in_flight=args.max_in_flight,
+                client_factory=lambda account: async_fetch.aiobotocore_client(
+                    account, args.max_in_flight, broker, args.assume_role
+                ),
+                journal=journal, resume=args.resume, retry_failed=args.retry_failed
+            )
+        else:
+            results = run_sweep(accounts, bulk=args.bulk, workers=args.workers,
+                                role_workers=args.role_workers, cache=cache, rate=args.rate,
+                                broker=broker, assume_role=args.assume_role,
+                                journal=journal, resume=args.resume, retry_failed=args.retry_failed,
+                                role_filter=role_filter, queue_size=args.queue_size)
+    finally:
+        journal.close()
+        if exporter is not None:
+            exporter.close()
+        if graph is not None:
+            graph.close()
+        if cache is not None:
+            cache.close()
+        shared_store().clear()
+
+    log(f"------------------------------------------------------------")
+    failed = 0
+    for account, account_results in results:
+        for role_name, status in account_results:
+            if status == "skipped":
+                continue
+            log(f"[{'ERROR' if status == 'failed' else 'SUCCESS'}] {account['alias']}: {role_name} {status}")
+            failed += status == "failed"
+
+    stats = TOTAL_STATS.summary()
+    log(f"[INFO] IAM calls: {stats['calls']}, retries: {stats['retries']}, throttled: {stats['throttles']}")
+    log(f"[INFO] tfvars files: {RENDER_STATS.summary()}")
+    log(f"[INFO] Policy cache: {shared_cache().hits} hits, {shared_cache().misses} downloads")
+    log(f"[INFO] Journal {args.journal}: {journal.summary()}")
+    if graph is not None:
+        log(f"[INFO] Trust graph {args.trust_graph}: {graph.summary()}")
+    if exporter is not None:
+        log(f"[INFO] Exported {exporter.roles} roles and {exporter.policies} distinct policies to {args.export}")
+    if tracer is not None:
+        print(tracer.summary_table())
+        tracer.close()
+    log(f"==== tfvars generation completed at {datetime.now()} ({failed} failed) ====")
+    flush_log()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+import instrumentation
+
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "RequestThrottled",
+    "ServiceUnavailable",
+}
+
+# Server-side failures worth another attempt; any other 5xx response is retried as well
+TRANSIENT_ERROR_CODES = {
+    "InternalFailure",
+    "InternalError",
+    "ServiceFailure",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "PriorRequestNotComplete",
+}
+
+# Connection failures and read timeouts raised before any response is parsed
+TRANSIENT_EXCEPTIONS = (BotoConnectionError, HTTPClientError)
+
+# Retries are done by IamCaller so they can be rate limited and counted; botocore makes a single attempt.
+CLIENT_CONFIG = Config(retries={"mode": "standard", "total_max_attempts": 1})
+
+class TokenBucket:
+    """Client-side rate limiter: rate tokens per second, up to burst tokens banked"""
+
+    def __init__(self, rate=8.0, burst=8, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available. Returns 0, or the seconds to wait before trying again."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            self._sleep(wait)
+
+class CallStats:
+    """Thread-safe per-operation counters of calls, retries and throttles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.throttles = defaultdict(int)
+
+    def record(self, operation, retries=0, throttles=0):
+        with self._lock:
+            self.calls[operation] += 1
+            self.retries[operation] += retries
+            self.throttles[operation] += throttles
+
+    def summary(self):
+        with self._lock:
+            return {
+                "calls": sum(self.calls.values()),
+                "retries": sum(self.retries.values()),
+                "throttles": sum(self.throttles.values()),
+                "by_operation": {
+                    op: {"calls": self.calls[op], "retries": self.retries[op], "throttles": self.throttles[op]}
+                    for op in sorted(self.calls)
+                }
+            }
+
+TOTAL_STATS = CallStats()
+
+def is_throttling(error):
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+def is_retryable(error):
+    """Throttling, connection errors, timeouts and 5xx responses; everything botocore itself would retry"""
+    if isinstance(error, TRANSIENT_EXCEPTIONS):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    return (is_throttling(error) or error.response.get("Error", {}).get("Code") in TRANSIENT_ERROR_CODES
+            or error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500)
+
+class _Paginator:
+    """IAM Marker/IsTruncated pagination where every page goes through the caller's retry loop"""
+
+    def __init__(self, caller, operation):
+        self._caller = caller
+        self._operation = operation
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self._caller.call(self._operation, **kwargs)
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            kwargs["Marker"] = page["Marker"]
+
+class IamCaller:
+    """Wraps an IAM/STS client: rate limits every call, retries throttling and transient errors with jittered backoff.
+
+    Behaves like the wrapped client, so fetchers can take either. Connection errors,
+    timeouts and 5xx responses are retried like throttling (see is_retryable); other
+    errors (NoSuchEntity, AccessDenied, ...) are raised on the first attempt.
+    """
+
+    def __init__(self, client, bucket=None, max_attempts=8, base_delay=0.5, max_delay=20.0, sleep=time.sleep):
+        self.client = client
+        self.bucket = bucket or TokenBucket(sleep=sleep)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = CallStats()
+        self._sleep = sleep
+
+    def call(self, operation, **kwargs):
+        method = getattr(self.client, operation)
+        throttles = 0
+        for attempt in range(1, self.max_attempts + 1):
+            self.bucket.acquire()
+            try:
+                with instrumentation.call_attempt(attempt):
+                    result = method(**kwargs)
+            except (ClientError,) + TRANSIENT_EXCEPTIONS as e:
+                if not is_retryable(e) or attempt == self.max_attempts:
+                    self._record(operation, attempt - 1, throttles + is_throttling(e))
+                    raise
+                throttles += is_throttling(e)
+                # Full jitter: sleep a random amount up to the exponential cap
+                self._sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            self._record(operation, attempt - 1, throttles)
+            return result
+
+    def _record(self, operation, retries, throttles):
+        self.stats.record(operation, retries, throttles)
+        TOTAL_STATS.record(operation, retries, throttles)
+
+    def get_paginator(self, operation):
+        return _Paginator(self, operation)
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name in ("exceptions", "meta") or not callable(attr):
+            return attr
+        return lambda **kwargs: self.call(name, **kwargs)
+
+class LazyClient:
+    """Stands in for a module-level client and only builds it (with factory) on first use.
+
+    Importing a script then costs no client construction, and a caller that already has
+    a client can assign its own in place of the LazyClient before using the script.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._factory()
+            return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+def list_all(client, operation, result_key, **kwargs):
+    """Read every page of an IAM list operation and return the combined result_key items"""
+    items = []
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        items.extend(page.get(result_key, []))
+    return items
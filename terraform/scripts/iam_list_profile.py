@@ -1,26 +1,28 @@
 import boto3
 
-# Initialize the IAM client
-iam_client = boto3.client('iam')
+from iam_calls import CLIENT_CONFIG, IamCaller, LazyClient
+from instance_profiles import shared_index
+
+# IAM client (rate limited, retries throttling), built on first use
+iam_client = LazyClient(lambda: IamCaller(boto3.client('iam', config=CLIENT_CONFIG)))
 
 def get_instance_profiles_for_role(role_name):
     """
     Retrieve and print instance profiles associated with the specified IAM role.
+    Uses the account-wide instance profile index, so looking up many roles costs one listing.
     
     :param role_name: The name of the IAM role
     """
-    try:
-        response = iam_client.list_instance_profiles_for_role(RoleName=role_name)
-        instance_profiles = response.get('InstanceProfiles', [])
-        if not instance_profiles:
-            print(f"No instance profiles found for role '{role_name}'.")
-        else:
-            for profile in instance_profiles:
-                print(f"Instance Profile Name: {profile['InstanceProfileName']}")
-                print(f"ARN: {profile['Arn']}")
-                print("-" * 40)
-    except iam_client.exceptions.NoSuchEntityException:
-        print(f"The role '{role_name}' does not exist.")
+    instance_profiles = shared_index(iam_client).profiles_for_role(role_name)
+    if not instance_profiles:
+        print(f"No instance profiles found for role '{role_name}'.")
+    else:
+        for profile in instance_profiles:
+            print(f"Instance Profile Name: {profile['name']}")
+            print(f"ARN: {profile['arn']}")
+            if profile["tags"]:
+                print(f"Tags: {profile['tags']}")
+            print("-" * 40)
 
 if __name__ == "__main__":
     # Replace 'YourRoleName' with the IAM role name you want to query.
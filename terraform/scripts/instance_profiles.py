@@ -0,0 +1,121 @@
+import threading
+import time
+
+import boto3
+
+from iam_calls import CLIENT_CONFIG, list_all
+
+# Seconds a shared index is reused before the account's profiles are listed again
+SHARED_INDEX_TTL = 900
+
+class InstanceProfileIndex:
+    """Every instance profile in an account, indexed by the role(s) it contains.
+
+    Built from one paginated list_instance_profiles call, replacing a
+    list_instance_profiles_for_role per role. When the listing carries no tags for a
+    profile they are fetched with list_instance_profile_tags the first time that
+    profile is asked for, once per profile rather than once per role.
+    """
+
+    def __init__(self, profiles, iam=None):
+        self._iam = iam
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._by_role = {}
+        self._tags = {}
+        for profile in profiles:
+            name = profile["InstanceProfileName"]
+            self._profiles[name] = profile
+            if "Tags" in profile:
+                self._tags[name] = profile["Tags"]
+            for role in profile.get("Roles", []):
+                self._by_role.setdefault(role["RoleName"], []).append(name)
+
+    @classmethod
+    def build(cls, iam, path_prefix="/"):
+        return cls(list_all(iam, "list_instance_profiles", "InstanceProfiles", PathPrefix=path_prefix), iam)
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def profile_names(self, role_name):
+        """Names of the role's instance profiles in listing order ([] when it has none)"""
+        return list(self._by_role.get(role_name, []))
+
+    def has_tags(self, profile_name):
+        with self._lock:
+            return profile_name in self._tags
+
+    def set_tags(self, profile_name, tags):
+        """Record tags fetched elsewhere (e.g. by the asyncio engine)"""
+        with self._lock:
+            self._tags[profile_name] = tags
+
+    def tags(self, profile_name):
+        """Tags of one profile as IAM returns them: [{"Key", "Value"}, ...]"""
+        with self._lock:
+            if profile_name in self._tags:
+                return self._tags[profile_name]
+        tags = list_all(self._iam, "list_instance_profile_tags", "Tags", InstanceProfileName=profile_name) \
+            if self._iam is not None else []
+        with self._lock:
+            self._tags[profile_name] = tags
+        return tags
+
+    def profiles_for_role(self, role_name):
+        """[{"name", "arn", "tags": [{key: value}, ...]}, ...] for every profile the role is in"""
+        return [
+            {
+                "name": name,
+                "arn": self._profiles[name]["Arn"],
+                "tags": [{tag["Key"]: tag["Value"]} for tag in self.tags(name)]
+            }
+            for name in self.profile_names(role_name)
+        ]
+
+_shared_indexes = {}
+_client_accounts = {}
+_shared_lock = threading.Lock()
+
+def client_account(iam):
+    """Account id iam's credentials belong to, looked up with one STS call per client.
+
+    A client whose account cannot be looked up (no botocore credentials, STS denied) gets
+    a key of its own instead, so its index is only shared with itself.
+    """
+    with _shared_lock:
+        entry = _client_accounts.get(id(iam))
+        # The entry keeps the client alive, so its id cannot be reused by another client
+        if entry is not None and entry[0] is iam:
+            return entry[1]
+    try:
+        credentials = iam._request_signer._credentials.get_frozen_credentials()
+        sts = boto3.client("sts", aws_access_key_id=credentials.access_key,
+                           aws_secret_access_key=credentials.secret_key, aws_session_token=credentials.token,
+                           config=CLIENT_CONFIG)
+        account_id = sts.get_caller_identity()["Account"]
+    except Exception:
+        account_id = f"client:{id(iam)}"
+    with _shared_lock:
+        _client_accounts[id(iam)] = (iam, account_id)
+    return account_id
+
+def shared_index(iam, account_id=None, max_age=SHARED_INDEX_TTL):
+    """The account's index, built with iam and reused for max_age seconds by every client of that account.
+
+    account_id defaults to the account of iam's credentials (see client_account).
+    """
+    account_id = account_id or client_account(iam)
+    with _shared_lock:
+        entry = _shared_indexes.get(account_id)
+        if entry is None or time.monotonic() - entry[1] > max_age:
+            entry = _shared_indexes[account_id] = (InstanceProfileIndex.build(iam), time.monotonic())
+        return entry[0]
+
+def invalidate(account_id=None):
+    """Drop the shared index of one account, or of every account, so the next lookup lists profiles again"""
+    with _shared_lock:
+        if account_id is None:
+            _shared_indexes.clear()
+        else:
+            _shared_indexes.pop(account_id, None)
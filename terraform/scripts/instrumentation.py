@@ -0,0 +1,201 @@
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Context variables rather than thread locals, so asyncio tasks each carry their own
+_role = contextvars.ContextVar("trace_role", default=None)
+_attempt = contextvars.ContextVar("trace_attempt", default=1)
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class Tracer:
+    """Collects per-API-call and per-stage timings and writes them as a JSONL trace.
+
+    API calls are captured from botocore's event system (before-parameter-build / after-call /
+    after-call-error) on every client passed to attach(). Each call is one row per
+    attempt; the attempt number comes from IamCaller (see call_attempt). Events are
+    buffered and written flush_every at a time.
+    """
+
+    def __init__(self, path=None, flush_every=500):
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = open(path, "w") if path else None
+        self._ops = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "latencies": []})
+        self._accounts = defaultdict(lambda: {"calls": 0, "errors": 0, "seconds": 0.0})
+        self._stages = defaultdict(list)
+
+    def record(self, event):
+        event["ts"] = round(time.time(), 6)
+        with self._lock:
+            self._buffer.append(event)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._file and self._buffer:
+            self._file.write("".join(json.dumps(e, default=str) + "\n" for e in self._buffer))
+            self._file.flush()
+        self._buffer = []
+
+    def _api_call(self, operation, account, latency, status=None, error_code=None):
+        attempt = _attempt.get()
+        with self._lock:
+            op = self._ops[operation]
+            op["calls"] += 1
+            op["errors"] += error_code is not None
+            op["retries"] += attempt > 1
+            op["latencies"].append(latency)
+            acct = self._accounts[account]
+            acct["calls"] += 1
+            acct["errors"] += error_code is not None
+            acct["seconds"] += latency
+        self.record({
+            "type": "api_call",
+            "operation": operation,
+            "account": account,
+            "role": _role.get(),
+            "latency_ms": round(latency * 1000, 3),
+            "status": status,
+            "attempt": attempt,
+            "error_code": error_code
+        })
+
+    def attach(self, client, account=None):
+        """Hook a boto3 client's event system so every call it makes is traced under account"""
+        events = getattr(getattr(client, "meta", None), "events", None)
+        if events is None:
+            return client
+
+        def before_call(context, **kwargs):
+            context["trace_start"] = time.perf_counter()
+
+        def after_call(http_response, parsed, model, context, **kwargs):
+            now = time.perf_counter()
+            latency = now - context.get("trace_start", now)
+            self._api_call(
+                model.name, account, latency,
+                status=getattr(http_response, "status_code", None),
+                error_code=parsed.get("Error", {}).get("Code")
+            )
+
+        def after_call_error(exception, context, **kwargs):
+            now = time.perf_counter()
+            latency = now - context.get("trace_start", now)
+            operation = kwargs.get("event_name", "").rsplit(".", 1)[-1]
+            self._api_call(operation, account, latency, error_code=type(exception).__name__)
+
+        events.register("before-parameter-build", before_call)
+        events.register("after-call", after_call)
+        events.register("after-call-error", after_call_error)
+        return client
+
+    @contextmanager
+    def stage(self, name, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self._stages[name].append(duration)
+            self.record(dict({"type": "stage", "stage": name, "duration_ms": round(duration * 1000, 3)}, **fields))
+
+    def summary(self):
+        with self._lock:
+            return {
+                "operations": {
+                    name: {
+                        "calls": op["calls"],
+                        "errors": op["errors"],
+                        "retries": op["retries"],
+                        "total_seconds": round(sum(op["latencies"]), 3),
+                        "p50_ms": round(_percentile(op["latencies"], 50) * 1000, 3),
+                        "p99_ms": round(_percentile(op["latencies"], 99) * 1000, 3)
+                    }
+                    for name, op in sorted(self._ops.items())
+                },
+                "accounts": {
+                    name: {"calls": a["calls"], "errors": a["errors"], "seconds": round(a["seconds"], 3)}
+                    for name, a in sorted(self._accounts.items(), key=lambda item: -item[1]["seconds"])
+                },
+                "stages": {
+                    name: {"count": len(d), "total_seconds": round(sum(d), 3), "p99_ms": round(_percentile(d, 99) * 1000, 3)}
+                    for name, d in sorted(self._stages.items())
+                }
+            }
+
+    def summary_table(self, top_accounts=10):
+        summary = self.summary()
+        lines = [f"{'operation':<36}{'calls':>8}{'errors':>8}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}"]
+        for name, op in sorted(summary["operations"].items(), key=lambda item: -item[1]["total_seconds"]):
+            lines.append(f"{name:<36}{op['calls']:>8}{op['errors']:>8}{op['total_seconds']:>10}{op['p50_ms']:>10}{op['p99_ms']:>10}")
+        lines.append("")
+        lines.append(f"{'account':<36}{'calls':>8}{'errors':>8}{'total s':>10}")
+        for name, acct in list(summary["accounts"].items())[:top_accounts]:
+            lines.append(f"{str(name):<36}{acct['calls']:>8}{acct['errors']:>8}{acct['seconds']:>10}")
+        lines.append("")
+        lines.append(f"{'stage':<36}{'count':>8}{'total s':>10}{'p99 ms':>10}")
+        for name, st in summary["stages"].items():
+            lines.append(f"{name:<36}{st['count']:>8}{st['total_seconds']:>10}{st['p99_ms']:>10}")
+        return "\n".join(lines)
+
+    def close(self):
+        self.record(dict({"type": "summary"}, **self.summary()))
+        with self._lock:
+            self._flush_locked()
+            if self._file:
+                self._file.close()
+                self._file = None
+
+_tracer = None
+
+def enable(path=None, flush_every=500):
+    """Turn on tracing for every client created through attach() from now on"""
+    global _tracer
+    _tracer = Tracer(path, flush_every)
+    return _tracer
+
+def current():
+    return _tracer
+
+def attach(client, account=None):
+    """Trace client under account if tracing is enabled; always returns the client"""
+    if _tracer is not None:
+        _tracer.attach(client, account)
+    return client
+
+@contextmanager
+def stage(name, **fields):
+    if _tracer is None:
+        yield
+        return
+    with _tracer.stage(name, **fields):
+        yield
+
+@contextmanager
+def role_context(role_name):
+    """Tag API calls made from this thread or asyncio task with role_name"""
+    token = _role.set(role_name)
+    try:
+        yield
+    finally:
+        _role.reset(token)
+
+@contextmanager
+def call_attempt(attempt):
+    """Tag the API call made inside with its attempt number (1 for the first try)"""
+    token = _attempt.set(attempt)
+    try:
+        yield
+    finally:
+        _attempt.reset(token)
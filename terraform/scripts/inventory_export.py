@@ -0,0 +1,159 @@
+import gzip
+import io
+import json
+import sys
+import threading
+from dataclasses import asdict, dataclass
+
+from canonical import canonical_statements, document_hash
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .zst exports
+    zstandard = None
+
+def _compact(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+def _intern(value):
+    return sys.intern(value) if value else value
+
+@dataclass(slots=True)
+class PolicyRef:
+    """A customer managed policy attachment; the document itself is exported once under its hash"""
+    arn: str
+    name: str
+    hash: str
+
+@dataclass(slots=True)
+class RoleRecord:
+    """Compact, export-side view of a fetch_iam_role record.
+
+    ARNs and names repeated across roles are interned, customer managed policies are
+    PolicyRef entries, and documents stay as parsed JSON (no pretty-printed strings).
+    """
+    account_id: str
+    account_alias: str
+    role_name: str
+    assume_role_policy: dict
+    managed_arns: tuple
+    customer_managed_policies: tuple
+    inline_policies: dict
+    permissions_boundary: str
+    tags: tuple
+    instance_profiles: tuple
+    permissions_boundary_policy: PolicyRef | None = None
+
+    @classmethod
+    def from_record(cls, account, record, policy_hash):
+        """Build from a fetch_iam_role record; policy_hash(arn, name, statements, digest) returns the document hash"""
+        boundary = record.get("permissions_boundary_policy")
+        return cls(
+            account_id=_intern(account["id"]),
+            account_alias=_intern(account["alias"]),
+            role_name=record["role_name"],
+            assume_role_policy=_document(record["assume_role_policy"]),
+            managed_arns=tuple(_intern(arn) for arn in record["managed_arns"]),
+            customer_managed_policies=tuple(
+                PolicyRef(_intern(policy.get("arn", "")), _intern(name),
+                          policy_hash(policy.get("arn", ""), name, policy["statements"], policy.get("hash")))
+                for name, policy in record["customer_managed_policies"].items()
+            ),
+            inline_policies={name: _document(doc) for name, doc in record["inline_policies"].items()},
+            permissions_boundary=_intern(record["permissions_boundary"]),
+            tags=tuple((_intern(k), v) for tag in record["tags"] for k, v in tag.items()),
+            instance_profiles=tuple(_intern(p["name"]) for p in record.get("instance_profiles", [])),
+            permissions_boundary_policy=PolicyRef(
+                _intern(boundary["arn"]), _intern(boundary["name"]),
+                policy_hash(boundary["arn"], boundary["name"], boundary["statements"], boundary.get("hash"))
+            ) if boundary else None
+        )
+
+def _document(value):
+    # Snapshot cache entries written before records kept parsed documents hold JSON strings
+    return json.loads(value) if isinstance(value, str) else value
+
+def _open(path, compression):
+    if compression is None:
+        compression = "gzip" if path.endswith(".gz") else "zstd" if path.endswith(".zst") else None
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd exports need the 'zstandard' package")
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, "wb")), encoding="utf-8")
+    return open(path, "w")
+
+class InventoryExporter:
+    """Streams role records to a JSONL file as the sweep produces them.
+
+    Each line is {"type": "role", ...RoleRecord} or {"type": "policy", "hash", "arn",
+    "name", "statements"}; a policy line is written the first time its canonical content
+    hash (see canonical.py) is seen, and role lines refer to it by hash. Only the set of seen hashes is kept, so
+    memory does not grow with the number of roles or accounts. Compression is picked
+    from the extension (.gz, .zst) unless given.
+    """
+
+    def __init__(self, path, compression=None):
+        self.path = path
+        self.roles = 0
+        self.policies = 0
+        self._file = _open(path, compression)
+        self._lock = threading.Lock()
+        self._seen_policies = set()
+
+    def _policy_hash(self, arn, name, statements, digest=None):
+        if digest is None:
+            statements = canonical_statements(statements)
+            digest = document_hash(statements)
+        digest = digest[:32]
+        with self._lock:
+            if digest not in self._seen_policies:
+                self._seen_policies.add(digest)
+                self.policies += 1
+                self._file.write(_compact({"type": "policy", "hash": digest, "arn": arn, "name": name,
+                                           "statements": statements}) + "\n")
+        return digest
+
+    def write_role(self, account, record):
+        role = RoleRecord.from_record(account, record, self._policy_hash)
+        line = _compact(dict(asdict(role), type="role")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.roles += 1
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+def iter_export(path):
+    """Yield the decoded lines of an export written by InventoryExporter"""
+    if path.endswith(".gz"):
+        f = gzip.open(path, "rt", encoding="utf-8")
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstd exports need the 'zstandard' package")
+        f = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    else:
+        f = open(path)
+    with f:
+        for line in f:
+            yield json.loads(line)
+
+_exporter = None
+
+def enable(path, compression=None):
+    """Send every record generated from now on to path"""
+    global _exporter
+    _exporter = InventoryExporter(path, compression)
+    return _exporter
+
+def current():
+    return _exporter
+
+def export_role(account, record):
+    """Export record if an export is enabled"""
+    if _exporter is not None:
+        _exporter.write_role(account, record)
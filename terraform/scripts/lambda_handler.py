@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Only the standard library is imported at module load; boto3 and the generator modules are
+# imported on first use so the cold start stays short. Everything cached below lives for
+# the life of the execution environment, so warm invocations reuse clients, assumed-role
+# credentials and the policy document cache.
+LAMBDA_LOG_FILE = "/tmp/tfvars_generation.log"
+ASSUME_ROLE_ENV = "IAM_ASSUME_ROLE"
+BULK_THRESHOLD = 8
+# Accounts whose IAM clients a warm execution environment keeps, least recently used first out
+MAX_CLIENTS = 16
+
+_lock = threading.Lock()
+_clients = OrderedDict()
+_identity = None
+_broker = None
+_s3 = None
+_invocations = 0
+
+def _records():
+    """role_records: the fetch and render helpers, without the sweep machinery of generate_tfvars"""
+    import role_records
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") and role_records.LOG_FILE != LAMBDA_LOG_FILE:
+        # The deployment package is read-only; /tmp is the only writable path
+        role_records.LOG_FILE = LAMBDA_LOG_FILE
+    return role_records
+
+def _own_account():
+    """Account id of the function's own credentials, looked up once per execution environment"""
+    global _identity
+    if _identity is None:
+        import boto3
+        from iam_calls import CLIENT_CONFIG
+        _identity = boto3.client("sts", config=CLIENT_CONFIG).get_caller_identity()["Account"]
+    return _identity
+
+def iam_client(account, assume_role=None, rate=8.0):
+    """Rate-limited IAM client for the account, kept for the next invocations (up to MAX_CLIENTS accounts).
+
+    With assume_role the role is assumed in the account through a shared CredentialBroker.
+    Without it the function's own credentials are used, which is only allowed when they
+    belong to the requested account; anything else raises ValueError.
+    """
+    global _broker
+    key = (account["id"], assume_role, rate)
+    with _lock:
+        if key in _clients:
+            _clients.move_to_end(key)
+            return _clients[key]
+        import boto3
+        import instrumentation
+        from iam_calls import CLIENT_CONFIG, IamCaller, TokenBucket
+        if assume_role:
+            from credential_broker import CredentialBroker
+            _broker = _broker or CredentialBroker()
+            session = _broker.session(account["id"], assume_role)
+        elif _own_account() == account["id"]:
+            session = boto3.Session()
+        else:
+            raise ValueError(f"No assume_role for account {account['id']} and the function runs in "
+                             f"{_own_account()}; set assume_role in the event or ${ASSUME_ROLE_ENV}")
+        client = instrumentation.attach(session.client("iam", config=CLIENT_CONFIG), account=account["alias"])
+        _clients[key] = IamCaller(client, TokenBucket(rate=rate, burst=max(1, int(rate))))
+        if len(_clients) > MAX_CLIENTS:
+            _clients.popitem(last=False)
+        return _clients[key]
+
+def _s3_client():
+    global _s3
+    with _lock:
+        if _s3 is None:
+            import boto3
+            _s3 = boto3.client("s3")
+        return _s3
+
+def _role_names(account, roles):
+    """Full role names for event roles given either as suffixes or as full names"""
+    prefix = f"{account['alias']}-"
+    return [role if role.startswith(prefix) else f"{prefix}{role}" for role in roles]
+
+def _fetch(iam, role_names, bulk, workers):
+    """{role_name: record or None}"""
+    role_records = _records()
+    if bulk:
+        records = role_records.fetch_account_roles(iam, role_names=role_names)
+        return {name: records.get(name) for name in role_names}
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(role_names)))) as pool:
+        return dict(zip(role_names, pool.map(lambda name: role_records.fetch_iam_role(name, iam), role_names)))
+
+def _deliver(output, account, suffix, content, digest):
+    """Send one rendered file to the output target; returns the result fields for it"""
+    if output == "inline":
+        return {"status": "rendered", "content": content}
+    if output == "hashes":
+        return {"status": "rendered"}
+    if output.startswith("s3://"):
+        bucket, _, prefix = output[len("s3://"):].partition("/")
+        key = "/".join(p for p in (prefix.strip("/"), account["alias"], suffix, "terraform.tfvars") if p)
+        from botocore.exceptions import ClientError
+        s3 = _s3_client()
+        try:
+            if s3.head_object(Bucket=bucket, Key=key).get("Metadata", {}).get("sha256") == digest:
+                return {"status": "unchanged", "location": f"s3://{bucket}/{key}"}
+        except ClientError:
+            pass
+        s3.put_object(Bucket=bucket, Key=key, Body=content.encode(), Metadata={"sha256": digest})
+        return {"status": "written", "location": f"s3://{bucket}/{key}"}
+    from render import write_if_changed
+    path = os.path.join(output, account["alias"], suffix, "terraform.tfvars")
+    return {"status": "written" if write_if_changed(path, content) else "unchanged", "location": path}
+
+def handler(event, context=None):
+    """Generate the tfvars for one account's roles. Meant as the item processor of a Step Functions Map state.
+
+    event:
+      account     {"alias", "id"} (or account_alias / account_id at the top level)
+      roles       role suffixes or full role names; defaults to IAM_ROLE_SUFFIXES
+      output      "inline" (default) returns each file's content, "hashes" only its
+                  sha256, "s3://bucket/prefix" or a local directory writes the files
+                  (skipping unchanged ones) and returns where they went
+      assume_role role to assume in the account; defaults to $IAM_ASSUME_ROLE, and is
+                  required unless the account is the function's own
+      bulk        one get_account_authorization_details walk instead of per-role calls;
+                  defaults to true above BULK_THRESHOLD roles
+      rate        max IAM requests per second for the account
+
+    Returns {"account", "roles": [{"role_name", "suffix", "status", "sha256", ...}],
+    "failed", "warm", "duration"}. Inline content counts against the 6 MB response
+    limit, so large role lists should use hashes or a write target.
+    """
+    global _invocations
+    start = time.perf_counter()
+    with _lock:
+        _invocations += 1
+        warm = _invocations > 1
+    account = event.get("account") or {"alias": event["account_alias"], "id": event["account_id"]}
+    role_records = _records()
+    from role_discovery import IAM_ROLE_SUFFIXES
+    from canonical import shared_store
+    from render import content_hash
+
+    suffixes = event.get("roles") or IAM_ROLE_SUFFIXES
+    role_names = _role_names(account, suffixes)
+    output = event.get("output", "inline")
+    bulk = event.get("bulk", len(role_names) > BULK_THRESHOLD)
+    iam = iam_client(account, event.get("assume_role") or os.environ.get(ASSUME_ROLE_ENV), event.get("rate", 8.0))
+
+    results = []
+    error = None
+    try:
+        records = _fetch(iam, role_names, bulk, event.get("workers", 4))
+    except Exception as e:
+        role_records.log(f"[ERROR] {account['alias']}: {e}")
+        records = {}
+        error = str(e)
+    for role_name in role_names:
+        suffix = role_records.role_suffix(account, role_name)
+        result = {"role_name": role_name, "suffix": suffix}
+        record = records.get(role_name)
+        if record is None:
+            result.update(status="failed", error=error or "Role could not be fetched")
+            results.append(result)
+            continue
+        content = role_records.render_tfvars(record, role_records.REGION, account["id"], account["alias"])
+        result["sha256"] = content_hash(content)
+        try:
+            result.update(_deliver(output, account, suffix, content, result["sha256"]))
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+        results.append(result)
+    role_records.flush_log()
+    # The next invocation is usually another account; its documents rarely match this one's
+    shared_store().clear()
+
+    return {
+        "account": account,
+        "roles": results,
+        "failed": sum(r["status"] == "failed" for r in results),
+        "warm": warm,
+        "duration": round(time.perf_counter() - start, 3)
+    }
+
+lambda_handler = handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Invoke the Lambda handler locally")
+    parser.add_argument("event", help="Event JSON file, or - for stdin")
+    parser.add_argument("--fake", action="store_true",
+                        help="Serve IAM from a synthetic fake_iam account built for the event's account")
+    parser.add_argument("--repeat", type=int, default=1, help="Invoke this many times to see warm-start reuse")
+    args = parser.parse_args()
+
+    event = json.load(sys.stdin if args.event == "-" else open(args.event))
+    if args.fake:
+        from fake_iam import FakeIam, synthetic_account
+        from iam_calls import IamCaller
+        from role_discovery import IAM_ROLE_SUFFIXES
+        fakes = {}
+
+        def fake_client(account, assume_role=None, rate=8.0):
+            if account["id"] not in fakes:
+                suffixes = [r[len(account["alias"]) + 1:] if r.startswith(f"{account['alias']}-") else r
+                            for r in event.get("roles") or IAM_ROLE_SUFFIXES]
+                fakes[account["id"]] = IamCaller(FakeIam(synthetic_account(account["id"], account["alias"], suffixes)))
+            return fakes[account["id"]]
+
+        globals()["iam_client"] = fake_client
+    for _ in range(args.repeat):
+        print(json.dumps(handler(event), indent=2))
+
+if __name__ == "__main__":
+    main()
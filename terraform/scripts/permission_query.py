@@ -0,0 +1,287 @@
+import argparse
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from canonical import canonical_statements, document_hash
+from inventory_export import iter_export
+
+ALLOWED = "allowed"
+CONDITIONAL = "conditional"
+PARTIAL = "partial"
+
+@lru_cache(maxsize=None)
+def _pattern(glob):
+    """Regex source for one IAM pattern: * and ? are wildcards, ${...} policy variables match anything"""
+    parts = re.split(r"(\$\{[^}]*\}|\*|\?)", glob)
+    return "".join(".*" if p == "*" or p.startswith("${") else "." if p == "?" else re.escape(p) for p in parts)
+
+@lru_cache(maxsize=None)
+def compile_patterns(patterns, ignore_case=False):
+    """Compile a tuple of IAM wildcard patterns into one matcher (a compiled regex's fullmatch)"""
+    flags = re.IGNORECASE if ignore_case else 0
+    return re.compile("|".join(f"(?:{_pattern(p)})" for p in patterns) or "(?!)", flags | re.DOTALL).fullmatch
+
+def _as_tuple(value):
+    if value is None:
+        return ()
+    return (value,) if isinstance(value, str) else tuple(value)
+
+def _service(action_pattern):
+    service = action_pattern.split(":", 1)[0].lower()
+    return "*" if "*" in service or "?" in service or ":" not in action_pattern else service
+
+class Statement:
+    """One policy statement compiled for matching, shared by every role that holds the policy"""
+
+    __slots__ = ("effect", "actions", "not_action", "resources", "not_resource", "all_resources", "conditional",
+                 "source", "holders", "services")
+
+    def __init__(self, statement, source):
+        self.effect = statement.get("Effect", "Allow")
+        self.not_action = "NotAction" in statement
+        action_patterns = _as_tuple(statement.get("NotAction" if self.not_action else "Action"))
+        self.actions = compile_patterns(action_patterns, ignore_case=True)
+        self.not_resource = "NotResource" in statement
+        resource_patterns = _as_tuple(statement.get("NotResource" if self.not_resource else "Resource", "*"))
+        self.resources = compile_patterns(resource_patterns)
+        self.all_resources = not self.not_resource and "*" in resource_patterns
+        self.conditional = bool(statement.get("Condition"))
+        self.source = source
+        self.holders = []
+        # A NotAction statement can apply to any service
+        self.services = {"*"} if self.not_action else {_service(p) for p in action_patterns}
+
+    def matches(self, action, resource):
+        if bool(self.actions(action)) == self.not_action:
+            return False
+        if resource is None:
+            return True
+        return bool(self.resources(resource)) != self.not_resource
+
+    def denies(self, action, resource):
+        """True / PARTIAL / False for an unconditional Deny; with no resource it only fully
+        denies when it covers every resource ("Resource": "*")"""
+        if self.conditional or not self.matches(action, resource):
+            return False
+        return True if resource is not None or self.all_resources else PARTIAL
+
+def _statements(document):
+    if isinstance(document, str):
+        document = json.loads(document)
+    statements = document.get("Statement", []) if isinstance(document, dict) else document
+    return [statements] if isinstance(statements, dict) else statements
+
+class PermissionIndex:
+    """Offline index answering "which roles can do <action> on <resource>" over harvested role records.
+
+    Policies are compiled once and indexed by service prefix, separately for Allow and
+    Deny; a customer managed policy shared by many roles is matched once and expanded
+    to its holders. A role is allowed when an identity Allow matches, no Deny matches
+    and, if it has a permissions boundary whose document is known, the boundary allows
+    it too. Allows or boundaries that depend on a Condition are reported as
+    "conditional"; conditional Denies are not treated as denying. Without a resource, a
+    Deny scoped to specific resources leaves the role "partial" (allowed on the other
+    resources). AWS managed policies are only known by ARN and are reported per role
+    rather than evaluated.
+    """
+
+    def __init__(self, boundary_documents=None):
+        self.roles = []
+        self._allow = defaultdict(list)
+        self._deny = defaultdict(list)
+        self._policies = {}
+        self._boundary_documents = dict(boundary_documents or {})
+        self._boundaries = {}
+
+    def _add(self, statement):
+        index = self._allow if statement.effect == "Allow" else self._deny
+        for service in statement.services:
+            index[service].append(statement)
+
+    def _policy_statements(self, key, statements, source):
+        compiled = self._policies.get(key)
+        if compiled is None:
+            compiled = self._policies[key] = [Statement(s, source) for s in statements]
+            for statement in compiled:
+                self._add(statement)
+        return compiled
+
+    def add_role(self, account_id, account_alias, role_name, customer_policies, inline_policies,
+                 managed_arns=(), permissions_boundary="", boundary_statements=None):
+        """customer_policies is [(key, name, statements)], where key identifies identical documents;
+        boundary_statements is the permissions boundary's document when it is known"""
+        if permissions_boundary and boundary_statements is not None:
+            self._boundary_documents.setdefault(permissions_boundary, {"Statement": boundary_statements})
+        role_id = len(self.roles)
+        self.roles.append({
+            "account_id": account_id,
+            "account_alias": account_alias,
+            "role_name": role_name,
+            "managed_arns": list(managed_arns),
+            "permissions_boundary": permissions_boundary
+        })
+        for key, name, statements in customer_policies:
+            for statement in self._policy_statements(("policy", key), statements, f"policy/{name}"):
+                statement.holders.append(role_id)
+        for name, document in inline_policies.items():
+            for s in _statements(document):
+                statement = Statement(s, f"inline/{name}")
+                statement.holders.append(role_id)
+                self._add(statement)
+
+    def add_record(self, account, record):
+        """Add a fetch_iam_role / build_role_record record"""
+        boundary = record.get("permissions_boundary_policy")
+        self.add_role(
+            account["id"], account["alias"], record["role_name"],
+            [(p.get("hash") or document_hash(canonical_statements(p["statements"])), name, p["statements"])
+             for name, p in record["customer_managed_policies"].items()],
+            record["inline_policies"], record["managed_arns"], record["permissions_boundary"],
+            boundary["statements"] if boundary else None
+        )
+
+    @classmethod
+    def from_export(cls, path, boundary_documents=None):
+        """Build from an inventory_export JSONL file (policy lines precede the roles using them)"""
+        index = cls(boundary_documents)
+        policies = {}
+        for line in iter_export(path):
+            if line["type"] == "policy":
+                policies[line["hash"]] = line["statements"]
+            elif line["type"] == "role":
+                for ref in line["customer_managed_policies"]:
+                    if ref["hash"] in policies:
+                        index._boundary_documents.setdefault(ref["arn"], {"Statement": policies[ref["hash"]]})
+                boundary = line.get("permissions_boundary_policy")
+                index.add_role(
+                    line["account_id"], line["account_alias"], line["role_name"],
+                    [(ref["hash"], ref["name"], policies.get(ref["hash"], [])) for ref in line["customer_managed_policies"]],
+                    line["inline_policies"], line["managed_arns"], line["permissions_boundary"],
+                    policies.get(boundary["hash"]) if boundary else None
+                )
+        return index
+
+    def _candidates(self, index, action):
+        service = action.split(":", 1)[0].lower()
+        return index.get(service, []) + index.get("*", [])
+
+    def _boundary(self, arn):
+        """Compiled statements of a boundary policy, or None when its document is unknown"""
+        if arn not in self._boundaries:
+            document = self._boundary_documents.get(arn)
+            self._boundaries[arn] = [Statement(s, f"boundary/{arn.split('/')[-1]}") for s in _statements(document)] \
+                if document is not None else None
+        return self._boundaries[arn]
+
+    def _boundary_decision(self, arn, action, resource):
+        """ALLOWED / CONDITIONAL / PARTIAL / None (blocked) / "unknown" for one boundary"""
+        statements = self._boundary(arn)
+        if statements is None:
+            return "unknown"
+        denies = {s.denies(action, resource) for s in statements if s.effect == "Deny"}
+        if True in denies:
+            return None
+        allows = [s for s in statements if s.effect == "Allow" and s.matches(action, resource)]
+        if not allows:
+            return None
+        if PARTIAL in denies:
+            return PARTIAL
+        return ALLOWED if any(not s.conditional for s in allows) else CONDITIONAL
+
+    def query(self, action, resource=None, account=None):
+        """Return [{"account_id", "account_alias", "role_name", "decision", "sources", ...}, ...].
+
+        resource=None ignores Resource/NotResource; account filters by account id or alias.
+        """
+        granted = {}
+        for statement in self._candidates(self._allow, action):
+            if not statement.matches(action, resource):
+                continue
+            for role_id in statement.holders:
+                entry = granted.setdefault(role_id, {"unconditional": False, "sources": [], "partial_denies": []})
+                entry["unconditional"] |= not statement.conditional
+                entry["sources"].append(statement.source)
+
+        for statement in self._candidates(self._deny, action):
+            denies = statement.denies(action, resource)
+            if not denies:
+                continue
+            for role_id in statement.holders:
+                if denies is PARTIAL:
+                    if role_id in granted:
+                        granted[role_id]["partial_denies"].append(statement.source)
+                else:
+                    granted.pop(role_id, None)
+
+        results = []
+        boundary_decisions = {}
+        for role_id, entry in sorted(granted.items()):
+            role = self.roles[role_id]
+            if account and account not in (role["account_id"], role["account_alias"]):
+                continue
+            decision = PARTIAL if entry["partial_denies"] else ALLOWED if entry["unconditional"] else CONDITIONAL
+            boundary = role["permissions_boundary"]
+            boundary_status = None
+            if boundary:
+                if boundary not in boundary_decisions:
+                    boundary_decisions[boundary] = self._boundary_decision(boundary, action, resource)
+                boundary_status = boundary_decisions[boundary]
+                if boundary_status is None:
+                    continue
+                if boundary_status in (CONDITIONAL, PARTIAL) and decision == ALLOWED:
+                    decision = boundary_status
+            results.append({
+                "account_id": role["account_id"],
+                "account_alias": role["account_alias"],
+                "role_name": role["role_name"],
+                "decision": decision,
+                "sources": sorted(set(entry["sources"])),
+                "partial_denies": sorted(set(entry["partial_denies"])),
+                "boundary": "unevaluated" if boundary_status == "unknown" else boundary or None,
+                "unevaluated_managed_policies": role["managed_arns"]
+            })
+        return sorted(results, key=lambda r: (r["account_alias"], r["role_name"]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer action/resource questions over an inventory export, offline")
+    parser.add_argument("export", help="JSONL inventory written by generate_tfvars.py --export")
+    parser.add_argument("--action", required=True, action="append", help="e.g. iam:PassRole (repeatable)")
+    parser.add_argument("--resource", help="Resource ARN to check; omit to ignore resources")
+    parser.add_argument("--account", help="Only report roles in this account id or alias")
+    parser.add_argument("--boundaries", help="JSON file mapping boundary policy ARN to its policy document, for boundaries "
+                             "the export has no document for (AWS managed ones)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    boundary_documents = None
+    if args.boundaries:
+        with open(args.boundaries) as f:
+            boundary_documents = json.load(f)
+
+    start = time.perf_counter()
+    index = PermissionIndex.from_export(args.export, boundary_documents)
+    built = time.perf_counter()
+    results = {action: index.query(action, args.resource, args.account) for action in args.action}
+    queried = time.perf_counter()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for action, matches in results.items():
+            print(f"{action} on {args.resource or '*'}: {len(matches)} roles")
+            for m in matches:
+                note = " (boundary not evaluated)" if m["boundary"] == "unevaluated" else ""
+                if m["partial_denies"]:
+                    note += f" (denied on some resources by {', '.join(m['partial_denies'])})"
+                print(f"  {m['account_alias']:<24} {m['role_name']:<48} {m['decision']:<12} "
+                      f"{', '.join(m['sources'])}{note}")
+    print(f"Indexed {len(index.roles)} roles in {built - start:.3f}s, queried in {(queried - built) * 1000:.1f}ms",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
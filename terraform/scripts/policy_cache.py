@@ -0,0 +1,95 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+class PolicyCache:
+    """Managed policy documents keyed by (policy ARN, version id).
+
+    Keeps up to max_entries documents in memory with LRU eviction and, when cache_dir
+    is set, persists them as JSON so later runs skip the download as well. Policy
+    versions are immutable, so an entry never needs revalidating.
+    """
+
+    def __init__(self, max_entries=2048, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, policy_arn, version_id):
+        key = hashlib.sha256(f"{policy_arn}:{version_id}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key, document):
+        with self._lock:
+            self._entries[key] = document
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, policy_arn, version_id):
+        """Return a copy of the cached document or None"""
+        key = (policy_arn, version_id)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+
+        if self.cache_dir:
+            path = self._disk_path(policy_arn, version_id)
+            if os.path.exists(path):
+                with open(path) as f:
+                    document = json.load(f)
+                self._remember(key, document)
+                with self._lock:
+                    self.hits += 1
+                return copy.deepcopy(document)
+        return None
+
+    def put(self, policy_arn, version_id, document):
+        self._remember((policy_arn, version_id), copy.deepcopy(document))
+        if self.cache_dir:
+            path = self._disk_path(policy_arn, version_id)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(document, f)
+            os.replace(tmp_path, path)
+
+    def get_policy_document(self, iam, policy_arn, version_id=None):
+        """Return (policy_name, document) for a managed policy, downloading each version at most once.
+
+        Without version_id one get_policy call is made to look up the DefaultVersionId.
+        """
+        policy_name = policy_arn.split("/")[-1]
+        if version_id is None:
+            policy = iam.get_policy(PolicyArn=policy_arn)["Policy"]
+            policy_name = policy["PolicyName"]
+            version_id = policy["DefaultVersionId"]
+
+        document = self.get(policy_arn, version_id)
+        if document is None:
+            with self._lock:
+                self.misses += 1
+            document = iam.get_policy_version(PolicyArn=policy_arn, VersionId=version_id)["PolicyVersion"]["Document"]
+            self.put(policy_arn, version_id, document)
+            document = copy.deepcopy(document)
+        return policy_name, document
+
+_shared_cache = PolicyCache()
+
+def shared_cache():
+    """Process-wide cache used by every fetch path unless a caller passes its own"""
+    return _shared_cache
+
+def configure_shared_cache(max_entries=2048, cache_dir=None):
+    global _shared_cache
+    _shared_cache = PolicyCache(max_entries=max_entries, cache_dir=cache_dir)
+    return _shared_cache
@@ -1,10 +1,17 @@
+import argparse
 import boto3
 import json
 import os
 import sys
 
-# Initialize boto3 IAM client
-iam_client = boto3.client("iam")
+import direct_tf
+from iam_calls import CLIENT_CONFIG, IamCaller, LazyClient, list_all
+from instance_profiles import shared_index
+from render import RENDER_STATS, write_if_changed
+from tfvars_parser import TfvarsSyntaxError, parse_tfvars_file
+
+# IAM client (rate limited, retries throttling), built on first use
+iam_client = LazyClient(lambda: IamCaller(boto3.client("iam", config=CLIENT_CONFIG)))
 
 def read_tfvars(file_path):
     """Read terraform.tfvars and extract role_name. Exit if not found."""
@@ -12,12 +19,11 @@ def read_tfvars(file_path):
         print(f"[ERROR] Required file '{file_path}' not found. Please create it with role_name.")
         sys.exit(1)
 
-    role_name = None
-    with open(file_path, "r") as f:
-        for line in f:
-            if line.startswith("role_name"):
-                role_name = line.split("=")[1].strip().replace('"', '')
-                break
+    try:
+        role_name = parse_tfvars_file(file_path).get("role_name")
+    except TfvarsSyntaxError as e:
+        print(f"[ERROR] Could not parse {file_path}: {e}")
+        sys.exit(1)
 
     if not role_name:
         print(f"[ERROR] 'role_name' is missing in {file_path}. It is a mandatory field.")
@@ -30,16 +36,16 @@ def get_assume_role_policy(role_name):
     try:
         role_details = iam_client.get_role(RoleName=role_name)
         return role_details["Role"]["AssumeRolePolicyDocument"]
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] Could not retrieve Assume Role Policy for '{role_name}': {e}")
         return None
 
 def get_attached_policies(role_name):
     """Fetch Managed Policies attached to an IAM Role"""
     try:
-        policies = iam_client.list_attached_role_policies(RoleName=role_name)["AttachedPolicies"]
+        policies = list_all(iam_client, "list_attached_role_policies", "AttachedPolicies", RoleName=role_name)
         return [policy["PolicyArn"] for policy in policies]
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Managed Policies found for '{role_name}': {e}")
         return []
 
@@ -48,23 +54,29 @@ def get_permissions_boundary(role_name):
     try:
         role_details = iam_client.get_role(RoleName=role_name)
         return role_details["Role"].get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Permissions Boundary found for '{role_name}': {e}")
         return None
 
 def get_instance_profile(role_name):
-    """Fetch Instance Profile associated with the IAM Role"""
+    """Fetch Instance Profile associated with the IAM Role from the account-wide instance profile index"""
     try:
-        instance_profiles = iam_client.list_instance_profiles_for_role(RoleName=role_name)
-        if instance_profiles["InstanceProfiles"]:
-            return instance_profiles["InstanceProfiles"][0]["InstanceProfileName"]
+        profile_names = shared_index(iam_client).profile_names(role_name)
+        if len(profile_names) > 1:
+            print(f"[WARNING] '{role_name}' is in {len(profile_names)} instance profiles, using {profile_names[0]}")
+        if profile_names:
+            return profile_names[0]
         return None
-    except Exception as e:
+    except iam_client.exceptions.NoSuchEntityException as e:
         print(f"[WARNING] No Instance Profile found for '{role_name}': {e}")
         return None
 
-def generate_terraform(role_name):
-    """Generate Terraform Configuration using locals.tf and data.tf"""
+def generate_terraform(role_name, direct=False, policy_data=False):
+    """Generate Terraform Configuration using locals.tf and data.tf.
+
+    With direct=True the module gets no data sources (see direct_tf.py); policy_data also
+    writes the shared account_policies module for the role's managed policies.
+    """
     module_dir = "terraform/modules/iam_role"
     policy_dir = f"{module_dir}/policies"
     os.makedirs(policy_dir, exist_ok=True)
@@ -77,8 +89,7 @@ def generate_terraform(role_name):
 
     # ✅ Write Assume Role Policy JSON to File
     if assume_role_policy:
-        with open(assume_policy_file, "w") as f:
-            json.dump(assume_role_policy, f, indent=2)
+        write_if_changed(assume_policy_file, json.dumps(assume_role_policy, indent=2))
 
     print(f"✅ Assume role policy JSON created: {assume_policy_file}")
 
@@ -108,8 +119,11 @@ data "aws_iam_policy" "{policy_name}" {{
 """
 
     # ✅ Write the final `data.tf` file
-    with open(f"{module_dir}/data.tf", "w") as f:
-        f.write(data_tf_content)
+    if direct:
+        # No data sources: locals.tf references the ARNs and the trust policy file directly
+        data_tf_content = direct_tf.DIRECT_DATA_TF
+
+    write_if_changed(f"{module_dir}/data.tf", data_tf_content)
 
     print(f"✅ data.tf created successfully at {module_dir}/data.tf")
 
@@ -129,18 +143,25 @@ locals {{
     if instance_profile_name:
         locals_tf_content += f'  iam_instance_profile_name = "{instance_profile_name}"\n'
 
+    if direct:
+        locals_tf_content += direct_tf.assume_policy_local(role_name)
+
     locals_tf_content += "}\n"
 
-    with open(f"{module_dir}/locals.tf", "w") as f:
-        f.write(locals_tf_content)
+    write_if_changed(f"{module_dir}/locals.tf", locals_tf_content)
 
     print(f"✅ locals.tf created successfully at {module_dir}/locals.tf")
 
+    if policy_data:
+        direct_tf.write_policy_data("terraform", managed_policies)
+
     # ✅ Generate `main.tf`
+    assume_role_ref = "local.iam_assume_role_policy" if direct else \
+        "data.aws_iam_policy_document.instance_assume_role_policy.json"
     main_tf_content = f"""
 resource "aws_iam_role" "{role_name}" {{
   name               = local.iam_role_name
-  assume_role_policy = data.aws_iam_policy_document.instance_assume_role_policy.json
+  assume_role_policy = {assume_role_ref}
   managed_policy_arns = local.iam_managed_policy_arns
 """
 
@@ -159,8 +180,7 @@ resource "aws_iam_instance_profile" "{role_name}_profile" {{
 }}
 """
 
-    with open(f"{module_dir}/main.tf", "w") as f:
-        f.write(main_tf_content)
+    write_if_changed(f"{module_dir}/main.tf", main_tf_content)
 
     print(f"✅ main.tf created successfully at {module_dir}/main.tf")
 
@@ -171,13 +191,19 @@ module "iam_role" {{
   role_name = "{role_name}"
 }}
 """
-    with open("terraform/iam_role.tf", "w") as f:
-        f.write(iam_role_tf_content)
+    write_if_changed("terraform/iam_role.tf", iam_role_tf_content)
 
     print(f"✅ iam_role.tf created successfully at terraform/iam_role.tf")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the iam_role module for the role_name in terraform.tfvars")
+    parser.add_argument("--direct", action="store_true",
+                        help="Reference policy ARNs and the trust policy from locals instead of data sources")
+    parser.add_argument("--policy-data", action="store_true",
+                        help="Also write the shared account_policies module for the role's managed policies")
+    args = parser.parse_args()
     tfvars_path = "terraform/terraform.tfvars"
     role_name = read_tfvars(tfvars_path)
-    generate_terraform(role_name)
+    generate_terraform(role_name, direct=args.direct, policy_data=args.policy_data)
+    print(f"Terraform files: {RENDER_STATS.summary()}")
 
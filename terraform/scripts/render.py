@@ -0,0 +1,64 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+class RenderStats:
+    """Thread-safe counts of files written vs. skipped because they were already up to date"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.written = 0
+        self.skipped = 0
+
+    def record(self, written):
+        with self._lock:
+            if written:
+                self.written += 1
+            else:
+                self.skipped += 1
+
+    def summary(self):
+        return f"{self.written} written, {self.skipped} unchanged"
+
+RENDER_STATS = RenderStats()
+
+def content_hash(content):
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+def _file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def write_if_changed(path, content, stats=RENDER_STATS):
+    """Write content to path only if it differs from what is on disk.
+
+    The write goes to a temp file in the same directory and is renamed into place, so
+    readers never see a partial file and unchanged files keep their mtime.
+    Returns True when the file was written.
+    """
+    data = content.encode() if isinstance(content, str) else content
+    path = os.fspath(path)
+    if os.path.exists(path) and os.path.getsize(path) == len(data) and _file_hash(path) == content_hash(data):
+        stats.record(False)
+        return False
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    stats.record(True)
+    return True
@@ -0,0 +1,118 @@
+import queue
+import re
+import threading
+
+from iam_calls import list_all
+
+# The historical role family: every account has <alias>-<suffix> for each of these
+IAM_ROLE_SUFFIXES = [
+    "read-only-runner-role",
+    "basic-runner-role",
+    "elevated-iam-runner-role",
+    "elevated-infra-runner-role"
+]
+
+_DONE = object()
+
+class RoleFilter:
+    """Select roles by path prefix, a name regex and required tags.
+
+    tags maps tag key to value; a value of None only requires the key to exist.
+    """
+
+    def __init__(self, path_prefix="/", name_pattern=None, tags=None):
+        self.path_prefix = path_prefix or "/"
+        self.name_re = re.compile(name_pattern) if name_pattern else None
+        self.tags = dict(tags or {})
+
+    def matches_name(self, role):
+        return role.get("Path", "/").startswith(self.path_prefix) and (
+            self.name_re is None or self.name_re.search(role["RoleName"]) is not None
+        )
+
+    def matches_tags(self, tags):
+        """tags is a list of {"Key", "Value"} as IAM returns them"""
+        present = {tag["Key"]: tag["Value"] for tag in tags}
+        return all(key in present and (value is None or present[key] == value) for key, value in self.tags.items())
+
+    def matches(self, role):
+        """Match a role entry that carries its Tags (get_role / get_account_authorization_details)"""
+        return self.matches_name(role) and self.matches_tags(role.get("Tags", []))
+
+def parse_tag_filters(values):
+    """Turn ["team=infra", "managed-by"] CLI values into {"team": "infra", "managed-by": None}"""
+    tags = {}
+    for value in values or []:
+        key, sep, tag_value = value.partition("=")
+        tags[key] = tag_value if sep else None
+    return tags
+
+def account_role_filter(account_alias, suffixes):
+    """The historical selection: exactly <alias>-<suffix> for each suffix"""
+    names = "|".join(re.escape(f"{account_alias}-{suffix}") for suffix in suffixes)
+    return RoleFilter(name_pattern=f"^(?:{names})$")
+
+def discover_roles(iam, role_filter):
+    """Yield list_roles entries matching role_filter, one page at a time.
+
+    list_roles does not return tags, so tags are only fetched (list_role_tags) for roles
+    whose path and name already match, and only when the filter has tag conditions.
+    """
+    paginator = iam.get_paginator("list_roles")
+    for page in paginator.paginate(PathPrefix=role_filter.path_prefix):
+        for role in page.get("Roles", []):
+            if not role_filter.matches_name(role):
+                continue
+            if role_filter.tags and not role_filter.matches_tags(
+                list_all(iam, "list_role_tags", "Tags", RoleName=role["RoleName"])
+            ):
+                continue
+            yield role
+
+def run_pipeline(items, handler, workers=2, queue_size=100):
+    """Feed items from a (lazy) iterable to workers threads through a bounded queue.
+
+    The producer runs in its own thread, so handler work overlaps with pulling the next
+    pages of items, and at most queue_size items wait in between.
+    Returns (results, error): results in completion order, error is the exception that
+    stopped the producer or None. An exception from handler is re-raised once the queue
+    has drained so a failing worker cannot leave the producer blocked.
+    """
+    work = queue.Queue(maxsize=queue_size)
+    results = []
+    results_lock = threading.Lock()
+    producer_error = []
+    handler_errors = []
+
+    def produce():
+        try:
+            for item in items:
+                work.put(item)
+        except Exception as e:
+            producer_error.append(e)
+        finally:
+            for _ in range(workers):
+                work.put(_DONE)
+
+    def consume():
+        while True:
+            item = work.get()
+            if item is _DONE:
+                return
+            try:
+                result = handler(item)
+            except Exception as e:
+                handler_errors.append(e)
+                continue
+            with results_lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=consume, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if handler_errors:
+        raise handler_errors[0]
+    return results, producer_error[0] if producer_error else None
@@ -0,0 +1,301 @@
+import atexit
+import json
+import threading
+import urllib.parse
+from datetime import datetime
+
+import boto3
+
+import instrumentation
+from canonical import canonicalize_record
+from iam_calls import CLIENT_CONFIG, IamCaller, list_all
+from policy_cache import shared_cache
+from snapshot_cache import signature_from_details
+
+# Fetching a role into a record and rendering it as terraform.tfvars. The sweep
+# (generate_tfvars.py), drift.py and the Lambda handler share these; sweep-only machinery
+# stays in generate_tfvars so the handler's cold start only pays for what it uses.
+
+LOG_FILE = "./tfvars_generation.log"
+# Also print every log line; the benchmark turns this off so it only measures the sweep
+LOG_ECHO = True
+REGION = "us-west-1"
+
+# Version of the render_tfvars output and record shape, kept in the snapshot cache.
+# Bump it with every change to either so cached roles are rendered again:
+#   2  instance_profiles map
+#   3  canonical (sorted) statements, Condition rendered as JSON
+#   4  permissions_boundary_policy document in the record
+RENDER_VERSION = 4
+
+_log_lock = threading.Lock()
+_log_file = None
+
+def log(message):
+    """Print message (if LOG_ECHO) and append it to LOG_FILE through one buffered handle kept open for the run"""
+    global _log_file
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    line = f"[{timestamp}] {message}"
+    with _log_lock:
+        if LOG_ECHO:
+            print(line)
+        if _log_file is None or _log_file.name != LOG_FILE:
+            if _log_file is not None:
+                _log_file.close()
+            _log_file = open(LOG_FILE, "a")
+        _log_file.write(line + "\n")
+
+def flush_log():
+    with _log_lock:
+        if _log_file is not None:
+            _log_file.flush()
+
+atexit.register(flush_log)
+
+def role_instance_profiles(iam, role_name, profile_index=None):
+    """[{"name", "arn", "tags"}, ...] for every instance profile of the role.
+
+    With the account's InstanceProfileIndex this is an in-memory lookup; without one it
+    falls back to list_instance_profiles_for_role plus a tag listing per profile.
+    """
+    if profile_index is not None:
+        return profile_index.profiles_for_role(role_name)
+    return [
+        {
+            "name": profile["InstanceProfileName"],
+            "arn": profile["Arn"],
+            "tags": [{tag["Key"]: tag["Value"]} for tag in list_all(
+                iam, "list_instance_profile_tags", "Tags", InstanceProfileName=profile["InstanceProfileName"]
+            )]
+        }
+        for profile in list_all(iam, "list_instance_profiles_for_role", "InstanceProfiles", RoleName=role_name)
+    ]
+
+def profile_fields(instance_profiles):
+    """Record fields for a role's instance profiles; instance_profile_name/_tags keep the first one"""
+    return {
+        "instance_profile_name": instance_profiles[0]["name"] if instance_profiles else "",
+        "instance_profile_tags": instance_profiles[0]["tags"] if instance_profiles else [],
+        "instance_profiles": instance_profiles
+    }
+
+def boundary_policy(iam, role, policy_versions, policy_cache=None):
+    """The role's permissions boundary as {"name", "arn", "statements"}, fetched like an attached
+    customer managed policy; None without a boundary or when its document cannot be read."""
+    policy_arn = role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+    if not policy_arn:
+        return None
+    try:
+        policy_name, document = (policy_cache or shared_cache()).get_policy_document(
+            iam, policy_arn, policy_versions.get(policy_arn)
+        )
+    except Exception as e:
+        log(f"[WARN] Could not fetch permissions boundary {policy_arn} of {role.get('RoleName')}: {e}")
+        return None
+    return {"name": policy_name, "arn": policy_arn, "statements": document.get("Statement", [])}
+
+def fetch_iam_role(role_name, iam=None, policy_versions=None, policy_cache=None, profile_index=None, snapshot=None):
+    """Fetch one role with per-role IAM calls.
+
+    policy_versions maps customer managed policy ARNs to their DefaultVersionId (see
+    local_policy_versions) so get_policy can be skipped; documents come from the shared
+    policy cache so each policy version is downloaded once per run. Instance profiles
+    come from profile_index when given (see InstanceProfileIndex), and the permissions
+    boundary document the same way as attached policies. A snapshot from
+    fetch_snapshot supplies the role, its attachments and inline documents, which are
+    then not requested again.
+    """
+    iam = iam or IamCaller(instrumentation.attach(boto3.client('iam', config=CLIENT_CONFIG)))
+    policy_versions = policy_versions or {}
+    policy_cache = policy_cache or shared_cache()
+    try:
+        role = {"Role": snapshot["role"]} if snapshot else iam.get_role(RoleName=role_name)
+        assume_role_policy = role['Role']['AssumeRolePolicyDocument']
+        permissions_boundary = role['Role'].get('PermissionsBoundary', {}).get('PermissionsBoundaryArn', "")
+        if snapshot:
+            attached_policies = snapshot["attached"]
+        else:
+            attached_policies = list_all(iam, "list_attached_role_policies", "AttachedPolicies", RoleName=role_name)
+
+        managed_arns = []
+        customer_managed_policies = {}
+
+        for policy in attached_policies:
+            policy_arn = policy['PolicyArn']
+
+            if "aws:policy" in policy_arn:
+                managed_arns.append(policy_arn)
+            else:
+                policy_name, document = policy_cache.get_policy_document(
+                    iam, policy_arn, policy_versions.get(policy_arn)
+                )
+                customer_managed_policies[policy_name] = {
+                    "name": policy_name,
+                    "arn": policy_arn,
+                    "statements": document.get('Statement', [])
+                }
+
+        inline_docs = dict(snapshot["inline_documents"]) if snapshot else {}
+        for name in [] if snapshot else list_all(iam, "list_role_policies", "PolicyNames", RoleName=role_name):
+            inline_doc = iam.get_role_policy(RoleName=role_name, PolicyName=name)
+            inline_docs[name] = inline_doc['PolicyDocument']
+
+        tags = list_all(iam, "list_role_tags", "Tags", RoleName=role_name)
+        tag_list = [{tag["Key"]: tag["Value"]} for tag in tags]
+
+        return canonicalize_record(dict({
+            "role_name": role_name,
+            "assume_role_policy": assume_role_policy,
+            "managed_arns": managed_arns,
+            "customer_managed_policies": customer_managed_policies,
+            "inline_policies": inline_docs,
+            "permissions_boundary": permissions_boundary,
+            "permissions_boundary_policy": boundary_policy(iam, role["Role"], policy_versions, policy_cache),
+            "tags": tag_list
+        }, **profile_fields(role_instance_profiles(iam, role_name, profile_index))))
+    except Exception as e:
+        log(f"[ERROR] fetch_iam_role failed for {role_name}: {e}")
+        return None
+
+def _policy_document(document):
+    """get_account_authorization_details may hand back URL-encoded JSON instead of a dict"""
+    if isinstance(document, str):
+        return json.loads(urllib.parse.unquote(document))
+    return document
+
+def build_role_record(role, local_policies):
+    """Build the fetch_iam_role record from a RoleDetailList entry and the account's LocalManagedPolicy map"""
+    role_name = role["RoleName"]
+    managed_arns = []
+    customer_managed_policies = {}
+
+    for policy in role.get("AttachedManagedPolicies", []):
+        policy_arn = policy["PolicyArn"]
+        if "aws:policy" in policy_arn:
+            managed_arns.append(policy_arn)
+            continue
+
+        policy_info = local_policies.get(policy_arn)
+        if not policy_info:
+            log(f"[WARN] Policy {policy_arn} attached to {role_name} missing from authorization details")
+            continue
+        document = next(
+            (v["Document"] for v in policy_info.get("PolicyVersionList", []) if v.get("IsDefaultVersion")),
+            {}
+        )
+        policy_name = policy_info["PolicyName"]
+        customer_managed_policies[policy_name] = {
+            "name": policy_name,
+            "arn": policy_arn,
+            "statements": _policy_document(document).get("Statement", [])
+        }
+
+    inline_docs = {
+        p["PolicyName"]: _policy_document(p["PolicyDocument"])
+        for p in role.get("RolePolicyList", [])
+    }
+
+    instance_profiles = [
+        {
+            "name": profile["InstanceProfileName"],
+            "arn": profile["Arn"],
+            "tags": [{tag["Key"]: tag["Value"]} for tag in profile.get("Tags", [])]
+        }
+        for profile in role.get("InstanceProfileList", [])
+    ]
+
+    boundary = role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn", "")
+    boundary_info = local_policies.get(boundary)
+    boundary_document = next(
+        (v["Document"] for v in (boundary_info or {}).get("PolicyVersionList", []) if v.get("IsDefaultVersion")),
+        None
+    )
+
+    return canonicalize_record(dict({
+        "role_name": role_name,
+        "assume_role_policy": _policy_document(role["AssumeRolePolicyDocument"]),
+        "managed_arns": managed_arns,
+        "customer_managed_policies": customer_managed_policies,
+        "inline_policies": inline_docs,
+        "permissions_boundary": boundary,
+        # AWS managed boundaries are not in the authorization details and stay unknown
+        "permissions_boundary_policy": {
+            "name": boundary_info["PolicyName"], "arn": boundary,
+            "statements": _policy_document(boundary_document).get("Statement", [])
+        } if boundary_document is not None else None,
+        "tags": [{tag["Key"]: tag["Value"]} for tag in role.get("Tags", [])]
+    }, **profile_fields(instance_profiles)))
+
+def fetch_account_roles(iam=None, role_names=None, signatures=None, role_filter=None):
+    """Fetch every role in the account with one paginated get_account_authorization_details walk.
+
+    Returns {role_name: record} using the same record shape as fetch_iam_role.
+    Pass role_names or a RoleFilter to only build records for those roles, and a dict as
+    signatures to have it filled with each role's snapshot cache signature.
+    """
+    iam = iam or IamCaller(instrumentation.attach(boto3.client('iam', config=CLIENT_CONFIG)))
+    wanted = set(role_names) if role_names is not None else None
+    roles = []
+    local_policies = {}
+
+    with instrumentation.stage("fetch", operation="get_account_authorization_details"):
+        paginator = iam.get_paginator("get_account_authorization_details")
+        for page in paginator.paginate(Filter=["Role", "LocalManagedPolicy"]):
+            for role in page.get("RoleDetailList", []):
+                if (wanted is None or role["RoleName"] in wanted) and (role_filter is None or role_filter.matches(role)):
+                    roles.append(role)
+            for policy in page.get("Policies", []):
+                local_policies[policy["Arn"]] = policy
+                for version in policy.get("PolicyVersionList", []):
+                    if version.get("IsDefaultVersion"):
+                        shared_cache().put(policy["Arn"], version["VersionId"], _policy_document(version["Document"]))
+
+    with instrumentation.stage("normalize", roles=len(roles)):
+        if signatures is not None:
+            for role in roles:
+                signatures[role["RoleName"]] = signature_from_details(role, local_policies)
+        return {role["RoleName"]: build_role_record(role, local_policies) for role in roles}
+
+def _pretty(document):
+    """Records keep policy documents as parsed JSON; they are only pretty-printed here.
+    Records cached before that change hold the pretty-printed string already."""
+    return document if isinstance(document, str) else json.dumps(document, indent=4)
+
+def render_tfvars(role_details, region, account_id, account_alias):
+    """Build the terraform.tfvars content for a role record in memory"""
+    out = []
+    out.append(f'role_name = "{role_details["role_name"]}"\n\n')
+    out.append(f'assume_role_policy = <<EOT\n{_pretty(role_details["assume_role_policy"])}\nEOT\n\n')
+    out.append(f'managed_arns = {json.dumps(role_details["managed_arns"], indent=4)}\n\n')
+    out.append(f'customer_managed_policies = {{\n')
+    for name, data in role_details["customer_managed_policies"].items():
+        out.append(f'  "{name}" = {{\n')
+        out.append(f'    name = "{data["name"]}"\n')
+        out.append(f'    statements = [\n')
+        for stmt in data["statements"]:
+            out.append('      {\n')
+            for k, v in stmt.items():
+                if isinstance(v, (list, dict)):
+                    out.append(f'        {k} = {json.dumps(v)}\n')
+                else:
+                    out.append(f'        {k} = "{v}"\n')
+            out.append('      },\n')
+        out.append('    ]\n  }\n')
+    out.append('}\n\n')
+    out.append(f'permissions_boundary = "{role_details["permissions_boundary"]}"\n\n')
+    out.append(f'instance_profile_name = "{role_details["instance_profile_name"]}"\n\n')
+    out.append(f'tags = {json.dumps(role_details["tags"], indent=4)}\n\n')
+    out.append(f'instance_profile_tags = {json.dumps(role_details["instance_profile_tags"], indent=4)}\n\n')
+    profiles = {p["name"]: {"arn": p["arn"], "tags": p["tags"]} for p in role_details.get("instance_profiles", [])}
+    out.append(f'instance_profiles = {json.dumps(profiles, indent=4)}\n\n')
+    for name, doc in role_details["inline_policies"].items():
+        out.append(f'inline_policy_{name} = <<EOT\n{_pretty(doc)}\nEOT\n\n')
+    out.append(f'aws_region = "{region}"\n')
+    out.append(f'target_account_id = "{account_id}"\n')
+    out.append(f'target_role_name = "{account_alias}-elevated-iam-runner-role"\n')
+    return "".join(out)
+
+def role_suffix(account, role_name):
+    """Output directory name for a role: the part after "<alias>-", or the whole name for other role families"""
+    prefix = f"{account['alias']}-"
+    return role_name[len(prefix):] if role_name.startswith(prefix) else role_name
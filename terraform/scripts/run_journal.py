@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+
+DEFAULT_JOURNAL = "./tfvars_run_journal.jsonl"
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# Role name of the account-level unit: listing the account's roles (discovery mode)
+ACCOUNT_UNIT = "*"
+
+class RunJournal:
+    """Append-only JSONL record of every (account, role) unit in a sweep.
+
+    Each line is {"account", "role", "status", "hash", "error", "ts"}; the latest line for a
+    unit wins when the journal is replayed, so a killed run can be resumed from where it
+    stopped. Writes are buffered and flushed flush_every entries at a time and by flush().
+    Opening with resume=False starts a fresh journal.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL, resume=False, flush_every=100):
+        self.path = path
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._units = {}
+        torn = False
+        if resume and os.path.exists(path):
+            torn = self._replay()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a" if resume else "w")
+        if torn:
+            # Start on a fresh line so the next entry is not glued to the torn one
+            self._file.write("\n")
+
+    def _replay(self):
+        """Load the journal's units; returns True when the file does not end with a newline"""
+        line = ""
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write can leave a torn last line
+                    continue
+                self._units[(entry["account"], entry["role"])] = entry
+        return bool(line) and not line.endswith("\n")
+
+    def status(self, account_id, role_name):
+        entry = self._units.get((account_id, role_name))
+        return entry["status"] if entry else None
+
+    def units(self, status):
+        """Return [(account_id, role_name), ...] whose latest status is status"""
+        with self._lock:
+            return sorted(key for key, entry in self._units.items() if entry["status"] == status)
+
+    def should_run(self, account_id, role_name, resume=False, retry_failed=False):
+        """Decide whether a unit runs: resume skips done units, retry_failed runs only failed ones.
+
+        While the account's ACCOUNT_UNIT is failed, its roles the journal has never seen
+        count as failed too: they were never reached because listing the account failed.
+        """
+        status = self.status(account_id, role_name)
+        if retry_failed:
+            return status == FAILED or (status is None and self.status(account_id, ACCOUNT_UNIT) == FAILED)
+        if resume:
+            return status != DONE
+        return True
+
+    def mark(self, account_id, role_name, status, output_hash=None, error=None):
+        entry = {
+            "account": account_id,
+            "role": role_name,
+            "status": status,
+            "hash": output_hash,
+            "error": error,
+            "ts": round(time.time(), 3)
+        }
+        with self._lock:
+            self._units[(account_id, role_name)] = entry
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._file and self._buffer:
+            self._file.write("".join(json.dumps(e) + "\n" for e in self._buffer))
+            self._file.flush()
+        self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def summary(self):
+        with self._lock:
+            counts = {PENDING: 0, DONE: 0, FAILED: 0}
+            for entry in self._units.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            return counts
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from iam_calls import list_all
+
+DEFAULT_CACHE_DIR = "./.iam_snapshot_cache"
+
+def _hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def build_signature(role, policy_versions, inline_documents, instance_profiles):
+    """Cheap change signals for a role.
+
+    role is a get_role / RoleDetailList entry, policy_versions maps attached and boundary
+    policy ARN to DefaultVersionId (None for AWS managed), inline_documents maps inline
+    policy name to document.
+    """
+    return {
+        "role_id": role.get("RoleId"),
+        "arn": role.get("Arn"),
+        "role_hash": _hash({
+            "trust": role.get("AssumeRolePolicyDocument"),
+            "boundary": role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn", ""),
+            "tags": sorted((t["Key"], t["Value"]) for t in role.get("Tags", []))
+        }),
+        "policy_versions": dict(sorted(policy_versions.items())),
+        "inline_hash": _hash(inline_documents),
+        "instance_profiles": sorted(instance_profiles)
+    }
+
+def signature_from_details(role, local_policies):
+    """Signature for a get_account_authorization_details RoleDetailList entry, no extra calls"""
+    policy_versions = {
+        p["PolicyArn"]: local_policies.get(p["PolicyArn"], {}).get("DefaultVersionId")
+        for p in role.get("AttachedManagedPolicies", [])
+    }
+    boundary = role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+    if boundary:
+        policy_versions[boundary] = local_policies.get(boundary, {}).get("DefaultVersionId")
+    inline_documents = {p["PolicyName"]: p["PolicyDocument"] for p in role.get("RolePolicyList", [])}
+    instance_profiles = [p["InstanceProfileName"] for p in role.get("InstanceProfileList", [])]
+    return build_signature(role, policy_versions, inline_documents, instance_profiles)
+
+def local_policy_versions(iam):
+    """Map every attached or boundary customer managed policy ARN in the account to its DefaultVersionId.
+
+    Paginated list_policies calls per account replace a get_policy per role attachment
+    and permissions boundary.
+    """
+    versions = {}
+    paginator = iam.get_paginator("list_policies")
+    for filters in ({"OnlyAttached": True}, {"PolicyUsageFilter": "PermissionsBoundary"}):
+        for page in paginator.paginate(Scope="Local", **filters):
+            for policy in page.get("Policies", []):
+                versions[policy["Arn"]] = policy["DefaultVersionId"]
+    return versions
+
+def fetch_snapshot(iam, role_name, policy_versions, profile_index=None):
+    """Revalidate one role with the fewest calls we can: get_role plus the attachment and inline listings.
+
+    Returns {"signature", "role", "attached", "inline_documents"} so a role whose signature
+    changed can be built from these responses (see generate_tfvars.fetch_iam_role)
+    instead of fetching them again. With the account's InstanceProfileIndex the role's
+    profiles are looked up in memory.
+    """
+    role = iam.get_role(RoleName=role_name)["Role"]
+    attached = list_all(iam, "list_attached_role_policies", "AttachedPolicies", RoleName=role_name)
+    versions = {p["PolicyArn"]: policy_versions.get(p["PolicyArn"]) for p in attached}
+    boundary = role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+    if boundary:
+        versions[boundary] = policy_versions.get(boundary)
+    inline_documents = {
+        name: iam.get_role_policy(RoleName=role_name, PolicyName=name)["PolicyDocument"]
+        for name in list_all(iam, "list_role_policies", "PolicyNames", RoleName=role_name)
+    }
+    if profile_index is not None:
+        profile_names = profile_index.profile_names(role_name)
+    else:
+        profiles = list_all(iam, "list_instance_profiles_for_role", "InstanceProfiles", RoleName=role_name)
+        profile_names = [p["InstanceProfileName"] for p in profiles]
+    return {
+        "signature": build_signature(role, versions, inline_documents, profile_names),
+        "role": role,
+        "attached": attached,
+        "inline_documents": inline_documents
+    }
+
+def fetch_signature(iam, role_name, policy_versions, profile_index=None):
+    return fetch_snapshot(iam, role_name, policy_versions, profile_index)["signature"]
+
+class SnapshotCache:
+    """On-disk store of fetched role records keyed by account id + role name.
+
+    render_version is stored with every signature, so bumping it (generate_tfvars.RENDER_VERSION)
+    makes every cached role stale and its output is rendered again.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, render_version=None):
+        self.render_version = render_version
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "snapshots.db"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            " account_id TEXT, role_name TEXT, signature TEXT, record TEXT,"
+            " PRIMARY KEY (account_id, role_name))"
+        )
+        self._conn.commit()
+
+    def get(self, account_id, role_name):
+        """Return (signature, record) or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT signature, record FROM snapshots WHERE account_id = ? AND role_name = ?",
+                (account_id, role_name)
+            ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def _versioned(self, signature):
+        return dict(signature, render_version=self.render_version)
+
+    def is_current(self, account_id, role_name, signature):
+        cached = self.get(account_id, role_name)
+        return cached is not None and cached[0] == self._versioned(signature)
+
+    def put(self, account_id, role_name, signature, record):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                (account_id, role_name, json.dumps(self._versioned(signature), sort_keys=True), json.dumps(record))
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
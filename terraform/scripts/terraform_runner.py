@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+NO_OP = "no-op"
+CHANGES = "changes"
+ERROR = "error"
+
+DEFAULT_PLUGIN_CACHE = "./.terraform_plugin_cache"
+DEFAULT_WORK_DIR = "./.terraform_runs"
+LOG_NAME = "terraform.log"
+
+def find_directories(output_root, accounts=None):
+    """[(alias, suffix, path), ...] for every OUTPUT_ROOT/<alias>/<suffix>/terraform.tfvars, sorted"""
+    found = []
+    for tfvars in sorted(Path(output_root).glob("*/*/terraform.tfvars")):
+        directory = tfvars.parent
+        alias = directory.parent.name
+        if accounts is None or alias in accounts:
+            found.append((alias, directory.name, directory))
+    return found
+
+class AccountEnvironments:
+    """Environment variables for each account's terraform runs, resolved once per account.
+
+    Without a broker every run uses the account's named profile (as generate_tfvars
+    does); with a CredentialBroker and assume_role the role is assumed once and its
+    credentials are handed to every run in that account.
+    """
+
+    def __init__(self, account_ids, broker=None, assume_role=None):
+        self.account_ids = account_ids
+        self.broker = broker
+        self.assume_role = assume_role
+        self._envs = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, alias):
+        account_id = self.account_ids.get(alias)
+        if account_id is None:
+            return {}
+        if self.broker is not None and self.assume_role:
+            frozen = self.broker.credentials(account_id, self.assume_role).get_frozen_credentials()
+            return {"AWS_ACCESS_KEY_ID": frozen.access_key, "AWS_SECRET_ACCESS_KEY": frozen.secret_key,
+                    "AWS_SESSION_TOKEN": frozen.token}
+        from generate_tfvars import account_profile
+        return {"AWS_PROFILE": account_profile(alias, account_id)}
+
+    def get(self, alias):
+        with self._lock:
+            if alias not in self._envs:
+                self._envs[alias] = self._resolve(alias)
+            return self._envs[alias]
+
+class TerraformRunner:
+    """Runs terraform init/validate/plan for generated role directories in a bounded pool.
+
+    Each directory gets its own TF_DATA_DIR, so directories that only hold a tfvars file
+    can share one configuration (config_dir) without sharing .terraform state, and every
+    run uses one provider plugin cache. The TF_DATA_DIR and the terraform.log that every
+    step streams to live under work_dir/<alias>/<suffix>, keeping the generated tree
+    free of run artifacts.
+    """
+
+    def __init__(self, terraform="terraform", config_dir=None, plugin_cache=DEFAULT_PLUGIN_CACHE, environments=None,
+                 steps=("init", "validate", "plan"), timeout=1800, work_dir=DEFAULT_WORK_DIR):
+        self.terraform = terraform
+        self.config_dir = Path(config_dir).resolve() if config_dir else None
+        self.plugin_cache = Path(plugin_cache).resolve()
+        self.work_dir = Path(work_dir).resolve()
+        self.environments = environments
+        self.steps = steps
+        self.timeout = timeout
+        self.plugin_cache.mkdir(parents=True, exist_ok=True)
+
+    def _env(self, alias, run_dir):
+        env = dict(os.environ, TF_IN_AUTOMATION="1", TF_INPUT="0", TF_PLUGIN_CACHE_DIR=str(self.plugin_cache),
+                   TF_DATA_DIR=str(run_dir / ".terraform"))
+        if self.environments is not None:
+            env.update(self.environments.get(alias))
+        return env
+
+    def _workdir(self, directory):
+        if any(directory.glob("*.tf")) or self.config_dir is None:
+            return directory
+        return self.config_dir
+
+    def _command(self, step, directory, workdir):
+        command = [self.terraform, f"-chdir={workdir}", step, "-no-color"]
+        if step == "init":
+            command.append("-input=false")
+        elif step == "plan":
+            command += ["-input=false", "-detailed-exitcode", "-lock=false"]
+            if workdir != directory:
+                command.append(f"-var-file={directory / 'terraform.tfvars'}")
+        return command
+
+    def run(self, alias, suffix, directory):
+        """Returns {"account", "suffix", "path", "status", "step", "duration", "log"}"""
+        directory = Path(directory).resolve()
+        workdir = self._workdir(directory)
+        run_dir = self.work_dir / alias / suffix
+        run_dir.mkdir(parents=True, exist_ok=True)
+        log_path = run_dir / LOG_NAME
+        result = {"account": alias, "suffix": suffix, "path": str(directory), "log": str(log_path)}
+        start = time.perf_counter()
+        status, failed_step = NO_OP, None
+        try:
+            env = self._env(alias, run_dir)
+        except Exception as e:
+            result.update(status=ERROR, step="credentials", error=str(e), duration=0.0)
+            return result
+        with open(log_path, "w") as log:
+            for step in self.steps:
+                command = self._command(step, directory, workdir)
+                log.write(f"$ {' '.join(command)}\n")
+                log.flush()
+                try:
+                    code = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env,
+                                          timeout=self.timeout).returncode
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    log.write(f"{e}\n")
+                    code = 1
+                if step == "plan" and code == 2:
+                    status = CHANGES
+                elif code != 0:
+                    status, failed_step = ERROR, step
+                    break
+        result.update(status=status, step=failed_step, duration=round(time.perf_counter() - start, 3))
+        return result
+
+    def run_all(self, directories, workers=None, on_result=None):
+        """Run every (alias, suffix, path); the first init runs alone to fill the plugin cache"""
+        workers = workers or os.cpu_count() or 4
+        results = []
+
+        def run_one(item):
+            result = self.run(*item)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        if directories and "init" in self.steps:
+            results.append(run_one(directories[0]))
+            directories = directories[1:]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results += pool.map(run_one, directories)
+        return results
+
+def summarize(results):
+    counts = {NO_OP: 0, CHANGES: 0, ERROR: 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return counts
+
+def main(argv=None, broker=None):
+    """Run terraform over OUTPUT_ROOT; broker is used for --assume-role instead of a new CredentialBroker"""
+    import generate_tfvars
+    parser = argparse.ArgumentParser(description="Run terraform init/validate/plan over the generated OUTPUT_ROOT tree")
+    parser.add_argument("--output-root", default=generate_tfvars.OUTPUT_ROOT, help="Tree written by generate_tfvars.py")
+    parser.add_argument("--config-dir",
+                        help="Terraform configuration to plan directories that only hold terraform.tfvars against")
+    parser.add_argument("--terraform", default="terraform", help="terraform binary")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Directories run concurrently")
+    parser.add_argument("--plugin-cache", default=DEFAULT_PLUGIN_CACHE, help="Shared provider plugin cache directory")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR,
+                        help="Per-directory terraform.log and TF_DATA_DIR go under <work-dir>/<alias>/<suffix>")
+    parser.add_argument("--steps", default="init,validate,plan", help="Comma separated terraform steps")
+    parser.add_argument("--account", action="append", help="Only this account alias (repeatable)")
+    parser.add_argument("--assume-role", help="Assume this role once per account instead of using named profiles")
+    parser.add_argument("--no-credentials", action="store_true", help="Run with the caller's own AWS environment")
+    parser.add_argument("--summary", help="Write the per-role results as JSON here")
+    args = parser.parse_args(argv)
+
+    environments = None
+    if not args.no_credentials:
+        if not args.assume_role:
+            broker = None
+        elif broker is None:
+            from credential_broker import CredentialBroker
+            broker = CredentialBroker()
+        account_ids = {a["alias"]: a["id"] for a in generate_tfvars.load_accounts()}
+        environments = AccountEnvironments(account_ids, broker, args.assume_role)
+
+    directories = find_directories(args.output_root, set(args.account) if args.account else None)
+    runner = TerraformRunner(args.terraform, args.config_dir, args.plugin_cache, environments,
+                             tuple(args.steps.split(",")), work_dir=args.work_dir)
+    print(f"Running {','.join(runner.steps)} in {len(directories)} directories with {args.workers} workers",
+          file=sys.stderr)
+
+    lock = threading.Lock()
+
+    def report(result):
+        with lock:
+            step = f" ({result['step']})" if result.get("step") else ""
+            print(f"[{result['status'].upper()}] {result['account']}/{result['suffix']}{step} {result['duration']}s",
+                  file=sys.stderr)
+
+    start = time.perf_counter()
+    results = runner.run_all(directories, args.workers, report)
+    results.sort(key=lambda r: (r["account"], r["suffix"]))
+    counts = summarize(results)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({"counts": counts, "duration": round(time.perf_counter() - start, 3), "results": results},
+                      f, indent=2)
+    for result in results:
+        if result["status"] != NO_OP:
+            print(f"{result['status']:<8} {result['account']}/{result['suffix']}  {result['log']}")
+    print(f"Terraform: {counts[NO_OP]} no-op, {counts[CHANGES]} with changes, {counts[ERROR]} errors "
+          f"in {time.perf_counter() - start:.1f}s")
+    if counts[ERROR]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from account_index import AccountIndex
+
+def _account(accounts_dir, name, alias, account_id, ou=None, tags=None):
+    directory = accounts_dir / name
+    directory.mkdir(parents=True)
+    data = {"ACCOUNT_ALIAS": alias, "ACCOUNT_ID": account_id}
+    if ou is not None:
+        data["ACCOUNT_OU"] = ou
+    if tags is not None:
+        data["TAGS"] = tags
+    (directory / "account.json").write_text(json.dumps(data))
+
+def _index(tmp_path):
+    index = AccountIndex(str(tmp_path / "index.json"), str(tmp_path / "accounts"), log=lambda message: None)
+    index.refresh()
+    return index
+
+@pytest.fixture
+def accounts(tmp_path):
+    accounts_dir = tmp_path / "accounts"
+    _account(accounts_dir, "prod-web", "prod-web", "111111111111", "Root/Prod/Web", {"team": "web"})
+    _account(accounts_dir, "prod-data", "prod-data", 222222222222, "Root/Prod/Data",
+             [{"Key": "team", "Value": "data"}, {"Key": "pci", "Value": "yes"}])
+    _account(accounts_dir, "dev", "dev-sandbox", "333333333333", "Root/Dev", {"team": "web"})
+    return accounts_dir
+
+def _aliases(entries):
+    return [entry["alias"] for entry in entries]
+
+def test_select(tmp_path, accounts):
+    index = _index(tmp_path)
+    assert _aliases(index.select()) == ["dev-sandbox", "prod-data", "prod-web"]
+    assert _aliases(index.select(aliases=["prod-*"])) == ["prod-data", "prod-web"]
+    assert _aliases(index.select(ous=["Root/Prod*"])) == ["prod-data", "prod-web"]
+    assert _aliases(index.select(ous=["Dev"])) == ["dev-sandbox"]
+    assert _aliases(index.select(tags={"team": "web"})) == ["dev-sandbox", "prod-web"]
+    assert _aliases(index.select(tags={"pci": None})) == ["prod-data"]
+    assert _aliases(index.select(aliases=["prod-*"], tags={"team": "web"})) == ["prod-web"]
+    assert index.select(aliases=["nothing-*"]) == []
+    # Numeric ACCOUNT_IDs are kept as strings
+    assert {entry["id"] for entry in index.select()} == {"111111111111", "222222222222", "333333333333"}
+
+def test_select_changed_since(tmp_path, accounts):
+    index = _index(tmp_path)
+    assert len(index.select(changed_since=datetime(2000, 1, 1, tzinfo=timezone.utc))) == 3
+    assert index.select(changed_since=datetime(2999, 1, 1, tzinfo=timezone.utc)) == []
+
+def test_select_by_ou_without_ous(tmp_path):
+    _account(tmp_path / "accounts", "a", "a", "111111111111")
+    _account(tmp_path / "accounts", "b", "b", "222222222222")
+    index = _index(tmp_path)
+    with pytest.raises(ValueError, match="No account has an OU"):
+        index.select(ous=["Root/Prod"])
+    assert _aliases(index.select(aliases=["a"])) == ["a"]
+
+def test_select_by_ou_skips_accounts_without_one(tmp_path, accounts):
+    _account(accounts, "new", "new", "444444444444")
+    messages = []
+    index = AccountIndex(str(tmp_path / "index.json"), str(accounts), log=messages.append)
+    index.refresh()
+    assert _aliases(index.select(ous=["Prod"])) == ["prod-data", "prod-web"]
+    assert messages == ["[WARN] 1 accounts have no OU and cannot match --ou"]
+
+def test_duplicate_account_id(tmp_path, accounts):
+    _account(accounts, "copy", "copy", "111111111111")
+    with pytest.raises(ValueError, match="Account 111111111111 is in both"):
+        _index(tmp_path)
+
+def test_refresh_reuses_the_saved_index(tmp_path, accounts):
+    index = _index(tmp_path)
+    assert index.save()
+    reopened = AccountIndex(str(tmp_path / "index.json"), str(accounts), log=lambda message: None)
+    assert not reopened.refresh()
+    assert _aliases(reopened.select()) == ["dev-sandbox", "prod-data", "prod-web"]
@@ -0,0 +1,32 @@
+import os
+
+from render import RenderStats, content_hash, write_if_changed
+
+def test_write_if_changed(tmp_path):
+    path = tmp_path / "acct" / "role" / "terraform.tfvars"
+    stats = RenderStats()
+
+    assert write_if_changed(path, 'role_name = "r"\n', stats)
+    assert path.read_text() == 'role_name = "r"\n'
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o644)
+
+    mtime = os.stat(path).st_mtime_ns
+    assert not write_if_changed(path, 'role_name = "r"\n', stats)
+    assert os.stat(path).st_mtime_ns == mtime
+
+    assert write_if_changed(path, b'role_name = "s"\n', stats)
+    assert path.read_bytes() == b'role_name = "s"\n'
+    assert (stats.written, stats.skipped) == (2, 1)
+    assert stats.summary() == "2 written, 1 unchanged"
+    # Only the target is left behind, no temp files
+    assert os.listdir(path.parent) == ["terraform.tfvars"]
+
+def test_write_if_changed_same_size_different_content(tmp_path):
+    path = tmp_path / "terraform.tfvars"
+    assert write_if_changed(path, "aaaa", RenderStats())
+    assert write_if_changed(path, "bbbb", RenderStats())
+    assert path.read_text() == "bbbb"
+
+def test_content_hash():
+    assert content_hash("abc") == content_hash(b"abc")
+    assert content_hash("abc") != content_hash("abd")
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from fake_iam import FakeIam, synthetic_account
+from iam_calls import IamCaller
+from role_discovery import RoleFilter, account_role_filter, discover_roles, parse_tag_filters, run_pipeline
+
+def _role(name, path="/", tags=()):
+    return {"RoleName": name, "Path": path, "Tags": [{"Key": k, "Value": v} for k, v in tags]}
+
+def test_role_filter():
+    role_filter = RoleFilter("/service/", "^app-", {"team": "infra", "managed-by": None})
+    assert role_filter.matches(_role("app-api", "/service/x/", [("team", "infra"), ("managed-by", "tf")]))
+    assert not role_filter.matches(_role("app-api", "/", [("team", "infra"), ("managed-by", "tf")]))
+    assert not role_filter.matches(_role("my-app-api", "/service/", [("team", "infra"), ("managed-by", "tf")]))
+    assert not role_filter.matches(_role("app-api", "/service/", [("team", "data"), ("managed-by", "tf")]))
+    assert not role_filter.matches(_role("app-api", "/service/", [("team", "infra")]))
+    assert RoleFilter().matches(_role("anything"))
+
+def test_account_role_filter_matches_exact_names():
+    role_filter = account_role_filter("acct", ["basic-runner-role", "a.b"])
+    assert role_filter.matches(_role("acct-basic-runner-role"))
+    assert role_filter.matches(_role("acct-a.b"))
+    assert not role_filter.matches(_role("acct-axb"))
+    assert not role_filter.matches(_role("acct-basic-runner-role-2"))
+
+def test_parse_tag_filters():
+    assert parse_tag_filters(["team=infra", "managed-by", "empty="]) == {"team": "infra", "managed-by": None,
+                                                                         "empty": ""}
+
+def test_discover_roles_only_fetches_tags_for_name_matches():
+    account = synthetic_account("100000000000", "acct", ["app-a", "app-b", "other"])
+    fake = FakeIam(account)
+    found = list(discover_roles(IamCaller(fake), RoleFilter(name_pattern="-app-", tags={"team": None})))
+    assert [role["RoleName"] for role in found] == ["acct-app-a", "acct-app-b"]
+    assert fake.calls["list_role_tags"] == 2
+
+def test_run_pipeline_overlaps_producer_and_workers():
+    produced = []
+
+    def items():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def handler(item):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return item * 2
+
+    results, error = run_pipeline(items(), handler, workers=4, queue_size=2)
+    assert error is None
+    assert sorted(results) == [i * 2 for i in range(20)]
+    assert peak[0] > 1
+
+def test_run_pipeline_reports_producer_error():
+    def items():
+        yield 1
+        yield 2
+        raise RuntimeError("list_roles failed")
+
+    results, error = run_pipeline(items(), lambda item: item, workers=2)
+    assert sorted(results) == [1, 2]
+    assert str(error) == "list_roles failed"
+
+def test_run_pipeline_reraises_handler_error_after_draining():
+    handled = []
+
+    def handler(item):
+        handled.append(item)
+        if item == 3:
+            raise ValueError("bad role")
+        return item
+
+    with pytest.raises(ValueError, match="bad role"):
+        run_pipeline(range(50), handler, workers=2, queue_size=1)
+    assert sorted(handled) == list(range(50))
@@ -0,0 +1,67 @@
+import json
+
+from run_journal import ACCOUNT_UNIT, DONE, FAILED, PENDING, RunJournal
+
+def _run(path):
+    journal = RunJournal(str(path), flush_every=2)
+    journal.mark("1", "a", PENDING)
+    journal.mark("1", "b", PENDING)
+    journal.mark("1", "a", DONE, output_hash="abc")
+    journal.mark("1", "b", FAILED, error="Throttling")
+    journal.mark("2", ACCOUNT_UNIT, FAILED, error="AccessDenied")
+    journal.mark("3", "c", PENDING)
+    return journal
+
+def test_resume_skips_done_units(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    _run(path).close()
+
+    journal = RunJournal(str(path), resume=True)
+    assert journal.status("1", "a") == DONE
+    assert journal.units(FAILED) == [("1", "b"), ("2", ACCOUNT_UNIT)]
+    assert journal.summary() == {PENDING: 1, DONE: 1, FAILED: 2}
+    assert not journal.should_run("1", "a", resume=True)
+    assert journal.should_run("1", "b", resume=True)
+    assert journal.should_run("3", "c", resume=True)
+    assert journal.should_run("1", "a")
+
+def test_retry_failed_runs_failed_units_and_unreached_roles(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    _run(path).close()
+
+    journal = RunJournal(str(path), resume=True)
+    assert journal.should_run("1", "b", retry_failed=True)
+    assert not journal.should_run("1", "a", retry_failed=True)
+    assert not journal.should_run("3", "c", retry_failed=True)
+    # Roles of an account whose listing failed were never journaled
+    assert journal.should_run("2", "never-seen", retry_failed=True)
+    assert not journal.should_run("1", "never-seen", retry_failed=True)
+
+def test_resume_appends_and_ignores_a_torn_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = _run(path)
+    journal.flush()
+    journal._file.write('{"account": "1", "role": "b", "sta')
+    journal._file.close()
+
+    resumed = RunJournal(str(path), resume=True)
+    assert resumed.status("1", "b") == FAILED
+    resumed.mark("1", "b", DONE, output_hash="def")
+    resumed.close()
+    assert RunJournal(str(path), resume=True).status("1", "b") == DONE
+
+def test_unflushed_entries_are_lost_without_flush(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = RunJournal(str(path), flush_every=100)
+    journal.mark("1", "a", DONE)
+    assert path.read_text() == ""
+    journal.close()
+    assert [json.loads(line)["role"] for line in path.read_text().splitlines()] == ["a"]
+
+def test_without_resume_starts_fresh(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    _run(path).close()
+    journal = RunJournal(str(path))
+    assert journal.status("1", "a") is None
+    journal.close()
+    assert path.read_text() == ""
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import terraform_runner
+from terraform_runner import CHANGES, ERROR, NO_OP, TerraformRunner, find_directories, summarize
+
+FAKE_TERRAFORM = str(Path(terraform_runner.__file__).resolve().parent / "fake_terraform.py")
+
+def _tree(root, roles):
+    for (alias, suffix), content in roles.items():
+        directory = root / alias / suffix
+        directory.mkdir(parents=True)
+        (directory / "terraform.tfvars").write_text(f'role_name = "{alias}-{suffix}"\n{content}')
+
+def test_run_all_with_fake_terraform(tmp_path):
+    output_root = tmp_path / "terraform_files"
+    _tree(output_root, {
+        ("acct0000", "basic-runner-role"): "",
+        ("acct0000", "changed-role"): "# FAKE_TF_CHANGES\n",
+        ("acct0001", "broken-role"): "# FAKE_TF_INVALID\n",
+    })
+    work_dir = tmp_path / "runs"
+    runner = TerraformRunner(FAKE_TERRAFORM, plugin_cache=tmp_path / "plugins", work_dir=work_dir)
+    directories = find_directories(output_root)
+    assert [(alias, suffix) for alias, suffix, _ in directories] == [
+        ("acct0000", "basic-runner-role"), ("acct0000", "changed-role"), ("acct0001", "broken-role")
+    ]
+
+    results = {r["suffix"]: r for r in runner.run_all(directories, workers=2)}
+
+    assert results["basic-runner-role"]["status"] == NO_OP
+    assert results["changed-role"]["status"] == CHANGES
+    assert results["broken-role"]["status"] == ERROR
+    assert results["broken-role"]["step"] == "validate"
+    assert summarize(results.values()) == {NO_OP: 1, CHANGES: 1, ERROR: 1}
+    # Logs and TF_DATA_DIR go to the work dir; the generated tree only keeps its tfvars
+    for alias, suffix, directory in directories:
+        run_dir = work_dir / alias / suffix
+        assert Path(results[suffix]["log"]) == run_dir / terraform_runner.LOG_NAME
+        assert (run_dir / ".terraform" / "initialized").exists()
+        assert [p.name for p in directory.iterdir()] == ["terraform.tfvars"]
+    assert "$ " + FAKE_TERRAFORM in (work_dir / "acct0000" / "changed-role" / "terraform.log").read_text()
+    assert (tmp_path / "plugins" / "registry.terraform.io" / "hashicorp" / "aws").is_dir()
+
+def test_plan_against_shared_config(tmp_path):
+    output_root = tmp_path / "terraform_files"
+    _tree(output_root, {("acct0000", "changed-role"): "# FAKE_TF_CHANGES\n"})
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    (config_dir / "main.tf").write_text("")
+    runner = TerraformRunner(FAKE_TERRAFORM, config_dir=config_dir, plugin_cache=tmp_path / "plugins",
+                             work_dir=tmp_path / "runs", steps=("init", "plan"))
+
+    [result] = runner.run_all(find_directories(output_root))
+
+    assert result["status"] == CHANGES
+    assert f"-var-file={output_root / 'acct0000' / 'changed-role' / 'terraform.tfvars'}" in \
+        Path(result["log"]).read_text()
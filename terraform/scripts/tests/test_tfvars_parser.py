@@ -0,0 +1,57 @@
+import pytest
+
+from tfvars_parser import TfvarsSyntaxError, parse_tfvars, parse_tfvars_file
+
+def test_heredocs():
+    values = parse_tfvars(
+        'plain = <<EOT\n'
+        '{\n'
+        '  "Version": "2012-10-17"\n'
+        '}\n'
+        'EOT\n'
+        'indented = <<-EOT\n'
+        '    line one\n'
+        '      line two\n'
+        '    EOT\n'
+    )
+    assert values["plain"] == '{\n  "Version": "2012-10-17"\n}\n'
+    assert values["indented"] == "line one\n  line two\n"
+
+def test_unterminated_heredoc():
+    with pytest.raises(TfvarsSyntaxError, match="Unterminated heredoc <<EOT on line 2"):
+        parse_tfvars('role_name = "r"\npolicy = <<EOT\n{}\n')
+
+def test_nested_maps_and_lists():
+    values = parse_tfvars('''
+        # comment
+        customer_managed_policies = {
+          "deploy" = {
+            name       = "deploy"
+            statements = [{ Effect = "Allow", Action = ["s3:GetObject", "s3:PutObject"] }]
+          }
+          other: { empty = {}, none = null, flag = true }
+        }
+        tags = [{ team = "infra" }, { "cost-center" = "42" }]
+    ''')
+    assert values["customer_managed_policies"] == {
+        "deploy": {
+            "name": "deploy",
+            "statements": [{"Effect": "Allow", "Action": ["s3:GetObject", "s3:PutObject"]}]
+        },
+        "other": {"empty": {}, "none": None, "flag": True}
+    }
+    assert values["tags"] == [{"team": "infra"}, {"cost-center": "42"}]
+
+def test_unquoted_account_id_is_a_number():
+    # HCL reads an unquoted account id as a number, so any leading zero is lost
+    values = parse_tfvars('target_account = 123456789012\nleading_zero = 012345678901\nquoted = "012345678901"')
+    assert values["target_account"] == 123456789012
+    assert isinstance(values["target_account"], int)
+    assert values["leading_zero"] == 12345678901
+    assert values["quoted"] == "012345678901"
+
+def test_syntax_error_reports_the_line(tmp_path):
+    path = tmp_path / "terraform.tfvars"
+    path.write_text('role_name = "r"\n\nmanaged_arns = [\n  "a",\n  = \n]\n')
+    with pytest.raises(TfvarsSyntaxError, match="on line 5"):
+        parse_tfvars_file(path)
@@ -0,0 +1,167 @@
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# One pass over the text; newlines and comments are dropped since every value we emit is
+# either a single token or bracketed, so `key = value` pairs never need them as separators.
+TOKEN_RE = re.compile(r"""
+    (?P<skip>[ \t\r\n]+|\#[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<heredoc><<(?P<indent>-?)(?P<marker>[A-Za-z_][A-Za-z0-9_]*)[ \t]*\r?\n)
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_\-]*)
+  | (?P<punct>[\[\]{}=,:])
+""", re.X | re.S)
+
+KEYWORDS = {"true": True, "false": False, "null": None}
+
+class TfvarsSyntaxError(ValueError):
+    pass
+
+def _line(text, pos):
+    return text.count("\n", 0, pos) + 1
+
+def _unquote(token):
+    try:
+        return json.loads(token)
+    except ValueError:
+        return token[1:-1]
+
+def tokenize(text):
+    """Yield (kind, value, pos) tokens for the tfvars subset we generate"""
+    pos = 0
+    end = len(text)
+    while pos < end:
+        match = TOKEN_RE.match(text, pos)
+        if not match:
+            raise TfvarsSyntaxError(f"Unexpected character {text[pos]!r} on line {_line(text, pos)}")
+        kind = match.lastgroup
+        if kind == "skip":
+            pos = match.end()
+            continue
+        if kind == "heredoc":
+            marker = match.group("marker")
+            closing = re.compile(rf"^[ \t]*{re.escape(marker)}[ \t]*\r?$", re.M)
+            close = closing.search(text, match.end())
+            if not close:
+                raise TfvarsSyntaxError(f"Unterminated heredoc <<{marker} on line {_line(text, pos)}")
+            body = text[match.end():close.start()]
+            if match.group("indent"):
+                lines = body.splitlines(keepends=True)
+                margin = min((len(l) - len(l.lstrip()) for l in lines if l.strip()), default=0)
+                body = "".join(l[margin:] for l in lines)
+            yield "heredoc", body, pos
+            pos = close.end()
+            continue
+        yield kind, match.group(kind), pos
+        pos = match.end()
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = list(tokenize(text))
+        self.index = 0
+
+    def _error(self, message, pos=None):
+        """Error at pos, by default the next unread token"""
+        if pos is None:
+            pos = self.tokens[self.index][2] if self.index < len(self.tokens) else len(self.text)
+        return TfvarsSyntaxError(f"{message} on line {_line(self.text, pos)}")
+
+    def _peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise self._error("Unexpected end of file")
+        self.index += 1
+        return token
+
+    def _expect(self, value):
+        kind, token, pos = self._next()
+        if kind != "punct" or token != value:
+            raise self._error(f"Expected {value!r}, got {token!r}", pos)
+
+    def document(self):
+        values = {}
+        while self._peek()[0] is not None:
+            kind, name, pos = self._next()
+            if kind not in ("ident", "string"):
+                raise self._error(f"Expected variable name, got {name!r}", pos)
+            self._expect("=")
+            values[_unquote(name) if kind == "string" else name] = self.value()
+        return values
+
+    def value(self):
+        kind, token, pos = self._next()
+        if kind == "string":
+            return _unquote(token)
+        if kind == "heredoc":
+            return token
+        if kind == "number":
+            return float(token) if any(c in token for c in ".eE") else int(token)
+        if kind == "ident":
+            return KEYWORDS.get(token, token)
+        if token == "[":
+            return self._list()
+        if token == "{":
+            return self._map()
+        raise self._error(f"Unexpected {token!r}", pos)
+
+    def _list(self):
+        items = []
+        while True:
+            if self._peek()[1] == "]":
+                self._next()
+                return items
+            items.append(self.value())
+            if self._peek()[1] == ",":
+                self._next()
+
+    def _map(self):
+        items = {}
+        while True:
+            if self._peek()[1] == "}":
+                self._next()
+                return items
+            key_kind, key, pos = self._next()
+            if key_kind not in ("ident", "string"):
+                raise self._error(f"Expected map key, got {key!r}", pos)
+            _, separator, pos = self._next()
+            if separator not in ("=", ":"):
+                raise self._error(f"Expected '=' or ':' after {key!r}", pos)
+            items[_unquote(key) if key_kind == "string" else key] = self.value()
+            if self._peek()[1] == ",":
+                self._next()
+
+def parse_tfvars(text):
+    """Parse tfvars text and return every variable as a dict"""
+    return _Parser(text).document()
+
+def parse_tfvars_file(file_path):
+    with open(file_path) as f:
+        return parse_tfvars(f.read())
+
+def iter_tfvars_files(root):
+    """Yield every *.tfvars path under root in sorted order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".tfvars"):
+                yield os.path.join(dirpath, filename)
+
+def _parse_path(path):
+    try:
+        return path, parse_tfvars_file(path)
+    except (OSError, TfvarsSyntaxError) as e:
+        return path, e
+
+def parse_tree(root, workers=None):
+    """Parse every tfvars file under root (e.g. OUTPUT_ROOT) across processes.
+
+    Returns {path: values} where values is the exception for files that failed to parse.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_parse_path, iter_tfvars_files(root), chunksize=64))
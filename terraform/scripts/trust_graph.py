@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+
+from canonical import canonical_document, document_hash
+from inventory_export import iter_export
+
+DEFAULT_DB = "./.iam_trust_graph.db"
+
+ASSUME_ACTIONS = re.compile(r"^sts:(assumerole\w*|\*)$|^\*$", re.IGNORECASE)
+ROLE_ARN = re.compile(r"^arn:aws[\w-]*:(?:iam|sts)::(\d{12}):(?:role/(?:.*/)?|assumed-role/)([\w+=,.@-]+)")
+ROOT_ARN = re.compile(r"^arn:aws[\w-]*:iam::(\d{12}):root$")
+
+def role_key(account_id, role_name):
+    """Graph node for a role: its ARN without the path, which is how trust policies can differ from get_role"""
+    return f"arn:aws:iam::{account_id}:role/{role_name}"
+
+def normalize_principal(kind, value):
+    """Node name for one trust policy principal.
+
+    Account ids become their :root ARN, role and assumed-role ARNs become role_key, and
+    service/federated principals keep their kind as a prefix ("service:ec2.amazonaws.com").
+    """
+    if kind != "AWS":
+        return f"{kind.lower()}:{value}"
+    if re.fullmatch(r"\d{12}", value):
+        return f"arn:aws:iam::{value}:root"
+    match = ROLE_ARN.match(value)
+    if match:
+        return role_key(*match.groups())
+    return value
+
+def trust_edges(trust_policy):
+    """[(principal, conditional), ...] allowed to assume the role by its trust policy.
+
+    Only Allow statements granting an sts:AssumeRole* action are edges; Deny statements
+    are not subtracted, so the graph errs towards showing a path.
+    """
+    if isinstance(trust_policy, str):
+        trust_policy = json.loads(trust_policy)
+    statements = trust_policy.get("Statement", [])
+    if isinstance(statements, dict):
+        statements = [statements]
+    edges = {}
+    for statement in statements:
+        if statement.get("Effect") != "Allow":
+            continue
+        actions = statement.get("Action", [])
+        if not any(ASSUME_ACTIONS.match(a) for a in ([actions] if isinstance(actions, str) else actions)):
+            continue
+        principal = statement.get("Principal", {})
+        if principal == "*":
+            principal = {"AWS": "*"}
+        for kind, values in principal.items():
+            for value in [values] if isinstance(values, str) else values:
+                node = normalize_principal(kind, value)
+                conditional = bool(statement.get("Condition"))
+                edges[node] = edges.get(node, True) and conditional
+    return sorted(edges.items())
+
+class TrustGraph:
+    """Persisted principal -> role trust edges for every harvested role, in SQLite.
+
+    update_role() only rewrites a role's edges when its canonical trust policy hash
+    changed, so a sweep keeps the graph current incrementally. Writes are committed in batches.
+    """
+
+    def __init__(self, path=DEFAULT_DB, commit_every=200):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.commit_every = commit_every
+        self.updated = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS roles ("
+            " role TEXT PRIMARY KEY, account_id TEXT, role_name TEXT, trust_hash TEXT);"
+            "CREATE TABLE IF NOT EXISTS edges ("
+            " principal TEXT, role TEXT, conditional INTEGER, PRIMARY KEY (principal, role));"
+            "CREATE INDEX IF NOT EXISTS edges_by_role ON edges (role);"
+            "CREATE INDEX IF NOT EXISTS roles_by_account ON roles (account_id);"
+        )
+        self._conn.commit()
+
+    def update_role(self, account_id, role_name, trust_policy):
+        """Record the role's trust policy. Returns True when its edges changed."""
+        trust_policy = canonical_document(trust_policy)
+        role = role_key(account_id, role_name)
+        trust_hash = document_hash(trust_policy)
+        with self._lock:
+            row = self._conn.execute("SELECT trust_hash FROM roles WHERE role = ?", (role,)).fetchone()
+            if row and row[0] == trust_hash:
+                return False
+            self._conn.execute("INSERT OR REPLACE INTO roles VALUES (?, ?, ?, ?)",
+                               (role, account_id, role_name, trust_hash))
+            self._conn.execute("DELETE FROM edges WHERE role = ?", (role,))
+            self._conn.executemany("INSERT INTO edges VALUES (?, ?, ?)",
+                                   [(principal, role, int(c)) for principal, c in trust_edges(trust_policy)])
+            self.updated += 1
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+        return True
+
+    def _remove_locked(self, role):
+        self._conn.execute("DELETE FROM roles WHERE role = ?", (role,))
+        self._conn.execute("DELETE FROM edges WHERE role = ?", (role,))
+
+    def remove_role(self, account_id, role_name):
+        with self._lock:
+            self._remove_locked(role_key(account_id, role_name))
+            self._conn.commit()
+
+    def prune_account(self, account_id, seen, candidates=None):
+        """Remove the account's roles that are not in seen, e.g. roles deleted since the last sweep.
+
+        candidates limits the pruning to role names the sweep was responsible for
+        (a predicate on the role name), so a narrower sweep keeps the other roles.
+        Returns the removed role names.
+        """
+        seen = set(seen)
+        with self._lock:
+            stale = [name for (name,) in self._conn.execute(
+                "SELECT role_name FROM roles WHERE account_id = ? ORDER BY role_name", (account_id,)
+            ) if name not in seen and (candidates is None or candidates(name))]
+            for name in stale:
+                self._remove_locked(role_key(account_id, name))
+            if stale:
+                self._conn.commit()
+        return stale
+
+    def trusting_principals(self, role):
+        """[(principal, conditional), ...] that the role trusts"""
+        with self._lock:
+            return [(p, bool(c)) for p, c in self._conn.execute(
+                "SELECT principal, conditional FROM edges WHERE role = ? ORDER BY principal", (role,)
+            )]
+
+    def trusted_roles(self, principal):
+        """[(role, conditional), ...] whose trust policy names principal"""
+        with self._lock:
+            return [(r, bool(c)) for r, c in self._conn.execute(
+                "SELECT role, conditional FROM edges WHERE principal = ? ORDER BY role", (principal,)
+            )]
+
+    def _account_roles(self, account_id):
+        with self._lock:
+            return [r for (r,) in self._conn.execute("SELECT role FROM roles WHERE account_id = ?", (account_id,))]
+
+    def who_can_reach(self, role, max_depth=5):
+        """Every principal with a chain of assume-role hops ending at role, nearest first.
+
+        Returns [{"principal", "depth", "path", "conditional"}]. Trusting an account's
+        :root lets any role in that account in (if its own permissions allow sts:AssumeRole),
+        so those roles are walked as well.
+        """
+        if not role.startswith("arn:"):
+            raise ValueError(f"Expected a role ARN, got {role!r}")
+        role = normalize_principal("AWS", role)
+        seen = {role}
+        results = []
+        queue = deque([(role, 0, [role], False)])
+        while queue:
+            node, depth, path, conditional = queue.popleft()
+            if depth >= max_depth:
+                continue
+            for principal, edge_conditional in self.trusting_principals(node):
+                hop_conditional = conditional or edge_conditional
+                next_nodes = [principal]
+                root = ROOT_ARN.match(principal)
+                if root:
+                    next_nodes += self._account_roles(root.group(1))
+                for next_node in next_nodes:
+                    if next_node in seen:
+                        continue
+                    seen.add(next_node)
+                    next_path = [next_node] + path if next_node == principal else [next_node, principal] + path
+                    results.append({"principal": next_node, "depth": depth + 1, "path": next_path,
+                                    "conditional": hop_conditional})
+                    if next_node.startswith("arn:"):
+                        queue.append((next_node, depth + 1, next_path, hop_conditional))
+        return results
+
+    def summary(self):
+        with self._lock:
+            roles = self._conn.execute("SELECT COUNT(*) FROM roles").fetchone()[0]
+            edges = self._conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+        return {"roles": roles, "edges": edges, "updated": self.updated}
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+_graph = None
+
+def enable(path=DEFAULT_DB):
+    """Update the graph at path from every record generated from now on"""
+    global _graph
+    _graph = TrustGraph(path)
+    return _graph
+
+def current():
+    return _graph
+
+def record_role(account, record):
+    """Add a fetch_iam_role record to the enabled graph, if any"""
+    if _graph is not None:
+        _graph.update_role(account["id"], record["role_name"], record["assume_role_policy"])
+
+def prune_account(account, seen, candidates=None):
+    """Drop roles of account that a sweep did not see from the enabled graph, if any"""
+    if _graph is not None:
+        return _graph.prune_account(account["id"], seen, candidates)
+    return []
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the cross-account trust graph")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Trust graph database")
+    parser.add_argument("--from-export", help="First load every role from this inventory export")
+    parser.add_argument("--max-depth", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument("--who-can-reach", metavar="ROLE_ARN", help="Principals with an assume-role path to this role")
+    query.add_argument("--trusted-by", metavar="PRINCIPAL", help="Roles whose trust policy names this principal")
+    args = parser.parse_args()
+
+    graph = TrustGraph(args.db)
+    try:
+        if args.from_export:
+            for line in iter_export(args.from_export):
+                if line["type"] == "role":
+                    graph.update_role(line["account_id"], line["role_name"], line["assume_role_policy"])
+            print(f"Trust graph: {graph.summary()}")
+
+        if args.who_can_reach:
+            results = graph.who_can_reach(args.who_can_reach, args.max_depth)
+            if args.json:
+                print(json.dumps(results, indent=2))
+            for r in [] if args.json else results:
+                note = " (conditional)" if r["conditional"] else ""
+                print(f"{r['depth']}  {r['principal']}{note}")
+                if r["depth"] > 1:
+                    print(f"     via {' -> '.join(r['path'][1:])}")
+        elif args.trusted_by:
+            results = graph.trusted_roles(normalize_principal("AWS", args.trusted_by))
+            if args.json:
+                print(json.dumps(results, indent=2))
+            for role, conditional in [] if args.json else results:
+                print(f"{role}{' (conditional)' if conditional else ''}")
+    finally:
+        graph.close()
+
+if __name__ == "__main__":
+    main()